@@ -0,0 +1,27 @@
+"""
+Shared-secret guard for operator-only endpoints
+
+There are no user accounts in the API; operator surfaces (profiling, ...) are
+enabled by setting ADMIN_TOKEN and require it in the X-Admin-Token header.
+"""
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from app.config import settings
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """True when admin endpoints are enabled and `token` matches ADMIN_TOKEN."""
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode())
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """FastAPI dependency: 404 while admin endpoints are disabled, 403 on a bad token."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
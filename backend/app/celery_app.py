@@ -1,12 +1,15 @@
 from celery import Celery
+from celery.signals import after_setup_logger
+from kombu import Queue
 from app.config import settings
+from app.structured_logging import enable_queue_logging
 
 # Create Celery app
 celery_app = Celery(
     'gmail_saas',
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
-    include=['app.tasks', 'app.tasks_powermta', 'app.tasks_v2']
+    include=['app.tasks', 'app.tasks_powermta', 'app.tasks_v2', 'app.quota_ledger']
 )
 
 # Configure Celery for optimal performance with reasonable limits
@@ -26,7 +29,9 @@ celery_app.conf.update(
     task_reject_on_worker_lost=True,  # Requeue if worker dies
     task_compression='gzip',  # Use compression for large messages
     # Optimized concurrency settings
-    worker_prefetch_multiplier=100,  # Reasonable prefetch
+    # Sender workers run for a slice each; prefetching more would hold queued work
+    # (other campaigns, test sends) behind this worker's backlog
+    worker_prefetch_multiplier=1,
     worker_concurrency=100,  # 100 concurrent workers for maximum speed
     worker_pool='threads',  # Use threads for I/O bound tasks
     worker_disable_rate_limits=True,  # DISABLE rate limiting for maximum speed
@@ -38,8 +43,28 @@ celery_app.conf.update(
     task_send_sent_event=True,  # Track when tasks are sent
 )
 
+@after_setup_logger.connect
+def _queue_worker_logging(logger, **kwargs):
+    """Keep log formatting and stdout writes off the sender threads"""
+    enable_queue_logging(logger)
+
+# Queues: sender workers go to their campaign's priority queue
+# (app.services.campaign_scheduler); workers read the queues in this order
+celery_app.conf.task_queues = (
+    Queue('send_test'),
+    Queue('send_transactional'),
+    Queue('celery'),
+    Queue('send_bulk'),
+    Queue('email_queue'),
+    Queue('sync_queue'),
+    Queue('maintenance_queue'),
+)
+celery_app.conf.task_default_queue = 'celery'
+celery_app.conf.broker_transport_options = {'queue_order_strategy': 'priority'}
+
 # Task routes
 celery_app.conf.task_routes = {
+    'app.tasks_v2.run_sender_worker': {'queue': 'send_bulk'},
     'app.tasks.send_campaign_emails': {'queue': 'email_queue'},
     'app.tasks.send_bulk_from_single_sender': {'queue': 'email_queue'},
     'app.tasks.send_single_email': {'queue': 'email_queue'},
@@ -47,13 +72,30 @@ celery_app.conf.task_routes = {
     'app.daily_limits.reset_daily_limits': {'queue': 'maintenance_queue'},
 }
 
-# Celery Beat schedule for daily limit reset
-from celery.schedules import crontab
-
+# Celery Beat schedule: daily quotas live in the Redis ledger (keyed by UTC day,
+# so there is no reset job); this copies them back to Postgres
 celery_app.conf.beat_schedule = {
-    'reset-daily-limits': {
-        'task': 'app.daily_limits.reset_daily_limits',
-        'schedule': crontab(hour=0, minute=0),  # Every day at midnight
+    'reconcile-quota-ledger': {
+        'task': 'app.quota_ledger.reconcile_quota_ledger',
+        'schedule': 60.0,  # quota_ledger.RECONCILE_INTERVAL_SECONDS
+    },
+    # Plans recipients deferred by quota-aware assignment once their quota window opens
+    'release-deferred-recipients': {
+        'task': 'app.tasks_v2.release_deferred_recipients',
+        'schedule': 300.0,
+    },
+    # Puts back work of dead sender workers and restarts stalled campaigns
+    'recover-stalled-campaigns': {
+        'task': 'app.tasks_v2.recover_stalled_campaigns',
+        'schedule': 60.0,
+    },
+    # Resumes campaigns whose start-at time or sending window has come
+    'start-scheduled-campaigns': {
+        'task': 'app.tasks_v2.start_scheduled_campaigns',
+        'schedule': 30.0,
     },
 }
 
+
+# Registers the `profile` broadcast control command (app.profiling)
+import app.profiling  # noqa: E402,F401
@@ -0,0 +1,227 @@
+"""
+Circuit breakers per sender and per service account
+
+A sender whose delegation is revoked, who is suspended, or whose Gmail is
+disabled used to fail every remaining email slowly, each through the full
+credential + build + HTTP path. Breakers shared through Redis stop that:
+
+    breaker:sender:{email}
+    breaker:account:{service_account_id}
+
+Each hash holds `state` (closed / open / half_open), `failures` (consecutive
+sender-fault failures, see app.send_errors.SENDER), `reason`, `cooldown`,
+`retry_at` and, while half-open, `probe` ("holder:expires_at").
+
+- A sender's breaker opens after SENDER_FAILURE_THRESHOLD consecutive
+  failures; an account's after ACCOUNT_FAILURE_THRESHOLD across all of its
+  senders (one success from any of them resets it)
+- While open, `allow()` refuses instantly, so workers stop pulling work and
+  the shared pool routes it to other senders
+- After the cooldown one caller gets a half-open probe (a single send). Success
+  closes the breaker; failure reopens it with the cooldown doubled, up to
+  MAX_OPEN_SECONDS
+
+Open breakers are listed by GET /campaigns/{id}/progress/.
+"""
+import logging
+import time
+from typing import Dict, List, Optional
+
+import redis
+
+from app.config import settings
+from app.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+PROBE = "probe"
+
+SENDER_FAILURE_THRESHOLD = 5
+ACCOUNT_FAILURE_THRESHOLD = 20
+OPEN_SECONDS = 60
+MAX_OPEN_SECONDS = 1800
+# A probe not reported within this long is handed to the next caller
+PROBE_LEASE_SECONDS = 120
+BREAKER_TTL_SECONDS = 7 * 86400
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+BREAKER_TRIPS = Counter(
+    "speedsend_circuit_breaker_trips_total", "Circuit breakers opened after sender failures", ("scope",)
+)
+
+# KEYS: sender hash, account hash; ARGV: holder, probe lease seconds.
+# Returns {verdict, keys}: closed, probe (this caller sends one probe; the keys probed) or
+# open (the key refusing).
+_ALLOW = redis_client.register_script("""
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local due = {}
+for _, key in ipairs(KEYS) do
+  local state = redis.call('HGET', key, 'state')
+  if state == 'open' or state == 'half_open' then
+    if now < tonumber(redis.call('HGET', key, 'retry_at') or '0') then
+      return {'open', key}
+    end
+    local probe = redis.call('HGET', key, 'probe')
+    if probe then
+      local holder, expires = string.match(probe, '^(.*):([%d%.]+)$')
+      if holder ~= ARGV[1] and tonumber(expires) > now then
+        return {'open', key}
+      end
+    end
+    table.insert(due, key)
+  end
+end
+for _, key in ipairs(due) do
+  redis.call('HSET', key, 'state', 'half_open', 'probe', ARGV[1] .. ':' .. (now + tonumber(ARGV[2])))
+end
+if #due > 0 then
+  return {'probe', table.concat(due, ' ')}
+end
+return {'closed', ''}
+""")
+
+# KEYS: sender hash, account hash; ARGV: successes, failures since the last success, reason,
+# sender threshold, account threshold, open seconds, max open seconds, ttl.
+# Returns {sender state, account state, bitmask of the breakers this opened (1 sender, 2 account)}.
+_RECORD = redis_client.register_script("""
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local ok, failed = tonumber(ARGV[1]), tonumber(ARGV[2])
+local result = {}
+local opened = 0
+for i, key in ipairs(KEYS) do
+  local state = redis.call('HGET', key, 'state') or 'closed'
+  local failures = tonumber(redis.call('HGET', key, 'failures') or '0')
+  if ok > 0 then
+    failures = failed
+    if state ~= 'closed' then
+      redis.call('HDEL', key, 'probe', 'retry_at', 'cooldown')
+      state = 'closed'
+    end
+  else
+    failures = failures + failed
+  end
+  if failed > 0 then
+    redis.call('HSET', key, 'reason', ARGV[3])
+    local cooldown = nil
+    if state == 'half_open' and ok == 0 then
+      cooldown = math.min(tonumber(ARGV[7]), 2 * tonumber(redis.call('HGET', key, 'cooldown') or ARGV[6]))
+    elseif state == 'closed' and failures >= tonumber(ARGV[3 + i]) then
+      cooldown = tonumber(ARGV[6])
+    end
+    if cooldown then
+      state = 'open'
+      redis.call('HSET', key, 'cooldown', cooldown, 'retry_at', tostring(now + cooldown), 'opened_at', tostring(now))
+      redis.call('HDEL', key, 'probe')
+      opened = opened + i
+    end
+  end
+  redis.call('HSET', key, 'state', state, 'failures', failures)
+  redis.call('EXPIRE', key, ARGV[8])
+  result[i] = state
+end
+result[3] = opened
+return result
+""")
+
+
+def get_sender_breaker_key(user_email: str) -> str:
+    """Get Redis key for a sender's circuit breaker"""
+    return f"breaker:sender:{user_email.lower()}"
+
+
+def get_account_breaker_key(service_account_id: int) -> str:
+    """Get Redis key for a service account's circuit breaker"""
+    return f"breaker:account:{service_account_id}"
+
+
+class SenderBreaker:
+    """The sender's and its account's breakers, as seen by one worker."""
+
+    def __init__(self, service_account_id: int, user_email: str, holder: str):
+        self.service_account_id = service_account_id
+        self.user_email = user_email
+        self.keys = [get_sender_breaker_key(user_email), get_account_breaker_key(service_account_id)]
+        self.holder = holder
+        self.probing: List[str] = []
+
+    @classmethod
+    def for_sender(cls, sender: Dict, holder: str) -> "SenderBreaker":
+        return cls(sender['service_account_id'], sender['user_email'], holder)
+
+    def allow(self) -> str:
+        """CLOSED (send normally), PROBE (send one email to test the sender) or OPEN
+        (do not send). Fails open if Redis is unavailable."""
+        try:
+            verdict, keys = _ALLOW(keys=self.keys, args=[self.holder, PROBE_LEASE_SECONDS])
+        except redis.RedisError as e:
+            logger.warning(f"Could not check circuit breaker for {self.user_email}: {e}")
+            return CLOSED
+        self.probing = keys.split() if verdict == PROBE else []
+        return verdict
+
+    @property
+    def probing_account(self) -> bool:
+        """Whether the current probe is for the whole service account."""
+        return self.keys[1] in self.probing
+
+    def record(self, successes: int, failures_since_success: int, reason: str = "") -> int:
+        """Report a chunk: successful sends and sender-fault failures after the last
+        success. Returns a bitmask of the breakers it opened (1 sender, 2 account)."""
+        if not successes and not failures_since_success:
+            return 0
+        try:
+            _, _, opened = _RECORD(keys=self.keys, args=[
+                successes, failures_since_success, reason[:500],
+                SENDER_FAILURE_THRESHOLD, ACCOUNT_FAILURE_THRESHOLD,
+                OPEN_SECONDS, MAX_OPEN_SECONDS, BREAKER_TTL_SECONDS,
+            ])
+        except redis.RedisError as e:
+            logger.warning(f"Could not update circuit breaker for {self.user_email}: {e}")
+            return 0
+        opened = int(opened)
+        if opened & 1:
+            BREAKER_TRIPS.inc(scope="sender")
+        if opened & 2:
+            BREAKER_TRIPS.inc(scope="account")
+        return opened
+
+
+def _scopes(senders: List[Dict]) -> List[tuple]:
+    scopes = {("account", sender['service_account_id'], None) for sender in senders}
+    scopes |= {("sender", sender['service_account_id'], sender['user_email']) for sender in senders}
+    return sorted(scopes, key=lambda scope: (scope[0], scope[1], scope[2] or ""))
+
+
+def breaker_states(senders: List[Dict]) -> List[Dict]:
+    """Breakers of these senders and their accounts that are not closed."""
+    scopes = _scopes(senders)
+    pipe = redis_client.pipeline(transaction=False)
+    for scope, account_id, email in scopes:
+        pipe.hgetall(get_sender_breaker_key(email) if scope == "sender" else get_account_breaker_key(account_id))
+    states = []
+    for (scope, account_id, email), raw in zip(scopes, pipe.execute()):
+        if raw.get('state', CLOSED) == CLOSED:
+            continue
+        states.append({
+            "scope": scope,
+            "service_account_id": account_id,
+            "user_email": email,
+            "state": raw['state'],
+            "failures": int(raw.get('failures') or 0),
+            "reason": raw.get('reason') or None,
+            "retry_at": float(raw['retry_at']) if raw.get('retry_at') else None,
+        })
+    return states
+
+
+def next_probe_at(senders: List[Dict]) -> Optional[float]:
+    """Earliest time one of these senders' open breakers allows a probe, or None if
+    none is open."""
+    retry_times = [state["retry_at"] or time.time() for state in breaker_states(senders)]
+    return min(retry_times) if retry_times else None
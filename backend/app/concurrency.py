@@ -0,0 +1,230 @@
+"""
+Adaptive send concurrency (AIMD) per sender and per service account
+
+Sender workers used to send with a fixed thread count (50 per batch, or the
+whole batch on the PowerMTA path) whatever Gmail was answering. Now each
+sender and each service account has a concurrency limit in Redis, shared by
+every worker:
+
+    concurrency:sender:{service_account_id}:{email}
+    concurrency:account:{service_account_id}
+
+Each hash holds `limit` (float), `latency` (EWMA of healthy send latency,
+seconds) and `decreased_at`. The account hash also holds one
+`hold:{holder}` field per running worker ("in_flight:expires_at").
+
+- `acquire()` returns the in-flight window for the next chunk: the sender's
+  limit, capped by what the account limit leaves after the other workers'
+  holds (but never below 1, so no worker has to wait)
+- `chunk_size()` sizes a chunk to take about a target duration: the window
+  times the target over the sender's latency EWMA
+- `feedback()` after each chunk applies AIMD to both limits: on throttling
+  (429, rateLimitExceeded, 5xx) multiply by BACKOFF_FACTOR, at most once per
+  DECREASE_COOLDOWN_SECONDS; otherwise add ADDITIVE_STEP per window of
+  successful sends, unless latency is above LATENCY_TOLERANCE x its baseline
+
+Limits converge on what Gmail tolerates without manual tuning and are
+remembered (for STATE_TTL_SECONDS) across campaigns.
+"""
+import logging
+import time
+import uuid
+from typing import Dict, Optional
+
+import redis
+
+from app.config import settings
+from app.metrics import Counter
+from app.structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY_MIN = 1
+SENDER_INITIAL_CONCURRENCY = 4
+SENDER_MAX_CONCURRENCY = 50
+ACCOUNT_INITIAL_CONCURRENCY = 50
+ACCOUNT_MAX_CONCURRENCY = 500
+ADDITIVE_STEP = 1.0
+BACKOFF_FACTOR = 0.5
+# Healthy latency may drift up to this multiple of the baseline before increases stop
+LATENCY_TOLERANCE = 2.0
+LATENCY_EWMA_ALPHA = 0.2
+# One multiplicative decrease per congestion event, not one per throttled send
+DECREASE_COOLDOWN_SECONDS = 2.0
+# Far longer than a worker run holds its slots (a ~30s slice or a ~60s chunk; the
+# threads pool enforces no Celery time limits), so only holds of dead workers expire
+HOLD_SECONDS = 900
+# Assumed send latency of a sender with no healthy sends observed yet
+DEFAULT_LATENCY_SECONDS = 1.0
+STATE_TTL_SECONDS = 7 * 86400
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+CONCURRENCY_BACKOFFS = Counter(
+    "speedsend_concurrency_backoffs_total", "Multiplicative concurrency decreases after Gmail throttling",
+    ("service_account_id",)
+)
+
+# KEYS: sender hash, account hash; ARGV: holder, sender initial, account initial, hold seconds, ttl.
+# Returns {window for the holder's next chunk, sender latency EWMA or ''} and records the
+# window as the holder's in-flight hold.
+_ACQUIRE = redis_client.register_script("""
+local now = tonumber(redis.call('TIME')[1])
+local holder = 'hold:' .. ARGV[1]
+redis.call('HSETNX', KEYS[1], 'limit', ARGV[2])
+redis.call('HSETNX', KEYS[2], 'limit', ARGV[3])
+local sender_limit = math.floor(tonumber(redis.call('HGET', KEYS[1], 'limit')))
+local account_limit = math.floor(tonumber(redis.call('HGET', KEYS[2], 'limit')))
+local fields = redis.call('HGETALL', KEYS[2])
+local in_flight = 0
+for j = 1, #fields, 2 do
+  local field, value = fields[j], fields[j + 1]
+  if string.sub(field, 1, 5) == 'hold:' and field ~= holder then
+    local count, expires = string.match(value, '^(%d+):(%d+)$')
+    if tonumber(expires) <= now then
+      redis.call('HDEL', KEYS[2], field)
+    else
+      in_flight = in_flight + tonumber(count)
+    end
+  end
+end
+local window = math.max(1, math.min(sender_limit, account_limit - in_flight))
+redis.call('HSET', KEYS[2], holder, window .. ':' .. (now + tonumber(ARGV[4])))
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return {window, redis.call('HGET', KEYS[1], 'latency') or ''}
+""")
+
+# KEYS: sender hash, account hash; ARGV: ok, throttled, mean latency, step, factor, min,
+# tolerance, alpha, cooldown, ttl, then initial and max for each key.
+# Returns {sender limit, account limit, decreased (0/1)} as strings.
+_FEEDBACK = redis_client.register_script("""
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local ok, throttled, latency = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local step, factor, minimum = tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local tolerance, alpha, cooldown = tonumber(ARGV[7]), tonumber(ARGV[8]), tonumber(ARGV[9])
+local result = {}
+local decreased = 0
+for i, key in ipairs(KEYS) do
+  local limit = tonumber(redis.call('HGET', key, 'limit') or ARGV[9 + 2 * i])
+  local maximum = tonumber(ARGV[10 + 2 * i])
+  if throttled > 0 then
+    if now - tonumber(redis.call('HGET', key, 'decreased_at') or '0') >= cooldown then
+      limit = math.max(minimum, math.floor(limit * factor))
+      redis.call('HSET', key, 'decreased_at', tostring(now))
+      decreased = 1
+    end
+  elseif ok > 0 then
+    local baseline = tonumber(redis.call('HGET', key, 'latency') or tostring(latency))
+    if latency <= baseline * tolerance then
+      -- Additive increase: one step per window's worth of successful sends
+      limit = math.min(maximum, limit + step * ok / math.max(limit, 1))
+    end
+    redis.call('HSET', key, 'latency', tostring(baseline + alpha * (latency - baseline)))
+  end
+  redis.call('HSET', key, 'limit', tostring(limit))
+  redis.call('EXPIRE', key, ARGV[10])
+  result[i] = tostring(limit)
+end
+result[3] = tostring(decreased)
+return result
+""")
+
+
+def get_sender_concurrency_key(service_account_id: int, user_email: str) -> str:
+    """Get Redis key for a sender's adaptive concurrency state"""
+    return f"concurrency:sender:{service_account_id}:{user_email.lower()}"
+
+
+def get_account_concurrency_key(service_account_id: int) -> str:
+    """Get Redis key for a service account's adaptive concurrency state"""
+    return f"concurrency:account:{service_account_id}"
+
+
+class AdaptiveConcurrency:
+    """One worker's view of a sender's and its account's concurrency limits."""
+
+    def __init__(self, service_account_id: int, user_email: str, holder: Optional[str] = None):
+        self.service_account_id = service_account_id
+        self.user_email = user_email
+        self.keys = (
+            get_sender_concurrency_key(service_account_id, user_email),
+            get_account_concurrency_key(service_account_id),
+        )
+        self.holder = holder or uuid.uuid4().hex
+        self.window = SENDER_INITIAL_CONCURRENCY
+        self.latency: Optional[float] = None
+
+    @classmethod
+    def for_sender(cls, sender: Dict) -> "AdaptiveConcurrency":
+        return cls(sender['service_account_id'], sender['user_email'])
+
+    def acquire(self) -> int:
+        """Window (sends in flight) for the next chunk. Falls back to the last window
+        if Redis is unavailable."""
+        try:
+            window, latency = _ACQUIRE(
+                keys=list(self.keys),
+                args=[self.holder, SENDER_INITIAL_CONCURRENCY, ACCOUNT_INITIAL_CONCURRENCY,
+                      HOLD_SECONDS, STATE_TTL_SECONDS],
+            )
+            self.window = int(window)
+            self.latency = float(latency) if latency else None
+        except redis.RedisError as e:
+            logger.warning(f"Could not read concurrency limits for {self.user_email}: {e}")
+        return self.window
+
+    def peek(self) -> int:
+        """Read the sender's window and latency without holding any concurrency."""
+        try:
+            limit, latency = redis_client.hmget(self.keys[0], "limit", "latency")
+            self.window = max(CONCURRENCY_MIN, int(float(limit))) if limit else SENDER_INITIAL_CONCURRENCY
+            self.latency = float(latency) if latency else None
+        except redis.RedisError as e:
+            logger.warning(f"Could not read concurrency limits for {self.user_email}: {e}")
+        return self.window
+
+    def chunk_size(self, target_seconds: float, minimum: int, maximum: int) -> int:
+        """Emails the current window sends in about `target_seconds` at the sender's
+        observed latency (after `acquire()` or `peek()`), within [minimum, maximum]."""
+        latency = self.latency or DEFAULT_LATENCY_SECONDS
+        return max(minimum, min(maximum, int(self.window * target_seconds / latency)))
+
+    def feedback(self, ok: int, throttled: int, mean_latency: Optional[float]) -> None:
+        """Apply one chunk's outcome: `ok` successful sends, `throttled` sends Gmail
+        throttled, and the mean latency of the successful ones."""
+        if not ok and not throttled:
+            return
+        try:
+            sender_limit, account_limit, decreased = _FEEDBACK(
+                keys=list(self.keys),
+                args=[ok, throttled, mean_latency or 0.0, ADDITIVE_STEP, BACKOFF_FACTOR, CONCURRENCY_MIN,
+                      LATENCY_TOLERANCE, LATENCY_EWMA_ALPHA, DECREASE_COOLDOWN_SECONDS, STATE_TTL_SECONDS,
+                      SENDER_INITIAL_CONCURRENCY, SENDER_MAX_CONCURRENCY,
+                      ACCOUNT_INITIAL_CONCURRENCY, ACCOUNT_MAX_CONCURRENCY],
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not update concurrency limits for {self.user_email}: {e}")
+            return
+        if decreased == "1":
+            CONCURRENCY_BACKOFFS.inc(service_account_id=self.service_account_id)
+            log_event(
+                logger, logging.WARNING, "concurrency_backoff", rate=5,
+                service_account_id=self.service_account_id, sender=self.user_email,
+                throttled=throttled, sender_limit=float(sender_limit), account_limit=float(account_limit),
+            )
+
+    def release(self) -> None:
+        """Drop this worker's in-flight hold on the account."""
+        try:
+            redis_client.hdel(self.keys[1], f"hold:{self.holder}")
+        except redis.RedisError as e:
+            logger.warning(f"Could not release concurrency hold for {self.user_email}: {e}")
+
+
+def timed_call(fn, *args):
+    """Call fn(*args); returns (result, seconds)."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
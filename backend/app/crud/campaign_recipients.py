@@ -0,0 +1,155 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import cast, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from app.email_addresses import normalize_email
+from app.models import CampaignRecipient, EmailLog, EmailStatus
+
+INSERT_CHUNK_SIZE = 5000
+READ_CHUNK_SIZE = 1000
+
+
+def count_campaign_recipients(db: Session, campaign_id: int) -> int:
+    return db.query(func.count(CampaignRecipient.id)).filter(
+        CampaignRecipient.campaign_id == campaign_id
+    ).scalar() or 0
+
+
+def get_unassigned_recipients(db: Session, campaign_id: int) -> Tuple[Optional[int], int]:
+    """(first ordinal, count) of recipients not yet assigned to a sender (deferred)."""
+    first, count = db.query(
+        func.min(CampaignRecipient.ordinal), func.count(CampaignRecipient.id)
+    ).filter(
+        CampaignRecipient.campaign_id == campaign_id,
+        CampaignRecipient.sender_email.is_(None)
+    ).one()
+    return first, count or 0
+
+
+def add_campaign_recipients(
+    db: Session,
+    campaign_id: int,
+    recipients: Iterable[Dict[str, Any]],
+    start_ordinal: int = 0
+) -> int:
+    """Insert recipients in chunks, numbering them from start_ordinal. Returns rows added."""
+    ordinal = start_ordinal
+    batch = []
+    for recipient in recipients:
+        email = normalize_email(recipient.get('email'))
+        if not email:
+            continue
+        batch.append({
+            'campaign_id': campaign_id,
+            'ordinal': ordinal,
+            'email': email,
+            'variables': recipient.get('variables') or {},
+        })
+        ordinal += 1
+        if len(batch) >= INSERT_CHUNK_SIZE:
+            db.execute(insert(CampaignRecipient), batch)
+            batch = []
+    if batch:
+        db.execute(insert(CampaignRecipient), batch)
+    return ordinal - start_ordinal
+
+
+def replace_campaign_recipients(db: Session, campaign_id: int, recipients: Iterable[Dict[str, Any]]) -> int:
+    db.execute(delete(CampaignRecipient).where(CampaignRecipient.campaign_id == campaign_id))
+    return add_campaign_recipients(db, campaign_id, recipients)
+
+
+def copy_campaign_recipients(db: Session, source_campaign_id: int, target_campaign_id: int) -> int:
+    """Copy all recipients server-side with a single INSERT ... SELECT."""
+    source = select(
+        literal(target_campaign_id),
+        CampaignRecipient.ordinal,
+        CampaignRecipient.email,
+        CampaignRecipient.variables,
+    ).where(CampaignRecipient.campaign_id == source_campaign_id)
+    result = db.execute(
+        insert(CampaignRecipient).from_select(
+            ['campaign_id', 'ordinal', 'email', 'variables'], source
+        )
+    )
+    return result.rowcount
+
+
+def iter_campaign_recipients(
+    db: Session,
+    campaign_id: int,
+    chunk_size: int = READ_CHUNK_SIZE
+) -> Iterator[Sequence[Any]]:
+    """Yield recipients in ordinal order, chunk by chunk, from a server-side cursor."""
+    stmt = (
+        select(
+            CampaignRecipient.id,
+            CampaignRecipient.ordinal,
+            CampaignRecipient.email,
+            CampaignRecipient.variables,
+        )
+        .where(CampaignRecipient.campaign_id == campaign_id)
+        .order_by(CampaignRecipient.ordinal)
+        .execution_options(yield_per=chunk_size)
+    )
+    for partition in db.execute(stmt).partitions():
+        yield partition
+
+
+def get_recipient_variables(db: Session, campaign_id: int, emails: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Map email -> variables for the given emails (first occurrence wins)."""
+    variables_by_email: Dict[str, Dict[str, Any]] = {}
+    unique_emails = list(dict.fromkeys(emails))
+    for start in range(0, len(unique_emails), READ_CHUNK_SIZE):
+        rows = db.execute(
+            select(CampaignRecipient.email, CampaignRecipient.variables)
+            .where(
+                CampaignRecipient.campaign_id == campaign_id,
+                CampaignRecipient.email.in_(unique_emails[start:start + READ_CHUNK_SIZE])
+            )
+            .order_by(CampaignRecipient.ordinal)
+        )
+        for email, variables in rows:
+            variables_by_email.setdefault(email, variables or {})
+    return variables_by_email
+
+
+def assign_sender_block(
+    db: Session,
+    campaign_id: int,
+    start_ordinal: int,
+    end_ordinal: int,
+    sender: Dict[str, Any],
+    subject: str
+) -> None:
+    """Assign recipients [start_ordinal, end_ordinal) to a sender and create their EmailLogs server-side."""
+    in_block = (
+        (CampaignRecipient.campaign_id == campaign_id)
+        & (CampaignRecipient.ordinal >= start_ordinal)
+        & (CampaignRecipient.ordinal < end_ordinal)
+    )
+    db.execute(
+        update(CampaignRecipient)
+        .where(in_block)
+        .values(
+            service_account_id=sender['service_account_id'],
+            sender_email=sender['user_email'],
+        )
+    )
+    source = select(
+        literal(campaign_id),
+        CampaignRecipient.email,
+        func.coalesce(CampaignRecipient.variables['name'].astext, ''),
+        literal(sender['user_email']),
+        literal(sender['service_account_id']),
+        literal(subject, type_=EmailLog.subject.type),
+        cast(literal(EmailStatus.PENDING, type_=EmailLog.status.type), EmailLog.status.type),
+    ).where(in_block).order_by(CampaignRecipient.ordinal)
+    db.execute(
+        insert(EmailLog).from_select(
+            ['campaign_id', 'recipient_email', 'recipient_name', 'sender_email',
+             'service_account_id', 'subject', 'status'],
+            source
+        )
+    )
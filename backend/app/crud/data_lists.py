@@ -1,5 +1,61 @@
+from typing import Iterable, List
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from app import models, schemas
+from app.email_addresses import normalize_email
+
+MEMBER_CHUNK_SIZE = 5000
+
+def _unique_emails(emails: Iterable[str]) -> List[str]:
+    return [e for e in dict.fromkeys(normalize_email(email) for email in emails) if e]
+
+def _adjust_total(db: Session, data_list_id: int, delta: int):
+    if delta:
+        db.execute(
+            update(models.DataList)
+            .where(models.DataList.id == data_list_id)
+            .values(total_recipients=models.DataList.total_recipients + delta)
+        )
+
+def add_data_list_members(db: Session, data_list_id: int, emails: Iterable[str]) -> int:
+    """INSERT ... ON CONFLICT DO NOTHING; returns how many emails were new. Caller commits."""
+    unique_emails = _unique_emails(emails)
+    added = 0
+    for start in range(0, len(unique_emails), MEMBER_CHUNK_SIZE):
+        chunk = unique_emails[start:start + MEMBER_CHUNK_SIZE]
+        result = db.execute(
+            insert(models.DataListMember)
+            .values([{'data_list_id': data_list_id, 'email': email} for email in chunk])
+            .on_conflict_do_nothing(index_elements=['data_list_id', 'email'])
+        )
+        added += result.rowcount
+    _adjust_total(db, data_list_id, added)
+    return added
+
+def remove_data_list_members(db: Session, data_list_id: int, emails: Iterable[str]) -> int:
+    """Single set-based DELETE per chunk; returns how many members were removed. Caller commits."""
+    unique_emails = _unique_emails(emails)
+    removed = 0
+    for start in range(0, len(unique_emails), MEMBER_CHUNK_SIZE):
+        result = db.execute(
+            delete(models.DataListMember).where(
+                models.DataListMember.data_list_id == data_list_id,
+                models.DataListMember.email.in_(unique_emails[start:start + MEMBER_CHUNK_SIZE])
+            )
+        )
+        removed += result.rowcount
+    _adjust_total(db, data_list_id, -removed)
+    return removed
+
+def replace_data_list_members(db: Session, data_list_id: int, emails: Iterable[str]) -> int:
+    db.execute(delete(models.DataListMember).where(models.DataListMember.data_list_id == data_list_id))
+    db.execute(
+        update(models.DataList)
+        .where(models.DataList.id == data_list_id)
+        .values(total_recipients=0)
+    )
+    return add_data_list_members(db, data_list_id, emails)
 
 def get_data_list(db: Session, data_list_id: int):
     return db.query(models.DataList).filter(models.DataList.id == data_list_id).first()
@@ -11,10 +67,12 @@ def create_data_list(db: Session, data_list: schemas.DataListCreate):
     db_data_list = models.DataList(
         name=data_list.name,
         description=data_list.description,
-        recipients=data_list.recipients,
-        total_recipients=len(data_list.recipients)
+        list_type=data_list.list_type,
+        total_recipients=0
     )
     db.add(db_data_list)
+    db.flush()
+    add_data_list_members(db, db_data_list.id, data_list.recipients or [])
     db.commit()
     db.refresh(db_data_list)
     return db_data_list
@@ -23,10 +81,11 @@ def update_data_list(db: Session, data_list_id: int, data_list: schemas.DataList
     db_data_list = get_data_list(db, data_list_id)
     if db_data_list:
         update_data = data_list.dict(exclude_unset=True)
+        recipients = update_data.pop('recipients', None)
         for key, value in update_data.items():
             setattr(db_data_list, key, value)
-        if 'recipients' in update_data:
-            db_data_list.total_recipients = len(update_data['recipients'])
+        if recipients is not None:
+            replace_data_list_members(db, data_list_id, recipients)
         db.commit()
         db.refresh(db_data_list)
     return db_data_list
@@ -8,6 +8,7 @@ from app.models import ServiceAccount, EmailLog, EmailStatus
 from datetime import date, datetime, timedelta
 import logging
 from app.celery_app import celery_app
+from app.quota_ledger import get_usage, record_sent
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +17,8 @@ logger = logging.getLogger(__name__)
 def reset_daily_limits():
     """
     Celery task to reset daily limits for all accounts
-    Called automatically every day at midnight
+    No longer scheduled: the quota ledger is keyed by UTC day and
+    reconcile_quota_ledger rolls the Postgres counters over
     """
     logger.info("🔄 Starting daily limit reset task...")
     db = next(get_db())
@@ -57,24 +59,19 @@ def check_and_reset_daily_limits(db: Session):
 def check_daily_limit(account_id: int, emails_to_send: int, db: Session) -> tuple[bool, int, int]:
     """
     Check if account can send the requested number of emails today
+    (read from the Redis quota ledger; use quota_ledger.reserve to actually hold capacity)
     Returns: (can_send, remaining_limit, would_exceed_by)
     """
     try:
-        account = db.query(ServiceAccount).filter(ServiceAccount.id == account_id).first()
-        if not account:
+        daily_limit = db.query(ServiceAccount.daily_limit).filter(ServiceAccount.id == account_id).scalar()
+        if daily_limit is None:
             return False, 0, emails_to_send
         
-        today = date.today()
-        if account.daily_reset_date < today:
-            account.total_sent_all_time += account.daily_sent
-            account.daily_sent = 0
-            account.daily_reset_date = today
-            db.commit()
-            logger.info(f"🔄 Auto-reset daily limit for account {account.name}")
-        
-        remaining_limit = account.daily_limit - account.daily_sent
+        usage = get_usage(account_id)["account"]
+        committed = usage["used"] + usage["held"]
+        remaining_limit = daily_limit - committed
         can_send = remaining_limit >= emails_to_send
-        would_exceed_by = max(0, (account.daily_sent + emails_to_send) - account.daily_limit)
+        would_exceed_by = max(0, (committed + emails_to_send) - daily_limit)
         
         return can_send, remaining_limit, would_exceed_by
         
@@ -85,16 +82,13 @@ def check_daily_limit(account_id: int, emails_to_send: int, db: Session) -> tupl
 
 def update_daily_sent(db: Session, account_id: int, sent_count: int):
     """
-    Update the daily sent count for an account
+    Update the daily sent count for an account (in the quota ledger; Postgres
+    catches up on the next reconcile_quota_ledger run)
     """
     try:
-        account = db.query(ServiceAccount).filter(ServiceAccount.id == account_id).first()
-        if account:
-            account.daily_sent += sent_count
-            db.commit()
+        record_sent(account_id, sent_count)
     except Exception as e:
         logger.error(f"❌ Error updating daily sent for account {account_id}: {e}")
-        db.rollback()
 
 
 def get_account_statistics(db: Session, account_id: int) -> dict:
@@ -0,0 +1,177 @@
+"""
+Database round-trip accounting per HTTP request and per Celery task
+
+SQLAlchemy cursor events count every statement and its wall time into the
+`QueryStats` of the current unit of work: an HTTP request (opened by
+PerformanceMiddleware, reported in the `X-DB-Queries` / `X-DB-Time` headers and
+the request log line) or a Celery task (opened and logged by the task_prerun /
+task_postrun handlers below). N+1 patterns show up as per-request or per-task
+query counts instead of guesses.
+
+Statements slower than settings.DB_SLOW_QUERY_MS are logged with their
+parameters redacted: only the parameter names (or count) and value types are
+kept, never values, since they include recipient addresses and credentials.
+
+Totals are also exported as counters labelled by `source` (route template or
+task name), added once per finished unit. Statements run outside a tracked unit
+(threads started by a task, startup code) count under source="untracked".
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from celery.signals import task_postrun, task_prerun
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.metrics import Counter
+from app.structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+MAX_LOGGED_STATEMENT_CHARS = 2000
+SLOW_QUERY_LOG_RATE = 20.0  # slow-query log lines per second per process
+
+DB_QUERIES = Counter(
+    "speedsend_db_queries_total", "SQL statements executed", ("source",)
+)
+DB_QUERY_SECONDS = Counter(
+    "speedsend_db_query_seconds_total", "Time spent executing SQL statements", ("source",)
+)
+DB_SLOW_QUERIES = Counter(
+    "speedsend_db_slow_queries_total", "SQL statements slower than DB_SLOW_QUERY_MS", ("source",)
+)
+
+
+class QueryStats:
+    """Statement count and DB time of one request or task."""
+    __slots__ = ("source", "queries", "seconds", "slow", "_lock")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.queries = 0
+        self.seconds = 0.0
+        self.slow = 0
+        # Sync routes and their dependencies run on different threadpool threads
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, slow: bool) -> None:
+        with self._lock:
+            self.queries += 1
+            self.seconds += seconds
+            self.slow += slow
+
+    @property
+    def milliseconds(self) -> float:
+        return round(self.seconds * 1000.0, 2)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+_task_tokens: Dict[str, object] = {}
+
+
+@contextmanager
+def track_queries(source: str):
+    """Count the statements executed in this context (and contexts copied from it,
+    e.g. run_in_threadpool) into a fresh QueryStats, which is yielded."""
+    stats = QueryStats(source)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def record_totals(stats: QueryStats, source: str) -> None:
+    """Add a finished unit's totals to the counters under `source` (a bounded label:
+    route template or task name, not a raw path)."""
+    DB_QUERIES.inc(stats.queries, source=source)
+    DB_QUERY_SECONDS.inc(stats.seconds, source=source)
+    DB_SLOW_QUERIES.inc(stats.slow, source=source)
+
+
+def _redacted_parameters(parameters, executemany: bool):
+    if executemany:
+        return {"rows": len(parameters)}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    stats = _current.get()
+    source = stats.source if stats is not None else "untracked"
+    slow = elapsed * 1000.0 >= settings.DB_SLOW_QUERY_MS
+
+    if stats is not None:
+        stats.add(elapsed, slow)
+    else:
+        DB_QUERIES.inc(source=source)
+        DB_QUERY_SECONDS.inc(elapsed, source=source)
+        DB_SLOW_QUERIES.inc(int(slow), source=source)
+    if slow:
+        log_event(
+            logger, logging.WARNING, "slow_query", rate=SLOW_QUERY_LOG_RATE,
+            source=source,
+            duration_ms=round(elapsed * 1000.0, 2),
+            statement=" ".join(statement.split())[:MAX_LOGGED_STATEMENT_CHARS],
+            parameters=_redacted_parameters(parameters, executemany),
+        )
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute is not called for failed statements; drop their start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def install(engine: Engine) -> None:
+    """Attach the query accounting listeners to `engine`."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+@task_prerun.connect
+def _start_task_tracking(task_id=None, task=None, **kwargs):
+    stats = QueryStats(task.name if task is not None else "task")
+    _task_tokens[task_id] = (stats, _current.set(stats), time.perf_counter())
+
+
+@task_postrun.connect
+def _finish_task_tracking(task_id=None, task=None, state=None, **kwargs):
+    entry = _task_tokens.pop(task_id, None)
+    if entry is None:
+        return
+    stats, token, started = entry
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Reset from a different context than the prerun handler ran in
+        _current.set(None)
+    if not stats.queries:
+        return
+    record_totals(stats, stats.source)
+    log_event(
+        logger, logging.INFO, "task_db_usage",
+        task=stats.source,
+        task_id=task_id,
+        state=state,
+        db_queries=stats.queries,
+        db_ms=stats.milliseconds,
+        db_slow_queries=stats.slow,
+        duration_ms=round((time.perf_counter() - started) * 1000.0, 2),
+    )
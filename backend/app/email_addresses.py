@@ -0,0 +1,13 @@
+"""
+Recipient email normalization
+
+Every path that stores a recipient email (contacts, data list members,
+campaign recipients, bulk imports) stores it in this form, so the same address
+typed with different case or surrounding spaces is one recipient and the
+per-list uniqueness checks hold.
+"""
+
+
+def normalize_email(email) -> str:
+    """Stored form of a recipient email: trimmed and lowercased ('' for none)."""
+    return (email or '').strip().lower()
@@ -7,9 +7,25 @@ from email.mime.base import MIMEBase
 from email import encoders
 import base64
 import json
+import logging
 from typing import List, Dict, Optional
 from app.config import settings
 from app.encryption import encryption_service
+from app.structured_logging import log_event
+from app.metrics import google_api_call
+from app.timings import StageClock
+
+logger = logging.getLogger(__name__)
+
+
+def build_google_service(service_name: str, version: str, credentials):
+    """Build a googleapiclient service, routed to GOOGLE_API_BASE_URL when configured."""
+    if settings.GOOGLE_API_BASE_URL:
+        return build(
+            service_name, version, credentials=credentials, cache_discovery=False,
+            client_options={'api_endpoint': settings.GOOGLE_API_BASE_URL.rstrip('/') + '/'}
+        )
+    return build(service_name, version, credentials=credentials)
 
 
 class GoogleWorkspaceService:
@@ -36,8 +52,11 @@ class GoogleWorkspaceService:
         Returns:
             Delegated credentials object
         """
+        info = self.service_account_info
+        if settings.GOOGLE_API_BASE_URL:
+            info = {**info, 'token_uri': settings.GOOGLE_API_BASE_URL.rstrip('/') + '/token'}
         credentials = service_account.Credentials.from_service_account_info(
-            self.service_account_info,
+            info,
             scopes=scopes
         )
         delegated_credentials = credentials.with_subject(user_email)
@@ -160,13 +179,13 @@ class GoogleWorkspaceService:
             
             logger.info("✅ Credentials created successfully")
             
-            service = build('admin', 'directory_v1', credentials=credentials)
+            service = build_google_service('admin', 'directory_v1', credentials)
             
             logger.info("🌐 Admin Directory service built, requesting users...")
             
             # First, try to get domain info to verify access
             try:
-                domain_info = service.domains().list(customer='my_customer').execute()
+                domain_info = google_api_call(service.domains().list(customer='my_customer'), 'admin.domains.list')
                 logger.info(f"🌐 Domain info: {domain_info}")
             except Exception as e:
                 logger.warning(f"⚠️ Could not fetch domain info: {e}")
@@ -176,12 +195,12 @@ class GoogleWorkspaceService:
             
             while True:
                 try:
-                    results = service.users().list(
+                    results = google_api_call(service.users().list(
                         customer='my_customer',
                         maxResults=500,
                         orderBy='email',
                         pageToken=page_token
-                    ).execute()
+                    ), 'admin.users.list')
                     
                     logger.info(f"📊 API Response: {results}")
                     users.extend(results.get('users', []))
@@ -268,110 +287,134 @@ class GoogleWorkspaceService:
             Message ID of sent email
         """
         try:
+            clock = StageClock()
             credentials = self.get_delegated_credentials(sender_email, settings.GMAIL_SCOPES)
-            service = build('gmail', 'v1', credentials=credentials)
+            service = build_google_service('gmail', 'v1', credentials)
+            clock.lap("send.credentials")
             # Quick pre-check: ensure Gmail is enabled for user
             try:
-                service.users().getProfile(userId='me').execute()
+                google_api_call(service.users().getProfile(userId='me'), 'gmail.getProfile')
             except HttpError as precheck:
                 # Translate common failure clearly
                 if hasattr(precheck, 'content') and b'Mail service not enabled' in getattr(precheck, 'content', b''):
-                    raise Exception("Gmail is not enabled for this user. Enable Gmail for the account or choose another sender.")
+                    raise Exception("Gmail is not enabled for this user. Enable Gmail for the account or choose another sender.") from precheck
                 raise
+            clock.lap("send.precheck")
             
-            # Create message (normalize bodies to strings)
-            if body_html is not None and not isinstance(body_html, str):
-                try:
-                    if isinstance(body_html, list):
-                        body_html = "\n".join([str(x) for x in body_html])
-                    else:
-                        import json as _json
-                        body_html = _json.dumps(body_html)
-                except Exception:
-                    body_html = str(body_html)
-            if body_plain is not None and not isinstance(body_plain, str):
-                try:
-                    if isinstance(body_plain, list):
-                        body_plain = "\n".join([str(x) for x in body_plain])
-                    else:
-                        import json as _json
-                        body_plain = _json.dumps(body_plain)
-                except Exception:
-                    body_plain = str(body_plain)
-
-            # Create message
-            if body_html and body_plain:
-                message = MIMEMultipart('alternative')
-                part1 = MIMEText(body_plain, 'plain', 'utf-8')
-                part2 = MIMEText(body_html, 'html', 'utf-8')
-                message.attach(part1)
-                message.attach(part2)
-            elif body_html:
-                # HTML-only: Create multipart to ensure proper Content-Type
-                message = MIMEMultipart('alternative')
-                # Add plain text fallback
-                plain_part = MIMEText("This email contains HTML content.", 'plain', 'utf-8')
-                html_part = MIMEText(body_html, 'html', 'utf-8')
-                message.attach(plain_part)
-                message.attach(html_part)
-            else:
-                message = MIMEText(body_plain or '', 'plain', 'utf-8')
-            
-            message['To'] = recipient_email
-            # Force display name if provided, otherwise default to raw email
-            forced_from = f"{from_name} <{sender_email}>" if from_name else sender_email
-            message['From'] = forced_from
-            # Reinforce for providers that ignore From display name
-            message['Sender'] = forced_from
-            message['Reply-To'] = forced_from
-            message['Subject'] = subject
-            
-            # Add custom headers
-            if custom_headers:
-                for key, value in custom_headers.items():
-                    message[key] = value
-            
-            # Add attachments (if provided)
-            if attachments:
-                # Convert to multipart if not already
-                if not isinstance(message, MIMEMultipart):
-                    old_message = message
-                    message = MIMEMultipart()
-                    message['To'] = recipient_email
-                    message['From'] = sender_email
-                    message['Subject'] = subject
-                    message.attach(old_message)
-                
-                for attachment in attachments:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(base64.b64decode(attachment['content']))
-                    encoders.encode_base64(part)
-                    part.add_header(
-                        'Content-Disposition',
-                        f'attachment; filename={attachment["filename"]}'
-                    )
-                    message.attach(part)
+            message = self._build_message(
+                sender_email, recipient_email, subject, body_html, body_plain,
+                from_name, custom_headers, attachments
+            )
             
             # Encode and send
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
             send_message = {'raw': raw_message}
+            clock.lap("send.mime_build")
             
-            result = service.users().messages().send(
+            result = google_api_call(service.users().messages().send(
                 userId='me',
                 body=send_message
-            ).execute()
+            ), 'gmail.messages.send')
+            clock.lap("send.http")
             
             return result['id']
         
         except HttpError as error:
-            raise Exception(f"Failed to send email: {error}")
+            raise Exception(f"Failed to send email: {error}") from error
+
+    def _build_message(
+        self,
+        sender_email: str,
+        recipient_email: str,
+        subject: str,
+        body_html: Optional[str] = None,
+        body_plain: Optional[str] = None,
+        from_name: Optional[str] = None,
+        custom_headers: Optional[Dict[str, str]] = None,
+        attachments: Optional[List[Dict]] = None
+    ):
+        """Build the MIME message sent by send_email()"""
+        # Create message (normalize bodies to strings)
+        if body_html is not None and not isinstance(body_html, str):
+            try:
+                if isinstance(body_html, list):
+                    body_html = "\n".join([str(x) for x in body_html])
+                else:
+                    import json as _json
+                    body_html = _json.dumps(body_html)
+            except Exception:
+                body_html = str(body_html)
+        if body_plain is not None and not isinstance(body_plain, str):
+            try:
+                if isinstance(body_plain, list):
+                    body_plain = "\n".join([str(x) for x in body_plain])
+                else:
+                    import json as _json
+                    body_plain = _json.dumps(body_plain)
+            except Exception:
+                body_plain = str(body_plain)
+
+        # Create message
+        if body_html and body_plain:
+            message = MIMEMultipart('alternative')
+            part1 = MIMEText(body_plain, 'plain', 'utf-8')
+            part2 = MIMEText(body_html, 'html', 'utf-8')
+            message.attach(part1)
+            message.attach(part2)
+        elif body_html:
+            # HTML-only: Create multipart to ensure proper Content-Type
+            message = MIMEMultipart('alternative')
+            # Add plain text fallback
+            plain_part = MIMEText("This email contains HTML content.", 'plain', 'utf-8')
+            html_part = MIMEText(body_html, 'html', 'utf-8')
+            message.attach(plain_part)
+            message.attach(html_part)
+        else:
+            message = MIMEText(body_plain or '', 'plain', 'utf-8')
+
+        message['To'] = recipient_email
+        # Force display name if provided, otherwise default to raw email
+        forced_from = f"{from_name} <{sender_email}>" if from_name else sender_email
+        message['From'] = forced_from
+        # Reinforce for providers that ignore From display name
+        message['Sender'] = forced_from
+        message['Reply-To'] = forced_from
+        message['Subject'] = subject
+
+        # Add custom headers
+        if custom_headers:
+            for key, value in custom_headers.items():
+                message[key] = value
+
+        # Add attachments (if provided)
+        if attachments:
+            # Convert to multipart if not already
+            if not isinstance(message, MIMEMultipart):
+                old_message = message
+                message = MIMEMultipart()
+                message['To'] = recipient_email
+                message['From'] = sender_email
+                message['Subject'] = subject
+                message.attach(old_message)
+
+            for attachment in attachments:
+                part = MIMEBase('application', 'octet-stream')
+                part.set_payload(base64.b64decode(attachment['content']))
+                encoders.encode_base64(part)
+                part.add_header(
+                    'Content-Disposition',
+                    f'attachment; filename={attachment["filename"]}'
+                )
+                message.attach(part)
+        
+        return message
 
     def is_gmail_enabled(self, sender_email: str) -> bool:
         """Return True if Gmail is enabled for the delegated user, else False."""
         try:
             credentials = self.get_delegated_credentials(sender_email, settings.GMAIL_SCOPES)
-            service = build('gmail', 'v1', credentials=credentials)
-            service.users().getProfile(userId='me').execute()
+            service = build_google_service('gmail', 'v1', credentials)
+            google_api_call(service.users().getProfile(userId='me'), 'gmail.getProfile')
             return True
         except HttpError as e:
             if hasattr(e, 'content') and b'Mail service not enabled' in getattr(e, 'content', b''):
@@ -407,15 +450,18 @@ class GoogleWorkspaceService:
             Message ID of sent email
         """
         try:
+            clock = StageClock()
             credentials = self.get_delegated_credentials(sender_email, settings.GMAIL_SCOPES)
-            service = build('gmail', 'v1', credentials=credentials)
+            service = build_google_service('gmail', 'v1', credentials)
+            clock.lap("send.credentials")
             # Pre-check Gmail enabled
             try:
-                service.users().getProfile(userId='me').execute()
+                google_api_call(service.users().getProfile(userId='me'), 'gmail.getProfile')
             except HttpError as precheck:
                 if hasattr(precheck, 'content') and b'Mail service not enabled' in getattr(precheck, 'content', b''):
-                    raise Exception("Gmail is not enabled for this user. Enable Gmail for the account or choose another sender.")
+                    raise Exception("Gmail is not enabled for this user. Enable Gmail for the account or choose another sender.") from precheck
                 raise
+            clock.lap("send.precheck")
             
             # Build raw email with custom headers
             raw_email = self._build_raw_email_with_headers(
@@ -429,29 +475,29 @@ class GoogleWorkspaceService:
                 attachments=attachments
             )
             
-            # Debug: Log the raw email headers
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"🔍 RAW EMAIL HEADERS:")
-            logger.info(f"📧 Raw email preview: {raw_email[:500]}...")
-            if custom_headers:
-                logger.info(f"🎯 Custom headers being sent: {custom_headers}")
+            log_event(
+                logger, logging.DEBUG, "gmail.send_raw", sample=0.01,
+                sender=sender_email, recipient=recipient_email,
+                raw_length=len(raw_email), custom_headers=custom_headers
+            )
             
             # Encode and send
             raw_message = base64.urlsafe_b64encode(raw_email.encode()).decode()
             send_message = {
                 'raw': raw_message
             }
+            clock.lap("send.mime_build")
             # Use send() so the email is actually delivered
-            result = service.users().messages().send(
+            result = google_api_call(service.users().messages().send(
                 userId='me',
                 body=send_message
-            ).execute()
+            ), 'gmail.messages.send')
+            clock.lap("send.http")
             
             return result['id']
         
         except HttpError as error:
-            raise Exception(f"Failed to send email: {error}")
+            raise Exception(f"Failed to send email: {error}") from error
     
     def _build_raw_email_with_headers(
         self,
@@ -499,9 +545,6 @@ class GoogleWorkspaceService:
         body_html = body_html or ""  # Ensure not None
         body_plain = body_plain or ""  # Ensure not None
         
-        logger = logging.getLogger(__name__)
-        logger.info(f"📧 Building email - body_html length: {len(body_html) if body_html else 0}, body_plain length: {len(body_plain) if body_plain else 0}")
-        
         # Build message with body content FIRST (this is critical!)
         # CRITICAL: Check for non-empty strings (strip whitespace to handle empty HTML)
         body_html_has_content = body_html and body_html.strip()
@@ -513,7 +556,6 @@ class GoogleWorkspaceService:
             part2 = MIMEText(body_html, 'html', 'utf-8')
             message.attach(part1)
             message.attach(part2)
-            logger.info(f"📧 Attached both plain ({len(body_plain)} chars) and HTML ({len(body_html)} chars) parts")
         elif body_html_has_content:
             # HTML-only: Create multipart to ensure proper Content-Type
             message = MIMEMultipart('alternative')
@@ -522,15 +564,12 @@ class GoogleWorkspaceService:
             html_part = MIMEText(body_html, 'html', 'utf-8')
             message.attach(plain_part)
             message.attach(html_part)
-            logger.info(f"📧 Attached HTML-only part ({len(body_html)} chars)")
         elif body_plain_has_content:
             message = MIMEText(body_plain, 'plain', 'utf-8')
-            logger.info(f"📧 Created plain text only part ({len(body_plain)} chars)")
         else:
             # No body content - this should not happen, but create empty plain text as fallback
-            logger.warning(f"⚠️ WARNING: No body content provided! body_html='{body_html[:100] if body_html else 'None'}...', body_plain='{body_plain[:100] if body_plain else 'None'}...'")
+            log_event(logger, logging.WARNING, "mime.empty_body", rate=1, sender=sender_email)
             message = MIMEText("", 'plain', 'utf-8')
-            logger.info(f"📧 Created empty plain text part (fallback)")
         
         # Combine custom headers with essential headers
         # Essential headers (From, To, Subject) are set first, then overridden by custom_headers if present
@@ -552,7 +591,7 @@ class GoogleWorkspaceService:
                 
                 # CRITICAL: Do not allow custom headers to override MIME structural headers
                 if key_lower in ['content-type', 'mime-version', 'content-transfer-encoding']:
-                    logger.warning(f"⚠️ Skipping forbidden custom header: {key}")
+                    log_event(logger, logging.WARNING, "mime.forbidden_custom_header", rate=1, header=key)
                     continue
 
                 # Check if this custom header should override an essential header
@@ -589,21 +628,13 @@ class GoogleWorkspaceService:
                 )
                 message.attach(part)
         
-        # Debug: Log the final raw email
         raw_email = message.as_string()
-        logger.info(f"🔍 FINAL RAW EMAIL:")
-        logger.info(f"📧 Raw email length: {len(raw_email)} characters")
-        logger.info(f"📧 Raw email preview (first 500 chars): {raw_email[:500]}...")
-        # Check if body content is present
-        if isinstance(message, MIMEMultipart):
-            logger.info(f"📧 MIMEMultipart - payload count: {len(message._payload) if hasattr(message, '_payload') else 'N/A'}")
-            if hasattr(message, '_payload') and message._payload:
-                for i, part in enumerate(message._payload):
-                    payload = part.get_payload(decode=False) if hasattr(part, 'get_payload') else 'N/A'
-                    logger.info(f"📧 Part {i} type: {part.get_content_type() if hasattr(part, 'get_content_type') else 'N/A'}, payload length: {len(payload) if payload else 0}")
-        else:
-            payload = message.get_payload(decode=False) if hasattr(message, 'get_payload') else 'N/A'
-            logger.info(f"📧 Single part - payload length: {len(payload) if payload else 0}")
+        log_event(
+            logger, logging.DEBUG, "mime.built", sample=0.01,
+            recipient=recipient_email, raw_length=len(raw_email),
+            body_html_length=len(body_html), body_plain_length=len(body_plain),
+            content_type=message.get_content_type()
+        )
         
         return raw_email
     
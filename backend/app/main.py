@@ -1,21 +1,23 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
+from anyio import to_thread
 import logging
 
 from app.config import settings
+from app.structured_logging import configure_logging
+from app.metrics import render_metrics
 from app.database import engine, Base
-from app.routers import accounts, users, campaigns, dashboard, test_email, drafts, contacts, data_lists
+from app.routers import accounts, users, campaigns, dashboard, test_email, drafts, contacts, data_lists, imports
 from app.routers import send as send_router
 from app.routers import accounts_sync_stub
+from app.routers import admin
 from app.middleware import PerformanceMiddleware
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configure_logging(settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
@@ -26,6 +28,11 @@ async def lifespan(app: FastAPI):
     """
     # Startup: Create database tables
     logger.info("Starting Gmail Bulk Sender SaaS...")
+    
+    # Routes are plain `def` (sync SQLAlchemy / redis-py), so they run in the
+    # anyio threadpool; match its size to the DB connection pool
+    to_thread.current_default_thread_limiter().total_tokens = settings.API_THREADPOOL_SIZE
+    logger.info(f"API threadpool size: {settings.API_THREADPOOL_SIZE}")
     try:
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created/verified")
@@ -99,9 +106,11 @@ app.include_router(dashboard.router, prefix=settings.API_V1_PREFIX)
 app.include_router(test_email.router, prefix=settings.API_V1_PREFIX)
 app.include_router(contacts.router, prefix=settings.API_V1_PREFIX)
 app.include_router(data_lists.router, prefix=settings.API_V1_PREFIX)
+app.include_router(imports.router, prefix=settings.API_V1_PREFIX)
 app.include_router(drafts.router, prefix=settings.API_V1_PREFIX)
 app.include_router(send_router.router, prefix=settings.API_V1_PREFIX)
 app.include_router(accounts_sync_stub.router, prefix=settings.API_V1_PREFIX)
+app.include_router(admin.router, prefix=settings.API_V1_PREFIX)
 
 logger.info(f"All routers loaded")
 logger.info(f"API Documentation: /docs (disabled in production)")
@@ -120,6 +129,14 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus metrics, aggregated across API and worker processes
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check():
     """
@@ -0,0 +1,301 @@
+"""
+Prometheus-style metrics shared by the API and the Celery workers
+
+The API and the workers run in separate processes (and containers) that only
+share Redis, so metrics are aggregated there instead of in a per-process
+registry: each process accumulates increments in memory and a background
+thread flushes them every FLUSH_INTERVAL seconds with one pipelined
+HINCRBYFLOAT batch. `render_metrics()` reads the hashes back and produces the
+Prometheus text exposition format for `/metrics`.
+
+Gauges are per process: each writer stores its value under an `instance` label
+and values not refreshed within GAUGE_STALE_SECONDS are dropped at render time.
+"""
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import redis
+
+from app.celery_app import celery_app
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0
+GAUGE_STALE_SECONDS = 60
+METRICS_KEY_PREFIX = "metrics:"
+DEFAULT_LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Broker queues whose length is reported: every queue the workers consume
+CELERY_QUEUES = tuple(queue.name for queue in celery_app.conf.task_queues)
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_string(labelnames: Sequence[str], labels: Dict) -> str:
+    return ",".join(f'{name}="{_escape(labels.get(name, ""))}"' for name in labelnames)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Buffer:
+    """Process-local pending increments, flushed to Redis in the background."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._flusher = None
+        self._flusher_pid = None
+
+    def add(self, key: str, field: str, amount: float) -> None:
+        with self._lock:
+            self._pending[(key, field)] += amount
+        self._ensure_flusher()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+        if not pending:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for (key, field), amount in pending.items():
+                pipe.hincrbyfloat(key, field, amount)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Dropped {len(pending)} metric updates: {e}")
+
+    def _ensure_flusher(self) -> None:
+        pid = os.getpid()
+        if self._flusher is not None and self._flusher_pid == pid and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher_pid == pid and self._flusher.is_alive():
+                return
+            self._flusher_pid = pid
+            self._flusher = threading.Thread(target=self._run, name="metrics-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run(self) -> None:
+        stop = threading.Event()
+        while not stop.wait(FLUSH_INTERVAL):
+            self.flush()
+
+
+_buffer = _Buffer()
+atexit.register(_buffer.flush)
+
+
+def buffered_increment(key: str, field: str, amount: float) -> None:
+    """Queue an HINCRBYFLOAT on any hash for the next background flush."""
+    _buffer.add(key, field, amount)
+
+
+def flush_pending() -> None:
+    """Write this process's pending increments now."""
+    _buffer.flush()
+
+_registry: List["_Metric"] = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    @property
+    def key(self) -> str:
+        return f"{METRICS_KEY_PREFIX}{self.name}"
+
+    def samples(self, raw: Dict[str, str]) -> List[str]:
+        return [
+            f"{self.name}{{{labels}}} {_format_value(float(value))}" if labels else f"{self.name} {_format_value(float(value))}"
+            for labels, value in sorted(raw.items())
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount:
+            _buffer.add(self.key, _label_string(self.labelnames, labels), amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        base = _label_string(self.labelnames, labels)
+        prefix = f"{base}," if base else ""
+        # Only the first matching bucket is stored; cumulative counts are built at render time
+        le = next((b for b in self.buckets if value <= b), None)
+        _buffer.add(self.key, f'{prefix}le="{_format_value(le) if le is not None else "+Inf"}"', 1)
+        _buffer.add(f"{self.key}:sum", base, value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def mean(self, **labels) -> Optional[float]:
+        """Mean observed value for one label set across all processes (flushed samples
+        only), or None before the first observation."""
+        base = _label_string(self.labelnames, labels)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hgetall(self.key)
+        pipe.hget(f"{self.key}:sum", base)
+        raw, total = pipe.execute()
+        prefix = f"{base},le=" if base else "le="
+        count = sum(float(value) for field, value in (raw or {}).items() if field.startswith(prefix))
+        return float(total) / count if count and total is not None else None
+
+    def samples(self, raw: Dict[str, str]) -> List[str]:
+        sums = redis_client.hgetall(f"{self.key}:sum") or {}
+        series: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for field, value in raw.items():
+            base, _, le = field.rpartition('le="')
+            series[base.rstrip(',')][le.rstrip('"')] = float(value)
+
+        lines = []
+        for base in sorted(series):
+            prefix = f"{base}," if base else ""
+            cumulative = 0.0
+            for bucket in [_format_value(b) for b in self.buckets] + ["+Inf"]:
+                cumulative += series[base].get(bucket, 0.0)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bucket}"}} {_format_value(cumulative)}')
+            labels = f"{{{base}}}" if base else ""
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(sums.get(base, 0)))}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Per-process gauge; each process reports under its own `instance` label."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, tuple(labelnames) + ("instance",))
+
+    def set(self, value: float, **labels) -> None:
+        # pid resolved per call: prefork children share the parent's module state
+        field = _label_string(self.labelnames, {**labels, "instance": f"{socket.gethostname()}:{os.getpid()}"})
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hset(self.key, field, value)
+            pipe.hset(f"{self.key}:ts", field, time.time())
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not set gauge {self.name}: {e}")
+
+    def samples(self, raw: Dict[str, str]) -> List[str]:
+        updated = redis_client.hgetall(f"{self.key}:ts") or {}
+        cutoff = time.time() - GAUGE_STALE_SECONDS
+        fresh = {field: value for field, value in raw.items() if float(updated.get(field, 0)) >= cutoff}
+        return super().samples(fresh)
+
+
+# Send pipeline
+EMAILS_TOTAL = Counter(
+    "speedsend_emails_total", "Emails processed by the send pipeline",
+    ("campaign_id", "service_account_id", "sender", "result")
+)
+SENDER_BATCH_SECONDS = Histogram(
+    "speedsend_sender_batch_seconds", "Wall time of one sender worker run in run_sender_worker",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600)
+)
+SEND_POOL_QUEUE_DEPTH = Gauge(
+    "speedsend_send_pool_queue_depth", "Sends submitted to a sender thread pool but not yet started"
+)
+
+# Gmail / Admin API
+GMAIL_API_SECONDS = Histogram(
+    "speedsend_gmail_api_seconds", "Google API call latency", ("endpoint",)
+)
+GMAIL_API_ERRORS = Counter(
+    "speedsend_gmail_api_errors_total", "Google API call failures", ("endpoint", "status")
+)
+
+# HTTP API
+HTTP_REQUESTS = Counter(
+    "speedsend_http_requests_total", "HTTP requests handled by the API", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "speedsend_http_request_seconds", "HTTP request latency", ("method", "route")
+)
+
+
+def google_api_call(request, endpoint: str):
+    """Execute a googleapiclient request, recording latency and errors by HTTP status."""
+    started = time.perf_counter()
+    try:
+        return request.execute()
+    except Exception as e:
+        status = getattr(getattr(e, 'resp', None), 'status', None) or type(e).__name__
+        GMAIL_API_ERRORS.inc(endpoint=endpoint, status=status)
+        raise
+    finally:
+        GMAIL_API_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+def _queue_length_lines() -> List[str]:
+    """Redis queue lengths, read at scrape time (Celery broker queues, campaign task lists and pools)."""
+    lines = [
+        "# HELP speedsend_redis_queue_length Items waiting in Redis-backed queues",
+        "# TYPE speedsend_redis_queue_length gauge",
+    ]
+    pipe = redis_client.pipeline(transaction=False)
+    for queue_name in CELERY_QUEUES:
+        pipe.llen(queue_name)
+    campaign_keys = list(redis_client.scan_iter(match="campaign:*:tasks", count=1000))
+    campaign_keys += list(redis_client.scan_iter(match="campaign:*:pool", count=1000))
+    for key in campaign_keys:
+        pipe.llen(key)
+    lengths = pipe.execute()
+    for queue_name, length in zip(CELERY_QUEUES, lengths):
+        lines.append(f'speedsend_redis_queue_length{{queue="{queue_name}"}} {length}')
+    for key, length in zip(campaign_keys, lengths[len(CELERY_QUEUES):]):
+        _, campaign_id, kind = key.split(":")
+        lines.append(f'speedsend_redis_queue_length{{queue="campaign_{kind}",campaign_id="{campaign_id}"}} {length}')
+    return lines
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of every registered metric, aggregated across processes."""
+    _buffer.flush()
+    pipe = redis_client.pipeline(transaction=False)
+    for metric in _registry:
+        pipe.hgetall(metric.key)
+    raw_values = pipe.execute()
+
+    lines: List[str] = []
+    for metric, raw in zip(_registry, raw_values):
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples(raw or {}))
+    lines.extend(_queue_length_lines())
+    return "\n".join(lines) + "\n"
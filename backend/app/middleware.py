@@ -2,36 +2,66 @@
 Middleware for production optimizations
 """
 from fastapi import Request
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
 import time
 import logging
 import uuid
 
+from app.admin_auth import is_admin_token
+from app.config import settings
+from app.db_stats import record_totals, track_queries
+from app.metrics import HTTP_REQUESTS, HTTP_REQUEST_SECONDS
+from app.profiling import StackSampler, endpoint_stacks, save_profile
+
 logger = logging.getLogger(__name__)
 
 
 class PerformanceMiddleware(BaseHTTPMiddleware):
-    """Structured timing + request ID logging"""
+    """Structured timing + request ID logging, per-request DB query counts, and
+    opt-in per-request profiling (`X-Profile: 1` with a valid `X-Admin-Token`)"""
 
     async def dispatch(self, request: Request, call_next):
         request_id = str(uuid.uuid4())
         request.state.request_id = request_id
         start_time = time.time()
-        try:
-            response = await call_next(request)
-        finally:
-            process_time = (time.time() - start_time) * 1000.0
-            logger.info(
-                {
-                    "event": "request_finished",
-                    "request_id": request_id,
-                    "method": request.method,
-                    "path": request.url.path,
-                    "status": getattr(locals().get('response', None), 'status_code', None),
-                    "duration_ms": round(process_time, 2),
-                }
+        sampler = None
+        if request.headers.get("x-profile") == "1" and is_admin_token(request.headers.get("x-admin-token")):
+            sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL).start()
+        # Set before call_next so the app's task (and its threadpool calls) inherit it
+        with track_queries(f"{request.method} {request.url.path}") as db_stats:
+            try:
+                response = await call_next(request)
+            finally:
+                process_time = (time.time() - start_time) * 1000.0
+                status = getattr(locals().get('response', None), 'status_code', None)
+                logger.info(
+                    {
+                        "event": "request_finished",
+                        "request_id": request_id,
+                        "method": request.method,
+                        "path": request.url.path,
+                        "status": status,
+                        "duration_ms": round(process_time, 2),
+                        "db_queries": db_stats.queries,
+                        "db_ms": db_stats.milliseconds,
+                    }
+                )
+                # Label by route template, not raw path, to keep series bounded
+                route = getattr(request.scope.get("route"), "path", "unmatched")
+                HTTP_REQUESTS.inc(method=request.method, route=route, status=status or 500)
+                HTTP_REQUEST_SECONDS.observe(process_time / 1000.0, method=request.method, route=route)
+                record_totals(db_stats, f"{request.method} {route}")
+                # Stopped even if the route raised; only a response gets its profile saved
+                counts = endpoint_stacks(sampler.stop(), request.scope.get("endpoint")) if sampler is not None else None
+        if counts is not None:
+            response.headers["X-Profile-Id"] = await run_in_threadpool(
+                save_profile, "request", counts, method=request.method, path=request.url.path, request_id=request_id
             )
         response.headers["X-Process-Time"] = str(process_time)
+        # Counted until the response starts; streaming bodies may query after this
+        response.headers["X-DB-Queries"] = str(db_stats.queries)
+        response.headers["X-DB-Time"] = str(db_stats.milliseconds)
         response.headers["X-Request-ID"] = request_id
         return response
 
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, JSON, ForeignKey, Enum, func
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, Time, JSON, ForeignKey, Enum, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 import enum
 from app.database import Base
+from app.email_addresses import normalize_email
 
 # Enums
 class AccountStatus(str, enum.Enum):
@@ -121,6 +123,9 @@ class ContactList(Base):
 # Contacts
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index("ix_contacts_list_email", "contact_list_id", "email"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     contact_list_id = Column(Integer, ForeignKey("contact_lists.id"), nullable=False)
@@ -142,13 +147,40 @@ class DataList(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     description = Column(Text)
-    recipients = Column(JSON)  # List of email addresses
-    total_recipients = Column(Integer, default=0)
+    total_recipients = Column(Integer, default=0)  # Maintained alongside data_list_members
     list_type = Column(String(50), default='custom')  # custom, imported, etc.
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Relationships
+    members = relationship("DataListMember", back_populates="data_list", cascade="all, delete-orphan", passive_deletes=True, order_by="DataListMember.id")
+    
+    @property
+    def recipients(self):
+        """Member email addresses for frontend compatibility"""
+        return [member.email for member in self.members]
+    
+    @recipients.setter
+    def recipients(self, emails):
+        unique_emails = [e for e in dict.fromkeys(normalize_email(email) for email in (emails or [])) if e]
+        self.members = [DataListMember(email=email) for email in unique_emails]
+        self.total_recipients = len(unique_emails)
+
+# Data List Members (one row per email, unique within a list)
+class DataListMember(Base):
+    __tablename__ = "data_list_members"
+    __table_args__ = (
+        Index("ix_data_list_members_list_email", "data_list_id", "email", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    data_list_id = Column(Integer, ForeignKey("data_lists.id", ondelete="CASCADE"), nullable=False)
+    email = Column(String(255), nullable=False)
+    
+    # Relationships
+    data_list = relationship("DataList", back_populates="members")
 
 # Campaigns
 class Campaign(Base):
@@ -168,8 +200,7 @@ class Campaign(Base):
     reply_to = Column(String(255))
     return_path = Column(String(255))
     
-    # Recipients
-    recipients = Column(JSON)
+    # Recipients (rows live in campaign_recipients)
     total_recipients = Column(Integer, default=0)
     
     # Sending configuration
@@ -197,6 +228,12 @@ class Campaign(Base):
     test_after_email = Column(String(255))
     test_after_count = Column(Integer, default=0)
     
+    # Scheduling (app.services.campaign_scheduler)
+    priority = Column(String(20), default="bulk")  # "test", "transactional" or "bulk"
+    start_at = Column(DateTime(timezone=True))
+    send_window_start = Column(Time)  # UTC
+    send_window_end = Column(Time)  # UTC
+    
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -211,6 +248,28 @@ class Campaign(Base):
     # Relationships
     sender_accounts = relationship("ServiceAccount", secondary="campaign_senders", back_populates="campaigns")
     email_logs = relationship("EmailLog", back_populates="campaign", cascade="all, delete-orphan")
+    recipient_rows = relationship("CampaignRecipient", back_populates="campaign", cascade="all, delete-orphan", passive_deletes=True, lazy="dynamic")
+
+# Campaign Recipients (one row per recipient, ordered by ordinal)
+class CampaignRecipient(Base):
+    __tablename__ = "campaign_recipients"
+    __table_args__ = (
+        Index("ix_campaign_recipients_campaign_ordinal", "campaign_id", "ordinal", unique=True),
+        Index("ix_campaign_recipients_campaign_email", "campaign_id", "email"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), nullable=False)
+    ordinal = Column(Integer, nullable=False)
+    email = Column(String(255), nullable=False)
+    variables = Column(JSONB, nullable=False, default=dict)
+    
+    # Assigned sender (set during preparation)
+    service_account_id = Column(Integer, ForeignKey("service_accounts.id"), nullable=True)
+    sender_email = Column(String(255), nullable=True)
+    
+    # Relationships
+    campaign = relationship("Campaign", back_populates="recipient_rows")
 
 # Campaign Senders (Many-to-Many)
 class CampaignSender(Base):
@@ -0,0 +1,71 @@
+"""
+Keyset pagination and NDJSON export helpers for list endpoints
+"""
+import json
+import logging
+from typing import Any, Callable, Iterator, List, Optional
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 10000
+DEFAULT_PAGE_SIZE = 1000
+EXPORT_CHUNK_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-After-Id"
+
+
+def unpaged_limit(after_id: Optional[int], limit: Optional[int]) -> Optional[int]:
+    """Page size for listings that used to return every row: None (unpaginated) when
+    the client sends neither `after_id` nor `limit`, as older clients do."""
+    if after_id is None and limit is None:
+        return None
+    return DEFAULT_PAGE_SIZE if limit is None else limit
+
+
+def keyset_page(query: Query, id_column, after_id: Optional[int], limit: Optional[int]) -> Query:
+    """Restrict a query to the page after `after_id`, ordered by id (no OFFSET scan).
+    A `limit` of None returns every row after `after_id`."""
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    query = query.order_by(id_column)
+    return query if limit is None else query.limit(max(1, min(limit, MAX_PAGE_SIZE)))
+
+
+def set_next_cursor(response: Response, items: List[Any], limit: Optional[int]) -> None:
+    """Expose the cursor for the next page when this page is full."""
+    if limit is not None and items and len(items) >= min(limit, MAX_PAGE_SIZE):
+        response.headers[NEXT_CURSOR_HEADER] = str(items[-1].id)
+
+
+def stream_ndjson(
+    build_query: Callable[[Session], Query],
+    serialize: Callable[[Any], Any],
+    filename: str
+) -> StreamingResponse:
+    """Stream every row of a query as NDJSON from a server-side cursor.
+
+    The generator opens its own session because it outlives the request dependency.
+    """
+    def generate() -> Iterator[bytes]:
+        db = SessionLocal()
+        try:
+            query = build_query(db).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+            for row in query:
+                yield (json.dumps(jsonable_encoder(serialize(row))) + "\n").encode()
+        except Exception as e:
+            logger.error(f"NDJSON export {filename} failed: {e}")
+            raise
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,213 @@
+"""
+On-demand profiling for the API and the Celery workers
+
+Profiles are flamegraph-ready collapsed stacks (`frame;frame;frame count` per
+line), the format read by flamegraph.pl, speedscope and py-spy's tooling.
+
+- `stack` mode samples every thread's Python stack at a fixed interval (wall
+  clock: threads blocked on I/O show up too, which is usually what matters for
+  the send path).
+- `tracemalloc` mode records allocations for the window and weights each stack
+  by the bytes still allocated at the end.
+
+Workers are profiled through the `profile` Celery broadcast control command.
+Single API requests are profiled by PerformanceMiddleware when the request
+carries `X-Profile: 1` and a valid `X-Admin-Token`. Profiles are kept in Redis
+for PROFILE_TTL_SECONDS, so any API instance can serve them, and are also
+written to settings.PROFILES_DIR when it is set.
+"""
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from celery.worker.control import control_command
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("stack", "tracemalloc")
+PROFILE_TTL_SECONDS = 86400
+MAX_PROFILE_SECONDS = 300
+MIN_SAMPLE_INTERVAL = 0.001
+PROFILES_INDEX_KEY = "profiles:index"
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+_active_lock = threading.Lock()
+_active: Optional[str] = None
+
+
+def get_profile_key(profile_id: str) -> str:
+    """Get Redis key for a saved collapsed-stack profile"""
+    return f"profile:{profile_id}"
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(counts: Counter) -> str:
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common())
+
+
+class StackSampler:
+    """Samples all threads' stacks from a background thread into collapsed-stack counts."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = max(interval, MIN_SAMPLE_INTERVAL)
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+
+def _tracemalloc_counts(snapshot: tracemalloc.Snapshot) -> Counter:
+    counts: Counter = Counter()
+    for stat in snapshot.statistics("traceback"):
+        stack = tuple(
+            f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in reversed(stat.traceback)
+        )
+        counts[stack] += stat.size
+    return counts
+
+
+def endpoint_stacks(counts: Counter, endpoint) -> Counter:
+    """Only the stacks that pass through `endpoint`: the sampler sees every thread,
+    this keeps the ones serving the profiled request's route. Unfiltered if none match."""
+    code = getattr(endpoint, "__code__", None)
+    if code is None:
+        return counts
+    label = _frame_label(code)
+    matching = Counter({stack: count for stack, count in counts.items() if label in stack})
+    return matching or counts
+
+
+def save_profile(kind: str, counts: Counter, **meta) -> str:
+    """Store collapsed stacks in Redis (and PROFILES_DIR if set); returns the profile id."""
+    profile_id = f"{kind}-{socket.gethostname()}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    collapsed = _collapse(counts)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hset(get_profile_key(profile_id), mapping={
+            "collapsed": collapsed, "kind": kind, "created_at": time.time(),
+            "meta": repr(meta),
+        })
+        pipe.expire(get_profile_key(profile_id), PROFILE_TTL_SECONDS)
+        pipe.zadd(PROFILES_INDEX_KEY, {profile_id: time.time()})
+        pipe.zremrangebyscore(PROFILES_INDEX_KEY, 0, time.time() - PROFILE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not store profile {profile_id} in Redis: {e}")
+    if settings.PROFILES_DIR:
+        try:
+            os.makedirs(settings.PROFILES_DIR, exist_ok=True)
+            with open(os.path.join(settings.PROFILES_DIR, f"{profile_id}.collapsed"), "w") as f:
+                f.write(collapsed)
+        except OSError as e:
+            logger.warning(f"Could not write profile {profile_id}: {e}")
+    logger.info(f"Saved profile {profile_id} ({len(counts)} stacks, {meta})")
+    return profile_id
+
+
+def capture(duration: float, mode: str = "stack", interval: float = 0.005, label: str = "process") -> str:
+    """Profile this process for `duration` seconds (blocking) and save the result."""
+    if mode == "tracemalloc":
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start(25)
+        time.sleep(duration)
+        snapshot = tracemalloc.take_snapshot()
+        if not already_tracing:
+            tracemalloc.stop()
+        return save_profile(f"{label}-tracemalloc", _tracemalloc_counts(snapshot), duration=duration)
+
+    sampler = StackSampler(interval).start()
+    time.sleep(duration)
+    counts = sampler.stop()
+    return save_profile(f"{label}-stack", counts, duration=duration, interval=sampler.interval, samples=sampler.samples)
+
+
+def start_background_capture(duration: float, mode: str = "stack", interval: float = 0.005,
+                             label: str = "process") -> Tuple[bool, str]:
+    """Run `capture` on a daemon thread; only one capture per process at a time."""
+    global _active
+    if mode not in PROFILE_MODES:
+        return False, f"unknown mode {mode!r}; expected one of {PROFILE_MODES}"
+    duration = min(max(float(duration), 0.1), MAX_PROFILE_SECONDS)
+    with _active_lock:
+        if _active is not None:
+            return False, f"a {_active} profile is already running in this process"
+        _active = mode
+
+    def run():
+        global _active
+        try:
+            capture(duration, mode, interval, label)
+        except Exception as e:
+            logger.error(f"Profile capture failed: {e}")
+        finally:
+            with _active_lock:
+                _active = None
+
+    threading.Thread(target=run, name="profile-capture", daemon=True).start()
+    return True, f"{mode} profile started for {duration:g}s"
+
+
+def list_profiles(limit: int = 50) -> List[Dict]:
+    profile_ids = redis_client.zrevrange(PROFILES_INDEX_KEY, 0, limit - 1)
+    pipe = redis_client.pipeline(transaction=False)
+    for profile_id in profile_ids:
+        pipe.hmget(get_profile_key(profile_id), "kind", "created_at", "meta")
+    profiles = []
+    for profile_id, (kind, created_at, meta) in zip(profile_ids, pipe.execute()):
+        if kind is None:
+            continue
+        profiles.append({"id": profile_id, "kind": kind, "created_at": float(created_at), "meta": meta})
+    return profiles
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    return redis_client.hget(get_profile_key(profile_id), "collapsed")
+
+
+@control_command(
+    args=[("duration", float), ("mode", str), ("interval", float)],
+    signature="[duration=30] [mode=stack|tracemalloc] [interval=0.005]",
+)
+def profile(state, duration: float = 30.0, mode: str = "stack", interval: float = 0.005):
+    """Profile this worker for `duration` seconds; the result is saved as collapsed stacks."""
+    started, message = start_background_capture(duration, mode, interval, label="worker")
+    return {"ok": message} if started else {"error": message}
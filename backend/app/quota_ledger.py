@@ -0,0 +1,339 @@
+"""
+Redis quota ledger for daily sending limits
+
+Daily usage used to live only in Postgres (`ServiceAccount.daily_sent`,
+`WorkspaceUser.emails_sent_today`) and was updated with read-modify-write from
+up to 100 sender threads. The ledger keeps it in Redis instead, one hash per
+service account and per workspace user and UTC day:
+
+    quota:{YYYYMMDD}:account:{service_account_id}
+    quota:{YYYYMMDD}:user:{service_account_id}:{email}
+
+Each hash holds `used` (emails sent) and one `hold:{holder}` field per open
+reservation ("count:expires_at"). All changes go through Lua scripts, so a
+reservation checks and holds capacity on the account and the user atomically:
+
+- `reserve()` holds up to N sends against both limits before a batch starts
+  (partial grants allowed) and returns a `Reservation`
+- `Reservation.commit(n)` moves n held sends to `used`; `release()` drops the
+  rest of the hold; `settle(sent)` does both at the end of a batch
+- holds expire after QUOTA_HOLD_SECONDS, so a worker killed mid-batch does not
+  leak capacity for the rest of the day
+
+Keys are per UTC day and expire on their own, so no reset job is needed.
+`reconcile_quota_ledger` (Celery beat, every RECONCILE_INTERVAL_SECONDS) copies
+the ledger back to the Postgres columns read by the dashboard and rolls the
+account counters over on a new day.
+"""
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from sqlalchemy.orm import Session
+
+from app.celery_app import celery_app
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ServiceAccount, WorkspaceUser
+
+logger = logging.getLogger(__name__)
+
+QUOTA_KEY_TTL_SECONDS = 2 * 86400
+# Far longer than a hold is kept (one chunk: seconds to a minute; the threads pool
+# enforces no Celery time limits), so only holds of dead workers expire
+QUOTA_HOLD_SECONDS = 900
+RECONCILE_INTERVAL_SECONDS = 60
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+# KEYS: ledger hashes; ARGV: holder, requested, partial (0/1), hold seconds, key ttl, one limit per key.
+# Returns the number of sends granted (0..requested).
+_RESERVE = redis_client.register_script("""
+local now = tonumber(redis.call('TIME')[1])
+local holder = 'hold:' .. ARGV[1]
+local requested = tonumber(ARGV[2])
+local granted = requested
+for i, key in ipairs(KEYS) do
+  local fields = redis.call('HGETALL', key)
+  local used, held = 0, 0
+  for j = 1, #fields, 2 do
+    local field, value = fields[j], fields[j + 1]
+    if field == 'used' then
+      used = tonumber(value)
+    elseif string.sub(field, 1, 5) == 'hold:' then
+      local count, expires = string.match(value, '^(%d+):(%d+)$')
+      if tonumber(expires) <= now then
+        redis.call('HDEL', key, field)
+      else
+        held = held + tonumber(count)
+      end
+    end
+  end
+  granted = math.min(granted, tonumber(ARGV[5 + i]) - used - held)
+end
+if granted < requested and ARGV[3] == '0' then
+  granted = 0
+end
+if granted <= 0 then
+  return 0
+end
+local expires = now + tonumber(ARGV[4])
+for _, key in ipairs(KEYS) do
+  local count = granted
+  local current = redis.call('HGET', key, holder)
+  if current then
+    count = count + tonumber(string.match(current, '^(%d+):'))
+  end
+  redis.call('HSET', key, holder, count .. ':' .. expires)
+  redis.call('EXPIRE', key, ARGV[5])
+end
+return granted
+""")
+
+# KEYS: ledger hashes; ARGV: holder, sent, release (0/1), key ttl.
+# Adds `sent` to used and takes it off the holder's hold; release drops the remaining hold.
+_COMMIT = redis_client.register_script("""
+local holder = 'hold:' .. ARGV[1]
+local sent = tonumber(ARGV[2])
+for _, key in ipairs(KEYS) do
+  if sent > 0 then
+    redis.call('HINCRBY', key, 'used', sent)
+  end
+  local current = redis.call('HGET', key, holder)
+  if current then
+    local count, expires = string.match(current, '^(%d+):(%d+)$')
+    local left = tonumber(count) - sent
+    if ARGV[3] == '1' or left <= 0 then
+      redis.call('HDEL', key, holder)
+    else
+      redis.call('HSET', key, holder, left .. ':' .. expires)
+    end
+  end
+  redis.call('EXPIRE', key, ARGV[4])
+end
+return 1
+""")
+
+
+def quota_day(moment: Optional[datetime] = None) -> str:
+    """UTC day the ledger counts against, as YYYYMMDD"""
+    return (moment or datetime.now(timezone.utc)).strftime("%Y%m%d")
+
+
+def get_account_quota_key(service_account_id: int, day: Optional[str] = None) -> str:
+    """Get Redis key for a service account's daily quota ledger"""
+    return f"quota:{day or quota_day()}:account:{service_account_id}"
+
+
+def get_user_quota_key(service_account_id: int, user_email: str, day: Optional[str] = None) -> str:
+    """Get Redis key for a workspace user's daily quota ledger"""
+    return f"quota:{day or quota_day()}:user:{service_account_id}:{user_email.lower()}"
+
+
+class Reservation:
+    """Sends held against one account (and optionally one user) for one UTC day."""
+
+    def __init__(self, keys: Tuple[str, ...], holder: str, granted: int):
+        self.keys = keys
+        self.holder = holder
+        self.granted = granted
+        self.committed = 0
+        self.closed = False
+
+    def commit(self, sent: int, release: bool = False) -> None:
+        """Record `sent` emails as used; with `release`, also drop the rest of the hold."""
+        if self.closed or (sent <= 0 and not release):
+            return
+        try:
+            _COMMIT(keys=list(self.keys), args=[self.holder, max(sent, 0), int(release), QUOTA_KEY_TTL_SECONDS])
+        except Exception as e:
+            # The hold expires on its own; the sends are still visible in EmailLog
+            logger.error(f"Could not commit {sent} sends to quota ledger {self.keys}: {e}")
+        self.committed += max(sent, 0)
+        self.closed = release
+
+    def release(self) -> None:
+        self.commit(0, release=True)
+
+    def settle(self, sent: int) -> None:
+        """End of batch: commit what was sent and release the unused remainder."""
+        self.commit(sent - self.committed if sent > self.committed else 0, release=True)
+
+
+def reserve(
+    service_account_id: int,
+    requested: int,
+    account_limit: int,
+    user_email: Optional[str] = None,
+    user_limit: Optional[int] = None,
+    partial: bool = True,
+    holder: Optional[str] = None,
+) -> Reservation:
+    """Hold up to `requested` sends for today against the account's daily limit and,
+    when `user_email` is given, the user's quota. Without `partial`, it is all or nothing."""
+    day = quota_day()
+    keys = [get_account_quota_key(service_account_id, day)]
+    limits = [account_limit]
+    if user_email:
+        keys.append(get_user_quota_key(service_account_id, user_email, day))
+        limits.append(user_limit if user_limit is not None else account_limit)
+    holder = holder or uuid.uuid4().hex
+    if requested <= 0:
+        return Reservation(tuple(keys), holder, 0)
+    granted = int(_RESERVE(
+        keys=keys,
+        args=[holder, requested, int(partial), QUOTA_HOLD_SECONDS, QUOTA_KEY_TTL_SECONDS, *limits],
+    ))
+    return Reservation(tuple(keys), holder, granted)
+
+
+def reserve_for_sender(sender: Dict, requested: int, partial: bool = True, db: Optional[Session] = None) -> Reservation:
+    """`reserve` for a sender-pool entry. Limits travel in the entry (`daily_limit`,
+    `quota_limit`); entries built before they did are looked up in Postgres."""
+    account_limit = sender.get('daily_limit')
+    user_limit = sender.get('quota_limit')
+    if account_limit is None or user_limit is None:
+        account_limit, user_limit = get_sender_limits(sender['service_account_id'], sender['user_email'], db)
+    return reserve(
+        sender['service_account_id'], requested, account_limit,
+        user_email=sender['user_email'], user_limit=user_limit, partial=partial,
+    )
+
+
+def get_sender_limits(service_account_id: int, user_email: str, db: Optional[Session] = None) -> Tuple[int, int]:
+    """(account daily_limit, user quota_limit) from Postgres"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        account_limit = db.query(ServiceAccount.daily_limit).filter(
+            ServiceAccount.id == service_account_id
+        ).scalar()
+        user_limit = db.query(WorkspaceUser.quota_limit).filter(
+            WorkspaceUser.service_account_id == service_account_id,
+            WorkspaceUser.email == user_email
+        ).scalar()
+        account_limit = account_limit if account_limit is not None else 0
+        return account_limit, user_limit if user_limit is not None else account_limit
+    finally:
+        if own_session:
+            db.close()
+
+
+def record_sent(service_account_id: int, sent: int, user_email: Optional[str] = None) -> None:
+    """Count sends that were not reserved (single sends, test emails)."""
+    if sent <= 0:
+        return
+    day = quota_day()
+    keys = [get_account_quota_key(service_account_id, day)]
+    if user_email:
+        keys.append(get_user_quota_key(service_account_id, user_email, day))
+    Reservation(tuple(keys), "unreserved", 0).commit(sent)
+
+
+def _usage(fields: Dict[str, str], now: float) -> Dict[str, int]:
+    held = 0
+    for field, value in fields.items():
+        if field.startswith("hold:"):
+            count, _, expires = value.partition(":")
+            if float(expires) > now:
+                held += int(count)
+    return {"used": int(fields.get("used", 0)), "held": held}
+
+
+def get_usage(service_account_id: int, user_email: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """Today's used and currently held sends for the account (and user)."""
+    day = quota_day()
+    keys = {"account": get_account_quota_key(service_account_id, day)}
+    if user_email:
+        keys["user"] = get_user_quota_key(service_account_id, user_email, day)
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys.values():
+        pipe.hgetall(key)
+    now = time.time()
+    return {scope: _usage(fields, now) for scope, fields in zip(keys, pipe.execute())}
+
+
+def get_sender_usage(senders: List[Dict]) -> Tuple[Dict[int, Dict[str, int]], List[Dict[str, int]]]:
+    """Today's usage for a whole sender pool in one round trip:
+    ({service_account_id: account usage}, [user usage per sender])"""
+    day = quota_day()
+    account_ids = sorted({sender['service_account_id'] for sender in senders})
+    pipe = redis_client.pipeline(transaction=False)
+    for account_id in account_ids:
+        pipe.hgetall(get_account_quota_key(account_id, day))
+    for sender in senders:
+        pipe.hgetall(get_user_quota_key(sender['service_account_id'], sender['user_email'], day))
+    raw = pipe.execute()
+    now = time.time()
+    accounts = {account_id: _usage(fields, now) for account_id, fields in zip(account_ids, raw)}
+    return accounts, [_usage(fields, now) for fields in raw[len(account_ids):]]
+
+
+def reconcile(db: Session) -> Dict[str, int]:
+    """Copy today's ledger into ServiceAccount.daily_sent / WorkspaceUser.emails_sent_today.
+
+    Accounts whose daily_reset_date is before today are rolled over first
+    (daily_sent added to total_sent_all_time). Counts already in Postgres for
+    today but missing from the ledger (sent before the ledger existed, or Redis
+    was flushed) are seeded into it, so they still count against the limits.
+    """
+    today = datetime.now(timezone.utc).date()
+    day = quota_day()
+    accounts = db.query(ServiceAccount).all()
+    users = db.query(WorkspaceUser).all()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for account in accounts:
+        pipe.hget(get_account_quota_key(account.id, day), "used")
+    for user in users:
+        pipe.hget(get_user_quota_key(user.service_account_id, user.email, day), "used")
+    ledger = pipe.execute()
+    account_used = dict(zip((a.id for a in accounts), ledger[:len(accounts)]))
+    user_used = dict(zip((u.id for u in users), ledger[len(accounts):]))
+
+    rolled_over = set()
+    seed = redis_client.pipeline(transaction=False)
+    for account in accounts:
+        used = account_used[account.id]
+        if account.daily_reset_date is None or account.daily_reset_date < today:
+            account.total_sent_all_time = (account.total_sent_all_time or 0) + (account.daily_sent or 0)
+            account.daily_reset_date = today
+            account.daily_sent = int(used or 0)
+            rolled_over.add(account.id)
+        elif used is None and account.daily_sent:
+            seed.hsetnx(get_account_quota_key(account.id, day), "used", account.daily_sent)
+            seed.expire(get_account_quota_key(account.id, day), QUOTA_KEY_TTL_SECONDS)
+        else:
+            account.daily_sent = max(account.daily_sent or 0, int(used or 0))
+    for user in users:
+        used = user_used[user.id]
+        if user.service_account_id in rolled_over:
+            user.emails_sent_today = int(used or 0)
+        elif used is None and user.emails_sent_today:
+            key = get_user_quota_key(user.service_account_id, user.email, day)
+            seed.hsetnx(key, "used", user.emails_sent_today)
+            seed.expire(key, QUOTA_KEY_TTL_SECONDS)
+        else:
+            user.emails_sent_today = max(user.emails_sent_today or 0, int(used or 0))
+    seeded = len(seed.execute()) // 2
+    db.commit()
+    return {"accounts": len(accounts), "users": len(users), "rolled_over": len(rolled_over), "seeded": seeded}
+
+
+@celery_app.task(name='app.quota_ledger.reconcile_quota_ledger')
+def reconcile_quota_ledger():
+    """Celery beat task: sync the Redis quota ledger to Postgres"""
+    db = SessionLocal()
+    try:
+        result = reconcile(db)
+        logger.info(f"Quota ledger reconciled: {result}")
+        return result
+    except Exception as e:
+        logger.error(f"❌ Error reconciling quota ledger: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
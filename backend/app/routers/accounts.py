@@ -14,7 +14,7 @@ router = APIRouter(prefix="/accounts", tags=["accounts"])
 logger = logging.getLogger(__name__)
 
 @router.get("/", response_model=List[ServiceAccountResponse])
-async def list_service_accounts(db: Session = Depends(get_db)):
+def list_service_accounts(db: Session = Depends(get_db)):
     """List all service accounts"""
     try:
         logger.info("Fetching service accounts...")
@@ -26,7 +26,7 @@ async def list_service_accounts(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=ServiceAccountResponse)
-async def create_service_account(account: ServiceAccountCreate, db: Session = Depends(get_db)):
+def create_service_account(account: ServiceAccountCreate, db: Session = Depends(get_db)):
     """Create a new service account"""
     try:
         logger.info(f"Creating service account: {account.name}")
@@ -82,7 +82,7 @@ async def create_service_account(account: ServiceAccountCreate, db: Session = De
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{account_id}", response_model=ServiceAccountResponse)
-async def get_service_account(account_id: int, db: Session = Depends(get_db)):
+def get_service_account(account_id: int, db: Session = Depends(get_db)):
     """Get a specific service account"""
     account = db.query(ServiceAccount).filter(ServiceAccount.id == account_id).first()
     if not account:
@@ -90,7 +90,7 @@ async def get_service_account(account_id: int, db: Session = Depends(get_db)):
     return account
 
 @router.put("/{account_id}", response_model=ServiceAccountResponse)
-async def update_service_account(
+def update_service_account(
     account_id: int, 
     account_update: ServiceAccountUpdate, 
     db: Session = Depends(get_db)
@@ -118,7 +118,7 @@ async def update_service_account(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{account_id}")
-async def delete_service_account(account_id: int, db: Session = Depends(get_db)):
+def delete_service_account(account_id: int, db: Session = Depends(get_db)):
     """Delete a service account"""
     account = db.query(ServiceAccount).filter(ServiceAccount.id == account_id).first()
     if not account:
@@ -137,7 +137,7 @@ async def delete_service_account(account_id: int, db: Session = Depends(get_db))
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{account_id}/sync")
-async def sync_service_account(
+def sync_service_account(
     account_id: int,
     request_data: dict,
     db: Session = Depends(get_db)
@@ -225,7 +225,7 @@ async def sync_service_account(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{account_id}/users", response_model=List[WorkspaceUserResponse])
-async def get_account_users(account_id: int, db: Session = Depends(get_db)):
+def get_account_users(account_id: int, db: Session = Depends(get_db)):
     """Get all users for a specific service account"""
     try:
         logger.info(f"Fetching users for account {account_id}...")
@@ -11,7 +11,7 @@ class SyncRequest(BaseModel):
     admin_email: str
 
 @router.post("/{account_id}/sync")
-async def sync_workspace_users(account_id: int, payload: SyncRequest, db: Session = Depends(get_db)):
+def sync_workspace_users(account_id: int, payload: SyncRequest, db: Session = Depends(get_db)):
     """
     Stub: Sync workspace users for a given service account.
     This implementation ensures the frontend doesn't 404. It validates the account exists
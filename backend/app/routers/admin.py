@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+import logging
+
+from app.admin_auth import require_admin
+from app.celery_app import celery_app
+from app.profiling import (
+    PROFILE_MODES, MAX_PROFILE_SECONDS, get_profile, list_profiles, start_background_capture
+)
+from app.schemas import ProfileRequest
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+logger = logging.getLogger(__name__)
+
+
+def _validate(request: ProfileRequest) -> None:
+    if request.mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(PROFILE_MODES)}")
+    if not 0 < request.duration <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"duration must be in (0, {MAX_PROFILE_SECONDS}] seconds")
+
+
+@router.post("/profiles/workers")
+def profile_workers(request: ProfileRequest):
+    """Broadcast the `profile` control command; each worker saves its own profile when done."""
+    _validate(request)
+    try:
+        replies = celery_app.control.broadcast(
+            "profile",
+            arguments={"duration": request.duration, "mode": request.mode, "interval": request.interval},
+            destination=request.destination,
+            reply=True,
+            timeout=2.0,
+        )
+        return {"workers": {name: reply for item in replies or [] for name, reply in item.items()}}
+    except Exception as e:
+        logger.error(f"Error broadcasting profile command: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/profiles/api")
+def profile_api(request: ProfileRequest):
+    """Profile the API process that receives this request (in the background)."""
+    _validate(request)
+    started, message = start_background_capture(request.duration, request.mode, request.interval, label="api")
+    if not started:
+        raise HTTPException(status_code=409, detail=message)
+    return {"ok": message}
+
+
+@router.get("/profiles")
+def get_profiles(limit: int = 50):
+    """Recently saved profiles, newest first."""
+    try:
+        return list_profiles(limit)
+    except Exception as e:
+        logger.error(f"Error listing profiles: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/profiles/{profile_id}")
+def download_profile(profile_id: str):
+    """Collapsed stacks, ready for flamegraph.pl or speedscope."""
+    collapsed = get_profile(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        collapsed, headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'}
+    )
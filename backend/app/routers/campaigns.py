@@ -6,7 +6,8 @@ import logging
 import asyncio
 import json
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, SessionLocal
 from app.models import (
     Campaign, CampaignStatus, ServiceAccount, EmailLog, EmailStatus,
     CampaignSender, WorkspaceUser
@@ -16,11 +17,19 @@ from app.schemas import (
     CampaignControl, EmailLogResponse, CampaignStatistics
 )
 from app.tasks import send_campaign_emails
+from app.crud.campaign_recipients import (
+    add_campaign_recipients, replace_campaign_recipients, copy_campaign_recipients
+)
 from fastapi import Response, Request
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 # Correctly import the updated functions
 from app.daily_limits import get_all_accounts_statistics, get_account_statistics
-from app.tasks_v2 import get_campaign_progress_key
+from app.tasks_v2 import get_campaign_progress_key, get_campaign_senders_key, publish_campaign_status
+from app.circuit_breaker import breaker_states
+from app.services.campaign_scheduler import (
+    PRIORITIES, next_send_time, schedule_campaign, unschedule_campaign, scheduled_time
+)
 import redis
 import json
 
@@ -30,13 +39,13 @@ router = APIRouter(prefix="/campaigns")
 logger = logging.getLogger(__name__)
 
 # Redis connection (read-only usage here)
-redis_client = redis.from_url("redis://redis:6379/0", decode_responses=True)
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
 
 def _logs_key(campaign_id: int) -> str:
     return f"campaign:{campaign_id}:logs"
 
 @router.get("/", response_model=List[CampaignResponse])
-async def list_campaigns(
+def list_campaigns(
     status: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
@@ -49,7 +58,7 @@ async def list_campaigns(
     return campaigns
 
 @router.get("/{campaign_id}/", response_model=CampaignResponse)
-async def get_campaign(
+def get_campaign(
     campaign_id: int,
     db: Session = Depends(get_db)
 ):
@@ -59,7 +68,7 @@ async def get_campaign(
     return campaign
 
 @router.post("/", response_model=CampaignResponse)
-async def create_campaign(
+def create_campaign(
     campaign: CampaignCreate,
     db: Session = Depends(get_db)
 ):
@@ -71,6 +80,8 @@ async def create_campaign(
         logger.info(f"🔍 Found {len(sender_accounts)} sender accounts")
         if not sender_accounts:
             raise HTTPException(status_code=400, detail="No sender accounts found")
+        if campaign.priority not in PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}")
         
         # CRITICAL: Log body_html to ensure it's being saved correctly
         logger.info(f"📝 Creating campaign - body_html length: {len(campaign.body_html) if campaign.body_html else 0}, body_plain length: {len(campaign.body_plain) if campaign.body_plain else 0}")
@@ -85,16 +96,21 @@ async def create_campaign(
             body_html=campaign.body_html,
             body_plain=campaign.body_plain,
             from_name=campaign.from_name,
-            recipients=campaign.recipients,
-            total_recipients=len(campaign.recipients),
-            pending_count=len(campaign.recipients),
             status=CampaignStatus.DRAFT,
             header_type=campaign.header_type,
-            custom_header=campaign.custom_header
+            custom_header=campaign.custom_header,
+            priority=campaign.priority,
+            start_at=campaign.start_at,
+            send_window_start=campaign.send_window_start,
+            send_window_end=campaign.send_window_end
         )
         db.add(new_campaign)
         db.flush()
 
+        recipient_count = add_campaign_recipients(db, new_campaign.id, campaign.recipients)
+        new_campaign.total_recipients = recipient_count
+        new_campaign.pending_count = recipient_count
+
         for account in sender_accounts:
             association = CampaignSender(campaign_id=new_campaign.id, service_account_id=account.id)
             db.add(association)
@@ -110,7 +126,7 @@ async def create_campaign(
         raise HTTPException(status_code=500, detail=f"Failed to create campaign: {str(e)}")
 
 @router.patch("/{campaign_id}/", response_model=CampaignResponse)
-async def update_campaign(
+def update_campaign(
     campaign_id: int,
     campaign_update: CampaignUpdate,
     db: Session = Depends(get_db)
@@ -120,10 +136,18 @@ async def update_campaign(
         raise HTTPException(status_code=404, detail="Campaign not found")
     
     update_data = campaign_update.dict(exclude_unset=True)
+    recipients = update_data.pop('recipients', None)
+    if 'priority' in update_data and update_data['priority'] not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}")
     
     for key, value in update_data.items():
         setattr(campaign, key, value)
     
+    if recipients is not None:
+        recipient_count = replace_campaign_recipients(db, campaign_id, recipients)
+        campaign.total_recipients = recipient_count
+        campaign.pending_count = recipient_count
+    
     if 'sender_account_ids' in update_data:
         db.query(CampaignSender).filter(CampaignSender.campaign_id == campaign_id).delete()
         for account_id in update_data['sender_account_ids']:
@@ -136,7 +160,7 @@ async def update_campaign(
     return campaign
 
 @router.post("/{campaign_id}/launch/")
-async def launch_campaign(
+def launch_campaign(
     campaign_id: int,
     db: Session = Depends(get_db)
 ):
@@ -144,7 +168,7 @@ async def launch_campaign(
     raise HTTPException(status_code=400, detail="Legacy launch endpoint. Use /prepare and /resume instead.")
 
 @router.delete("/{campaign_id}/")
-async def delete_campaign(
+def delete_campaign(
     campaign_id: int,
     db: Session = Depends(get_db)
 ):
@@ -160,8 +184,9 @@ async def delete_campaign(
 # --- New lifecycle endpoints ---
 
 @router.post("/{campaign_id}/prepare/")
-async def prepare_campaign_endpoint(
+def prepare_campaign_endpoint(
     campaign_id: int,
+    retry_failed: bool = False,
     db: Session = Depends(get_db)
 ):
     from app.tasks_v2 import prepare_campaign_redis
@@ -172,16 +197,17 @@ async def prepare_campaign_endpoint(
         raise HTTPException(status_code=400, detail=f"Can only prepare DRAFT/FAILED campaigns. Current: {campaign.status}")
     
     try:
-        task = prepare_campaign_redis.delay(campaign_id)
+        task = prepare_campaign_redis.delay(campaign_id, retry_failed)
         campaign.status = CampaignStatus.PREPARING
         db.commit()
+        publish_campaign_status(campaign_id, CampaignStatus.PREPARING)
         return {"message": "Campaign preparation started", "task_id": str(task.id)}
     except Exception as e:
         logger.error(f"Failed to start campaign preparation: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to start preparation: {str(e)}")
 
 @router.post("/{campaign_id}/control/")
-async def control_campaign_endpoint(
+def control_campaign_endpoint(
     campaign_id: int,
     control: CampaignControl,
     db: Session = Depends(get_db)
@@ -196,6 +222,8 @@ async def control_campaign_endpoint(
         campaign.status = CampaignStatus.PAUSED
         campaign.paused_at = datetime.utcnow()
         db.commit()
+        unschedule_campaign(campaign_id)
+        publish_campaign_status(campaign_id, CampaignStatus.PAUSED)
         logger.info(f"Campaign {campaign_id} paused.")
         return {"message": "Campaign paused successfully"}
 
@@ -203,10 +231,17 @@ async def control_campaign_endpoint(
         if campaign.status not in [CampaignStatus.PAUSED, CampaignStatus.READY]:
             raise HTTPException(status_code=400, detail=f"Cannot resume campaign in {campaign.status} status.")
         
+        # Before its start-at time or outside its sending window: the scheduler resumes it
+        send_at = next_send_time(campaign)
+        if send_at:
+            schedule_campaign(campaign_id, send_at)
+            return {"message": "Campaign scheduled", "scheduled_for": send_at.isoformat()}
+        
         # If it was paused, set to sending and re-trigger the resume task
         campaign.status = CampaignStatus.SENDING
         campaign.paused_at = None # Clear paused_at
         db.commit()
+        publish_campaign_status(campaign_id, CampaignStatus.SENDING)
         
         # Re-trigger the resume task to continue sending
         from app.tasks_v2 import resume_campaign_instant
@@ -224,10 +259,12 @@ async def control_campaign_endpoint(
         campaign.status = CampaignStatus.CANCELED
         campaign.completed_at = datetime.utcnow() # Mark as completed for tracking purposes
         db.commit()
+        unschedule_campaign(campaign_id)
+        publish_campaign_status(campaign_id, CampaignStatus.CANCELED, completed_at=campaign.completed_at.isoformat())
 
-        # Clear Redis task queue for this campaign
+        # Clear Redis task queue, shared pool and pending retries for this campaign
         redis_key = f"campaign:{campaign_id}:tasks"
-        redis_client.delete(redis_key)
+        redis_client.delete(redis_key, f"campaign:{campaign_id}:pool", f"campaign:{campaign_id}:retry")
         logger.info(f"Campaign {campaign_id} canceled and Redis queue cleared.")
         return {"message": "Campaign canceled successfully"}
 
@@ -235,7 +272,7 @@ async def control_campaign_endpoint(
         raise HTTPException(status_code=400, detail="Invalid control action specified.")
 
 @router.post("/{campaign_id}/resume/")
-async def resume_campaign_endpoint(
+def resume_campaign_endpoint(
     campaign_id: int,
     db: Session = Depends(get_db)
 ):
@@ -246,19 +283,25 @@ async def resume_campaign_endpoint(
     if campaign.status not in [CampaignStatus.READY, CampaignStatus.PAUSED]:
         raise HTTPException(status_code=400, detail=f"Campaign must be READY or PAUSED. Current: {campaign.status}")
 
+    send_at = next_send_time(campaign)
+    if send_at:
+        schedule_campaign(campaign_id, send_at)
+        return {"message": "Campaign scheduled", "scheduled_for": send_at.isoformat()}
+
     try:
         task = resume_campaign_instant.delay(campaign_id)
         campaign.status = CampaignStatus.SENDING
         campaign.celery_task_id = str(task.id)
         campaign.started_at = datetime.utcnow()
         db.commit()
+        publish_campaign_status(campaign_id, CampaignStatus.SENDING, started_at=campaign.started_at.isoformat())
         return {"message": "Campaign resumed", "task_id": str(task.id)}
     except Exception as e:
         logger.error(f"Failed to resume campaign: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to resume: {str(e)}")
 
 @router.post("/{campaign_id}/duplicate/", response_model=CampaignResponse)
-async def duplicate_campaign(
+def duplicate_campaign(
     campaign_id: int,
     db: Session = Depends(get_db)
 ):
@@ -275,17 +318,22 @@ async def duplicate_campaign(
             body_html=original_campaign.body_html,
             body_plain=original_campaign.body_plain,
             from_name=original_campaign.from_name,
-            recipients=original_campaign.recipients,
             total_recipients=original_campaign.total_recipients,
             pending_count=original_campaign.pending_count,
             status=CampaignStatus.DRAFT,
             header_type=original_campaign.header_type,
-            custom_header=original_campaign.custom_header
+            custom_header=original_campaign.custom_header,
+            priority=original_campaign.priority,
+            send_window_start=original_campaign.send_window_start,
+            send_window_end=original_campaign.send_window_end
         )
         
         db.add(new_campaign)
         db.flush()
         
+        # Copy recipients server-side
+        copy_campaign_recipients(db, campaign_id, new_campaign.id)
+        
         # Copy sender accounts
         original_senders = db.query(CampaignSender).filter(CampaignSender.campaign_id == campaign_id).all()
         for sender in original_senders:
@@ -305,7 +353,7 @@ async def duplicate_campaign(
 
 # Return plain dict to avoid strict response validation issues causing 422
 @router.get("/statistics/")
-async def get_general_statistics(db: Session = Depends(get_db)):
+def get_general_statistics(db: Session = Depends(get_db)):
     """
     Get comprehensive campaign and account statistics using a single DB session.
     """
@@ -342,7 +390,7 @@ async def get_general_statistics(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Failed to get statistics: {str(e)}")
 
 @router.get("/{campaign_id}/progress/")
-async def get_campaign_progress(
+def get_campaign_progress(
     campaign_id: int,
     db: Session = Depends(get_db)
 ):
@@ -363,11 +411,112 @@ async def get_campaign_progress(
         "sent": to_int(progress.get("sent")),
         "failed": to_int(progress.get("failed")),
         "pending": to_int(progress.get("pending")),
+        "deferred": to_int(progress.get("deferred")),
+        "deferred_until": progress.get("deferred_until") or None,
+        "retrying": to_int(progress.get("retrying")),
     }
+    # Open or half-open breakers of the senders working this campaign
+    senders = [json.loads(value) for value in redis_client.hvals(get_campaign_senders_key(campaign_id))]
+    response["circuit_breakers"] = breaker_states(senders) if senders else []
+    scheduled_for = scheduled_time(campaign_id)
+    response["scheduled_for"] = scheduled_for.isoformat() if scheduled_for else None
     return response
 
+@router.get("/{campaign_id}/timings/")
+def get_campaign_timings_endpoint(
+    campaign_id: int,
+    db: Session = Depends(get_db)
+):
+    """Per-stage timing breakdown (count, total, mean, p50/p90/p99 seconds)
+    aggregated across every worker that has run this campaign."""
+    from app.timings import get_campaign_timings
+    
+    if not db.query(Campaign.id).filter(Campaign.id == campaign_id).first():
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    try:
+        return get_campaign_timings(campaign_id)
+    except Exception as e:
+        logger.error(f"Error reading timings for campaign {campaign_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{campaign_id}/plan/")
+def get_campaign_plan_endpoint(
+    campaign_id: int,
+    db: Session = Depends(get_db)
+):
+    """Sender assignment plan from the last preparation: per-sender counts and
+    capacity, deferred recipients and projected send time."""
+    from app.services.sender_assignment import get_assignment_plan
+    
+    if not db.query(Campaign.id).filter(Campaign.id == campaign_id).first():
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    try:
+        plan = get_assignment_plan(campaign_id)
+    except Exception as e:
+        logger.error(f"Error reading assignment plan for campaign {campaign_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if plan is None:
+        raise HTTPException(status_code=404, detail="No assignment plan; prepare the campaign first")
+    return plan
+
+@router.get("/{campaign_id}/stream/")
+async def stream_campaign_updates(
+    campaign_id: int,
+    request: Request,
+    cursor: Optional[int] = None
+):
+    """Server-Sent Events stream of live progress and log lines.
+    Resumes logs after `cursor` (or the Last-Event-ID header on reconnect).
+    """
+    from app.services.live_updates import campaign_event_stream, merge_progress
+    
+    def load_snapshot():
+        db = SessionLocal()
+        try:
+            campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+            if not campaign:
+                return None
+            snapshot = {
+                "campaign_id": campaign_id,
+                "status": campaign.status.value if campaign.status else None,
+                "total": campaign.total_recipients or 0,
+                "sent": campaign.sent_count or 0,
+                "failed": campaign.failed_count or 0,
+                "pending": campaign.pending_count or 0,
+                "started_at": campaign.started_at.isoformat() if campaign.started_at else None,
+                "completed_at": campaign.completed_at.isoformat() if campaign.completed_at else None,
+                "accounts": {},
+            }
+        finally:
+            db.close()
+        progress = redis_client.hgetall(get_campaign_progress_key(campaign_id)) or {}
+        # DB status is authoritative at connect time; Redis has the freshest counters
+        progress.pop("status", None)
+        return merge_progress(snapshot, progress)
+    
+    snapshot = await run_in_threadpool(load_snapshot)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    if cursor is None:
+        try:
+            cursor = int(request.headers.get("last-event-id") or 0)
+        except ValueError:
+            cursor = 0
+    
+    return StreamingResponse(
+        campaign_event_stream(campaign_id, snapshot, cursor),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            # Marks the body as already encoded so GZipMiddleware passes frames through unbuffered
+            "Content-Encoding": "identity",
+        }
+    )
+
 @router.get("/{campaign_id}/logs/live")
-async def get_campaign_logs_live(
+def get_campaign_logs_live(
     campaign_id: int,
     offset: int = 0,
     limit: int = 200
@@ -393,7 +542,7 @@ async def get_campaign_logs_live(
 
 
 @router.get("/{campaign_id}/logs/", response_model=List[EmailLogResponse])
-async def get_campaign_logs(
+def get_campaign_logs(
     campaign_id: int,
     status: Optional[EmailStatus] = None,
     skip: int = 0,
@@ -1,33 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 import logging
 
 from app.database import get_db
 from app.models import ContactList, Contact
 from app.schemas import (
-    ContactListCreate, ContactListUpdate, ContactListResponse,
+    ContactListCreate, ContactListUpdate, ContactListResponse, ContactListSummary,
     ContactCreate, ContactUpdate, ContactResponse
 )
+from app.pagination import keyset_page, set_next_cursor, stream_ndjson, unpaged_limit
+from app.email_addresses import normalize_email
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 logger = logging.getLogger(__name__)
 
 # Contact Lists
 @router.get("/lists", response_model=List[ContactListResponse])
-async def list_contact_lists(db: Session = Depends(get_db)):
-    """List all contact lists"""
+def list_contact_lists(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """List contact lists with their contacts (keyset paginated; all of them without after_id/limit)"""
     try:
         logger.info("Fetching contact lists...")
-        contact_lists = db.query(ContactList).options(joinedload(ContactList.contacts)).all()
+        limit = unpaged_limit(after_id, limit)
+        query = db.query(ContactList).options(selectinload(ContactList.contacts))
+        contact_lists = keyset_page(query, ContactList.id, after_id, limit).all()
+        set_next_cursor(response, contact_lists, limit)
         logger.info(f"Found {len(contact_lists)} contact lists")
         return contact_lists
     except Exception as e:
         logger.error(f"Failed to fetch contact lists: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/lists/summary", response_model=List[ContactListSummary])
+def list_contact_list_summaries(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = 1000,
+    db: Session = Depends(get_db)
+):
+    """List contact lists with member counts instead of embedded contacts (keyset paginated)"""
+    try:
+        contact_lists = keyset_page(db.query(ContactList), ContactList.id, after_id, limit).all()
+        set_next_cursor(response, contact_lists, limit)
+        
+        # Count members only for the lists on this page
+        counts = dict(
+            db.query(Contact.contact_list_id, func.count(Contact.id))
+            .filter(Contact.contact_list_id.in_([cl.id for cl in contact_lists]))
+            .group_by(Contact.contact_list_id)
+            .all()
+        ) if contact_lists else {}
+        
+        return [
+            ContactListSummary(
+                id=cl.id,
+                name=cl.name,
+                description=cl.description,
+                created_at=cl.created_at,
+                updated_at=cl.updated_at,
+                contact_count=counts.get(cl.id, 0)
+            )
+            for cl in contact_lists
+        ]
+    except Exception as e:
+        logger.error(f"Failed to fetch contact list summaries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/lists", response_model=ContactListResponse)
-async def create_contact_list(contact_list: ContactListCreate, db: Session = Depends(get_db)):
+def create_contact_list(contact_list: ContactListCreate, db: Session = Depends(get_db)):
     """Create a new contact list"""
     try:
         logger.info(f"Creating contact list: {contact_list.name}")
@@ -50,7 +96,7 @@ async def create_contact_list(contact_list: ContactListCreate, db: Session = Dep
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/lists/{list_id}", response_model=ContactListResponse)
-async def get_contact_list(list_id: int, db: Session = Depends(get_db)):
+def get_contact_list(list_id: int, db: Session = Depends(get_db)):
     """Get a specific contact list"""
     contact_list = db.query(ContactList).filter(ContactList.id == list_id).first()
     if not contact_list:
@@ -58,7 +104,7 @@ async def get_contact_list(list_id: int, db: Session = Depends(get_db)):
     return contact_list
 
 @router.put("/lists/{list_id}", response_model=ContactListResponse)
-async def update_contact_list(
+def update_contact_list(
     list_id: int,
     contact_list_update: ContactListUpdate,
     db: Session = Depends(get_db)
@@ -86,7 +132,7 @@ async def update_contact_list(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/lists/{list_id}")
-async def delete_contact_list(list_id: int, db: Session = Depends(get_db)):
+def delete_contact_list(list_id: int, db: Session = Depends(get_db)):
     """Delete a contact list"""
     contact_list = db.query(ContactList).filter(ContactList.id == list_id).first()
     if not contact_list:
@@ -106,20 +152,26 @@ async def delete_contact_list(list_id: int, db: Session = Depends(get_db)):
 
 # Contacts
 @router.get("/", response_model=List[ContactResponse])
-async def list_contacts(
+def list_contacts(
+    response: Response,
     contact_list_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    """List all contacts, optionally filtered by contact list"""
+    """List contacts, optionally filtered by contact list (keyset paginated; all of them
+    without after_id/limit)"""
     try:
         logger.info("Fetching contacts...")
+        limit = unpaged_limit(after_id, limit)
         query = db.query(Contact)
         
         if contact_list_id:
             query = query.filter(Contact.contact_list_id == contact_list_id)
             logger.info(f"Filtering by contact list ID: {contact_list_id}")
         
-        contacts = query.all()
+        contacts = keyset_page(query, Contact.id, after_id, limit).all()
+        set_next_cursor(response, contacts, limit)
         logger.info(f"Found {len(contacts)} contacts")
         return contacts
         
@@ -127,8 +179,23 @@ async def list_contacts(
         logger.error(f"Failed to fetch contacts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/export")
+def export_contacts(contact_list_id: Optional[int] = None):
+    """Stream all contacts as NDJSON, optionally filtered by contact list"""
+    def build_query(db: Session):
+        query = db.query(Contact)
+        if contact_list_id:
+            query = query.filter(Contact.contact_list_id == contact_list_id)
+        return query.order_by(Contact.id)
+    
+    return stream_ndjson(
+        build_query,
+        lambda contact: ContactResponse.model_validate(contact).model_dump(),
+        f"contacts-{contact_list_id or 'all'}.ndjson"
+    )
+
 @router.post("/", response_model=ContactResponse)
-async def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
+def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
     """Create a new contact"""
     try:
         logger.info(f"Creating contact: {contact.email}")
@@ -140,7 +207,7 @@ async def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
         
         db_contact = Contact(
             contact_list_id=contact.contact_list_id,
-            email=contact.email,
+            email=normalize_email(contact.email),
             first_name=contact.first_name,
             last_name=contact.last_name
         )
@@ -160,7 +227,7 @@ async def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{contact_id}", response_model=ContactResponse)
-async def get_contact(contact_id: int, db: Session = Depends(get_db)):
+def get_contact(contact_id: int, db: Session = Depends(get_db)):
     """Get a specific contact"""
     contact = db.query(Contact).filter(Contact.id == contact_id).first()
     if not contact:
@@ -168,7 +235,7 @@ async def get_contact(contact_id: int, db: Session = Depends(get_db)):
     return contact
 
 @router.put("/{contact_id}", response_model=ContactResponse)
-async def update_contact(
+def update_contact(
     contact_id: int,
     contact_update: ContactUpdate,
     db: Session = Depends(get_db)
@@ -181,6 +248,8 @@ async def update_contact(
     try:
         # Update fields
         update_data = contact_update.dict(exclude_unset=True)
+        if update_data.get('email') is not None:
+            update_data['email'] = normalize_email(update_data['email'])
         for field, value in update_data.items():
             setattr(contact, field, value)
         
@@ -196,7 +265,7 @@ async def update_contact(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{contact_id}")
-async def delete_contact(contact_id: int, db: Session = Depends(get_db)):
+def delete_contact(contact_id: int, db: Session = Depends(get_db)):
     """Delete a contact"""
     contact = db.query(Contact).filter(Contact.id == contact_id).first()
     if not contact:
@@ -216,7 +285,7 @@ async def delete_contact(contact_id: int, db: Session = Depends(get_db)):
 
 # Bulk operations
 @router.post("/bulk-import")
-async def bulk_import_contacts(
+def bulk_import_contacts(
     contact_list_id: int,
     contacts: List[ContactCreate],
     db: Session = Depends(get_db)
@@ -235,7 +304,7 @@ async def bulk_import_contacts(
         for contact_data in contacts:
             contact = Contact(
                 contact_list_id=contact_list_id,
-                email=contact_data.email,
+                email=normalize_email(contact_data.email),
                 first_name=contact_data.first_name,
                 last_name=contact_data.last_name
             )
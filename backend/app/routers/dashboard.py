@@ -14,7 +14,7 @@ router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 
 @router.get("/stats", response_model=DashboardStats)
-async def get_dashboard_stats(db: Session = Depends(get_db)):
+def get_dashboard_stats(db: Session = Depends(get_db)):
     """
     Get dashboard statistics
     """
@@ -75,7 +75,7 @@ async def get_dashboard_stats(db: Session = Depends(get_db)):
 
 
 @router.get("/recent-activity")
-async def get_recent_activity(
+def get_recent_activity(
     limit: int = 20,
     db: Session = Depends(get_db)
 ):
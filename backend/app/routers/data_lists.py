@@ -1,45 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 import logging
 
 from app.database import get_db
 from app.models import DataList
-from app.schemas import DataListCreate, DataListUpdate, DataListResponse
+from app.schemas import DataListCreate, DataListUpdate, DataListResponse, DataListSummary
+from app.pagination import keyset_page, set_next_cursor, unpaged_limit
+from app.crud.data_lists import add_data_list_members, remove_data_list_members, replace_data_list_members
 
 router = APIRouter(prefix="/data-lists", tags=["data-lists"])
 logger = logging.getLogger(__name__)
 
 @router.get("/", response_model=List[DataListResponse])
-async def list_data_lists(db: Session = Depends(get_db)):
-    """List all data lists"""
+def list_data_lists(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """List data lists with their recipients (keyset paginated; all of them without after_id/limit)"""
     try:
         logger.info("Fetching data lists...")
-        data_lists = db.query(DataList).all()
+        limit = unpaged_limit(after_id, limit)
+        query = db.query(DataList).options(selectinload(DataList.members))
+        data_lists = keyset_page(query, DataList.id, after_id, limit).all()
+        set_next_cursor(response, data_lists, limit)
         logger.info(f"Found {len(data_lists)} data lists")
         return data_lists
     except Exception as e:
         logger.error(f"Failed to fetch data lists: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/summary", response_model=List[DataListSummary])
+def list_data_list_summaries(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = 1000,
+    db: Session = Depends(get_db)
+):
+    """List data lists with their recipient counts only (keyset paginated)"""
+    try:
+        data_lists = keyset_page(db.query(DataList), DataList.id, after_id, limit).all()
+        set_next_cursor(response, data_lists, limit)
+        return data_lists
+    except Exception as e:
+        logger.error(f"Failed to fetch data list summaries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/", response_model=DataListResponse)
-async def create_data_list(data_list: DataListCreate, db: Session = Depends(get_db)):
+def create_data_list(data_list: DataListCreate, db: Session = Depends(get_db)):
     """Create a new data list"""
     try:
         logger.info(f"Creating data list: {data_list.name}")
         
-        # Calculate total recipients
-        total_recipients = len(data_list.recipients) if data_list.recipients else 0
-        
         db_data_list = DataList(
             name=data_list.name,
             description=data_list.description,
-            recipients=data_list.recipients,
-            total_recipients=total_recipients,
+            total_recipients=0,
             list_type=data_list.list_type
         )
         
         db.add(db_data_list)
+        db.flush()
+        add_data_list_members(db, db_data_list.id, data_list.recipients or [])
         db.commit()
         db.refresh(db_data_list)
         
@@ -52,7 +76,7 @@ async def create_data_list(data_list: DataListCreate, db: Session = Depends(get_
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{list_id}", response_model=DataListResponse)
-async def get_data_list(list_id: int, db: Session = Depends(get_db)):
+def get_data_list(list_id: int, db: Session = Depends(get_db)):
     """Get a specific data list"""
     data_list = db.query(DataList).filter(DataList.id == list_id).first()
     if not data_list:
@@ -60,7 +84,7 @@ async def get_data_list(list_id: int, db: Session = Depends(get_db)):
     return data_list
 
 @router.put("/{list_id}", response_model=DataListResponse)
-async def update_data_list(
+def update_data_list(
     list_id: int,
     data_list_update: DataListUpdate,
     db: Session = Depends(get_db)
@@ -73,12 +97,13 @@ async def update_data_list(
     try:
         # Update fields
         update_data = data_list_update.dict(exclude_unset=True)
+        recipients = update_data.pop('recipients', None)
         for field, value in update_data.items():
             setattr(data_list, field, value)
         
-        # Recalculate total recipients if recipients were updated
-        if 'recipients' in update_data and update_data['recipients'] is not None:
-            data_list.total_recipients = len(update_data['recipients'])
+        # Replace membership set-based; total_recipients is maintained in the same transaction
+        if recipients is not None:
+            replace_data_list_members(db, list_id, recipients)
         
         db.commit()
         db.refresh(data_list)
@@ -92,7 +117,7 @@ async def update_data_list(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{list_id}")
-async def delete_data_list(list_id: int, db: Session = Depends(get_db)):
+def delete_data_list(list_id: int, db: Session = Depends(get_db)):
     """Delete a data list"""
     data_list = db.query(DataList).filter(DataList.id == list_id).first()
     if not data_list:
@@ -111,7 +136,7 @@ async def delete_data_list(list_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/search/{query}", response_model=List[DataListResponse])
-async def search_data_lists(query: str, db: Session = Depends(get_db)):
+def search_data_lists(query: str, db: Session = Depends(get_db)):
     """Search data lists by name or description"""
     try:
         logger.info(f"Searching data lists for: {query}")
@@ -129,7 +154,7 @@ async def search_data_lists(query: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{list_id}/add-recipients")
-async def add_recipients_to_list(
+def add_recipients_to_list(
     list_id: int,
     recipients: List[str],
     db: Session = Depends(get_db)
@@ -142,22 +167,16 @@ async def add_recipients_to_list(
         if not data_list:
             raise HTTPException(status_code=404, detail="Data list not found")
         
-        # Add new recipients to existing list
-        existing_recipients = data_list.recipients or []
-        new_recipients = [email for email in recipients if email not in existing_recipients]
-        updated_recipients = existing_recipients + new_recipients
-        
-        data_list.recipients = updated_recipients
-        data_list.total_recipients = len(updated_recipients)
-        
+        # INSERT ... ON CONFLICT DO NOTHING skips emails already in the list
+        added = add_data_list_members(db, list_id, recipients)
         db.commit()
         db.refresh(data_list)
         
-        logger.info(f"Successfully added {len(new_recipients)} new recipients to data list")
+        logger.info(f"Successfully added {added} new recipients to data list")
         return {
-            "message": f"Successfully added {len(new_recipients)} new recipients",
+            "message": f"Successfully added {added} new recipients",
             "total_recipients": data_list.total_recipients,
-            "new_recipients_added": len(new_recipients)
+            "new_recipients_added": added
         }
         
     except HTTPException:
@@ -168,7 +187,7 @@ async def add_recipients_to_list(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{list_id}/remove-recipients")
-async def remove_recipients_from_list(
+def remove_recipients_from_list(
     list_id: int,
     recipients: List[str],
     db: Session = Depends(get_db)
@@ -181,17 +200,11 @@ async def remove_recipients_from_list(
         if not data_list:
             raise HTTPException(status_code=404, detail="Data list not found")
         
-        # Remove recipients from existing list
-        existing_recipients = data_list.recipients or []
-        updated_recipients = [email for email in existing_recipients if email not in recipients]
-        
-        data_list.recipients = updated_recipients
-        data_list.total_recipients = len(updated_recipients)
-        
+        # Single set-based DELETE
+        removed_count = remove_data_list_members(db, list_id, recipients)
         db.commit()
         db.refresh(data_list)
         
-        removed_count = len(existing_recipients) - len(updated_recipients)
         logger.info(f"Successfully removed {removed_count} recipients from data list")
         return {
             "message": f"Successfully removed {removed_count} recipients",
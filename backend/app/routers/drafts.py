@@ -13,6 +13,7 @@ import logging
 logger = logging.getLogger(__name__)
 from googleapiclient.errors import HttpError
 import json
+from app.metrics import google_api_call
 
 router = APIRouter()
 
@@ -374,8 +375,8 @@ def create_gmail_draft(user_id: int, subject: str, from_name: str, body_html: st
         logger.info(f"Delegated credentials created for {user.email}")
         
         # Build Gmail service
-        from googleapiclient.discovery import build
-        gmail_service = build('gmail', 'v1', credentials=credentials)
+        from app.google_api import build_google_service
+        gmail_service = build_google_service('gmail', 'v1', credentials)
         
         logger.info("Gmail service built successfully")
         
@@ -408,10 +409,10 @@ def create_gmail_draft(user_id: int, subject: str, from_name: str, body_html: st
         logger.info(f"Recipients: {recipients}")
         logger.info(f"Subject: {subject}")
         
-        result = gmail_service.users().drafts().create(
+        result = google_api_call(gmail_service.users().drafts().create(
             userId='me',
             body=draft_body
-        ).execute()
+        ), 'gmail.drafts.create')
         
         draft_id = result['id']
         logger.info(f"Gmail draft created successfully: {draft_id}")
@@ -486,8 +487,8 @@ def launch_drafts(draft_id: int, db: Session = Depends(get_db)):
             )
             
             # Build Gmail service
-            from googleapiclient.discovery import build
-            gmail_service = build('gmail', 'v1', credentials=credentials)
+            from app.google_api import build_google_service
+            gmail_service = build_google_service('gmail', 'v1', credentials)
             
             logger.info(f"🚀 Launching {len(user_drafts)} drafts for user {user.email}")
             
@@ -495,10 +496,10 @@ def launch_drafts(draft_id: int, db: Session = Depends(get_db)):
             for draft in user_drafts:
                 try:
                     # Send the draft
-                    result = gmail_service.users().drafts().send(
+                    result = google_api_call(gmail_service.users().drafts().send(
                         userId='me',
                         body={'id': draft.gmail_draft_id}
-                    ).execute()
+                    ), 'gmail.drafts.send')
                     
                     # Update draft status
                     draft.status = 'sent'
@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from sqlalchemy.orm import Session
+from typing import Optional
+import logging
+
+from app.database import get_db
+from app.models import Campaign, CampaignStatus, ContactList, DataList
+from app.services.importer import (
+    ImportProgress, detect_format, iter_rows, get_import_progress,
+    import_contacts, import_campaign_recipients, import_data_list_recipients
+)
+
+router = APIRouter(prefix="/imports", tags=["imports"])
+logger = logging.getLogger(__name__)
+
+
+def _open_rows(file: UploadFile, format: Optional[str]):
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return iter_rows(file.file, fmt)
+
+
+# Upload handlers are plain `def` so parsing and COPY run in the threadpool
+@router.post("/contacts/{list_id}")
+def import_contacts_file(
+    list_id: int,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    import_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Stream a CSV/NDJSON file into a contact list"""
+    contact_list = db.query(ContactList).filter(ContactList.id == list_id).first()
+    if not contact_list:
+        raise HTTPException(status_code=404, detail="Contact list not found")
+
+    rows = _open_rows(file, format)
+    try:
+        return import_contacts(db, list_id, rows, ImportProgress(import_id, "contacts", list_id))
+    except Exception as e:
+        logger.error(f"Failed to import contacts into list {list_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/data-lists/{list_id}")
+def import_data_list_file(
+    list_id: int,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    import_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Stream a CSV/NDJSON file into a data list"""
+    data_list = db.query(DataList).filter(DataList.id == list_id).first()
+    if not data_list:
+        raise HTTPException(status_code=404, detail="Data list not found")
+
+    rows = _open_rows(file, format)
+    try:
+        return import_data_list_recipients(db, list_id, rows, ImportProgress(import_id, "data_list", list_id))
+    except Exception as e:
+        logger.error(f"Failed to import recipients into data list {list_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/campaigns/{campaign_id}")
+def import_campaign_recipients_file(
+    campaign_id: int,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    import_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Stream a CSV/NDJSON file into a DRAFT campaign's recipients"""
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    if campaign.status != CampaignStatus.DRAFT:
+        raise HTTPException(status_code=400, detail=f"Can only import recipients into DRAFT campaigns. Current: {campaign.status}")
+
+    rows = _open_rows(file, format)
+    try:
+        return import_campaign_recipients(db, campaign_id, rows, ImportProgress(import_id, "campaign", campaign_id))
+    except Exception as e:
+        logger.error(f"Failed to import recipients into campaign {campaign_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{import_id}")
+def get_import_status(import_id: str):
+    """Return progress counters for a running or finished import"""
+    progress = get_import_progress(import_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return progress
@@ -21,7 +21,7 @@ class TestEmailRequest(BaseModel):
     sender_user_id: Optional[int] = None
 
 @router.post("/")
-async def send_test_email(
+def send_test_email(
     request: TestEmailRequest,
     db: Session = Depends(get_db)
 ):
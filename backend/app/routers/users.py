@@ -1,91 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import not_, func, and_
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import logging
 
 from app.database import get_db
-from app.models import WorkspaceUser
+from app.models import WorkspaceUser, ServiceAccount
 from app.schemas import WorkspaceUserResponse
+from app.pagination import keyset_page, set_next_cursor, stream_ndjson
 
 router = APIRouter(prefix="/users", tags=["users"])
+logger = logging.getLogger(__name__)
+
+# Common admin patterns (email and names)
+ADMIN_LOCALS = [
+    'admin', 'administrator', 'postmaster', 'abuse', 'support', 
+    'noreply', 'no-reply', 'donotreply', 'do-not-reply'
+]
+
+# Admin name patterns to exclude
+ADMIN_NAME_PATTERNS = [
+    'admin', 'administrator', 'postmaster', 'abuse', 'support',
+    'system', 'automation', 'bot', 'test', 'demo', 'sample',
+    'noreply', 'no-reply', 'donotreply', 'do-not-reply'
+]
+
+
+def _filtered_users_query(
+    db: Session,
+    service_account_id: Optional[int] = None,
+    is_active: Optional[bool] = None
+):
+    """Workspace users matching the filters, with admin-like accounts excluded"""
+    query = db.query(WorkspaceUser)
+    
+    if service_account_id:
+        query = query.filter(WorkspaceUser.service_account_id == service_account_id)
+        logger.info(f"🔍 Filtering by service_account_id: {service_account_id}")
+    
+    if is_active is not None:
+        query = query.filter(WorkspaceUser.is_active == is_active)
+        logger.info(f"🔍 Filtering by is_active: {is_active}")
+    
+    # FORCE EXCLUDE admin-like accounts from listing (senders must be normal users)
+    # Get all service account admin emails
+    admin_emails = db.query(ServiceAccount.admin_email).filter(
+        ServiceAccount.admin_email.isnot(None)
+    ).all()
+    admin_email_list = [email[0] for email in admin_emails if email[0]]
+    
+    # Build exclusion conditions
+    conditions = []
+    
+    # Exclude exact admin email matches
+    if admin_email_list:
+        conditions.append(not_(WorkspaceUser.email.in_(admin_email_list)))
+    
+    # Exclude admin email patterns
+    for local in ADMIN_LOCALS:
+        conditions.append(not_(func.lower(WorkspaceUser.email).like(f"{local}@%")))
+    
+    # Exclude admin name patterns (full_name, first_name, last_name)
+    for pattern in ADMIN_NAME_PATTERNS:
+        # Check full_name
+        conditions.append(not_(func.lower(WorkspaceUser.full_name).like(f"%{pattern}%")))
+        # Check first_name
+        conditions.append(not_(func.lower(WorkspaceUser.first_name).like(f"%{pattern}%")))
+        # Check last_name
+        conditions.append(not_(func.lower(WorkspaceUser.last_name).like(f"%{pattern}%")))
+    
+    # Apply all conditions
+    if conditions:
+        query = query.filter(and_(*conditions)) if len(conditions) > 1 else query.filter(conditions[0])
+    
+    logger.info(f"🚫 Excluded admin emails: {admin_email_list}")
+    logger.info(f"🚫 Excluded admin patterns: {ADMIN_LOCALS}")
+    return query
 
 
 @router.get("/", response_model=List[WorkspaceUserResponse])
-async def list_workspace_users(
+def list_workspace_users(
+    response: Response,
     service_account_id: Optional[int] = None,
     is_active: Optional[bool] = None,
+    after_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 1000,
     db: Session = Depends(get_db)
 ):
     """
-    List workspace users with optional filters
+    List workspace users with optional filters (keyset paginated via after_id;
+    skip is kept for older clients)
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
         logger.info("🔄 Fetching workspace users...")
-        query = db.query(WorkspaceUser)
-        
-        if service_account_id:
-            query = query.filter(WorkspaceUser.service_account_id == service_account_id)
-            logger.info(f"🔍 Filtering by service_account_id: {service_account_id}")
+        query = keyset_page(
+            _filtered_users_query(db, service_account_id, is_active),
+            WorkspaceUser.id, after_id, limit
+        )
+        if skip:
+            query = query.offset(skip)
         
-        if is_active is not None:
-            query = query.filter(WorkspaceUser.is_active == is_active)
-            logger.info(f"🔍 Filtering by is_active: {is_active}")
-        
-        # FORCE EXCLUDE admin-like accounts from listing (senders must be normal users)
-        from sqlalchemy import not_, func, or_, and_
-        from app.models import ServiceAccount
-        
-        # Get all service account admin emails
-        admin_emails = db.query(ServiceAccount.admin_email).filter(
-            ServiceAccount.admin_email.isnot(None)
-        ).all()
-        admin_email_list = [email[0] for email in admin_emails if email[0]]
-        
-        # Common admin patterns (email and names)
-        admin_locals = [
-            'admin', 'administrator', 'postmaster', 'abuse', 'support', 
-            'noreply', 'no-reply', 'donotreply', 'do-not-reply'
-        ]
-        
-        # Admin name patterns to exclude
-        admin_name_patterns = [
-            'admin', 'administrator', 'postmaster', 'abuse', 'support',
-            'system', 'automation', 'bot', 'test', 'demo', 'sample',
-            'noreply', 'no-reply', 'donotreply', 'do-not-reply'
-        ]
-        
-        # Build exclusion conditions
-        conditions = []
-        
-        # Exclude exact admin email matches
-        if admin_email_list:
-            conditions.append(not_(WorkspaceUser.email.in_(admin_email_list)))
-        
-        # Exclude admin email patterns
-        for local in admin_locals:
-            conditions.append(not_(func.lower(WorkspaceUser.email).like(f"{local}@%")))
-        
-        # Exclude admin name patterns (full_name, first_name, last_name)
-        for pattern in admin_name_patterns:
-            # Check full_name
-            conditions.append(not_(func.lower(WorkspaceUser.full_name).like(f"%{pattern}%")))
-            # Check first_name
-            conditions.append(not_(func.lower(WorkspaceUser.first_name).like(f"%{pattern}%")))
-            # Check last_name
-            conditions.append(not_(func.lower(WorkspaceUser.last_name).like(f"%{pattern}%")))
-        
-        # Apply all conditions
-        if conditions:
-            query = query.filter(and_(*conditions)) if len(conditions) > 1 else query.filter(conditions[0])
-        
-        logger.info(f"🚫 Excluded admin emails: {admin_email_list}")
-        logger.info(f"🚫 Excluded admin patterns: {admin_locals}")
-        
-        users = query.offset(skip).limit(limit).all()
+        users = query.all()
+        set_next_cursor(response, users, limit)
         logger.info(f"✅ Found {len(users)} workspace users")
         
         return users
@@ -95,8 +112,23 @@ async def list_workspace_users(
         raise HTTPException(status_code=500, detail=f"Failed to list workspace users: {str(e)}")
 
 
+@router.get("/export")
+def export_workspace_users(
+    service_account_id: Optional[int] = None,
+    is_active: Optional[bool] = None
+):
+    """
+    Stream all matching workspace users as NDJSON
+    """
+    return stream_ndjson(
+        lambda db: _filtered_users_query(db, service_account_id, is_active).order_by(WorkspaceUser.id),
+        lambda user: WorkspaceUserResponse.model_validate(user).model_dump(),
+        "workspace-users.ndjson"
+    )
+
+
 @router.get("/{user_id}", response_model=WorkspaceUserResponse)
-async def get_workspace_user(
+def get_workspace_user(
     user_id: int,
     db: Session = Depends(get_db)
 ):
@@ -112,7 +144,7 @@ async def get_workspace_user(
 
 
 @router.patch("/{user_id}")
-async def update_workspace_user(
+def update_workspace_user(
     user_id: int,
     is_active: Optional[bool] = None,
     quota_limit: Optional[int] = None,
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional, Dict, Any, Union
-from datetime import datetime, date
+from datetime import datetime, date, time
 from enum import Enum
 
 # Enums
@@ -117,6 +117,12 @@ class ContactListResponse(ContactListBase):
     class Config:
         from_attributes = True
 
+class ContactListSummary(ContactListBase):
+    id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    contact_count: int = 0
+
 # Contact Schemas
 class ContactBase(BaseModel):
     email: str
@@ -165,6 +171,18 @@ class DataListResponse(DataListBase):
     class Config:
         from_attributes = True
 
+class DataListSummary(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    list_type: str = 'custom'
+    total_recipients: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Campaign Schemas
 class CampaignBase(BaseModel):
     name: str
@@ -192,6 +210,10 @@ class CampaignCreate(CampaignBase):
     test_after_count: int = 0
     header_type: str = "existing"  # "existing" or "100_percent"
     custom_header: Optional[str] = None
+    priority: str = "bulk"  # "test", "transactional" or "bulk"
+    start_at: Optional[datetime] = None
+    send_window_start: Optional[time] = None  # UTC
+    send_window_end: Optional[time] = None  # UTC
 
 class CampaignUpdate(BaseModel):
     name: Optional[str] = None
@@ -215,6 +237,10 @@ class CampaignUpdate(BaseModel):
     test_recipients: Optional[List[Dict[str, Any]]] = None
     test_after_email: Optional[str] = None
     test_after_count: Optional[int] = None
+    priority: Optional[str] = None
+    start_at: Optional[datetime] = None
+    send_window_start: Optional[time] = None
+    send_window_end: Optional[time] = None
 
 class CampaignResponse(CampaignBase):
     id: int
@@ -228,6 +254,10 @@ class CampaignResponse(CampaignBase):
     is_test: bool
     test_after_email: Optional[str] = None
     test_after_count: int
+    priority: Optional[str] = None
+    start_at: Optional[datetime] = None
+    send_window_start: Optional[time] = None
+    send_window_end: Optional[time] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     prepared_at: Optional[datetime] = None
@@ -365,6 +395,13 @@ class SendEmailRequest(BaseModel):
     use_gmail: bool = True
     custom_headers: Dict[str, str] = {}
 
+# Profiling Request (admin)
+class ProfileRequest(BaseModel):
+    duration: float = 30.0
+    mode: str = "stack"  # stack | tracemalloc
+    interval: float = 0.005
+    destination: Optional[List[str]] = None  # worker hostnames; all workers if omitted
+
 # Draft Launch Response
 class DraftLaunchResponse(BaseModel):
     success: bool
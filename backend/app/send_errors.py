@@ -0,0 +1,129 @@
+"""
+Classification of Gmail send failures
+
+Whether a failed send should be retried, handed to another sender, or failed
+for good depends on what went wrong, not on which campaign it belongs to:
+
+- SENDER: the sending user cannot send right now (Gmail disabled, delegation
+  or auth refused, account suspended, per-user rate or daily limit hit). The
+  message itself is fine and another sender can take it.
+- RETRYABLE: transient server or network failure (5xx, timeouts, resets).
+- PERMANENT: the message will never go (invalid recipient or headers, too
+  large, ...).
+
+Separately, 429s, rate-limit reasons and 5xx are throttle signals: they make
+the adaptive concurrency controller (app.concurrency) back off.
+
+Errors travel through the send path as `SendError` strings, so everything that
+stores or logs them (EmailLog.error_message, campaign logs) is unchanged. Only
+the message is stored; `is_permanent_failure` tells the permanent ones apart
+again when failed emails are retried.
+"""
+import json
+import re
+import socket
+import ssl
+
+import httplib2
+from google.auth.exceptions import RefreshError, TransportError
+from googleapiclient.errors import HttpError
+
+SENDER = "sender"
+RETRYABLE = "retryable"
+PERMANENT = "permanent"
+
+# 400 reasons (error.errors[].reason) meaning "this user, not this message"
+SENDER_REASONS = {"failedPrecondition", "dailyLimitExceeded", "userRateLimitExceeded", "rateLimitExceeded"}
+SENDER_MESSAGES = ("Mail service not enabled", "Delegation denied", "Gmail service not enabled", "Gmail is not enabled")
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+# Reasons meaning "slow down" rather than "stop for today" (dailyLimitExceeded)
+THROTTLE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+# "<HttpError 400 when requesting ..." as it appears in a stored error message
+HTTP_STATUS_IN_MESSAGE = re.compile(r"HttpError (\d{3})")
+
+
+class SendError(str):
+    """Error message of a failed send, tagged with its kind (SENDER, RETRYABLE or
+    PERMANENT) and whether Gmail was throttling."""
+
+    def __new__(cls, message: str, kind: str = PERMANENT, throttled: bool = False):
+        error = super().__new__(cls, message)
+        error.kind = kind
+        error.throttled = throttled
+        return error
+
+
+def _causes(exc: BaseException):
+    """The exception and the ones it was raised from (google_api re-raises
+    HttpError as a plain Exception `from` the original)."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def _status(error: HttpError) -> int:
+    status = getattr(error.resp, "status", None)
+    return int(status) if status is not None else 0
+
+
+def _http_error_reasons(error: HttpError) -> set:
+    try:
+        payload = json.loads(error.content.decode("utf-8"))["error"]
+    except Exception:
+        return set()
+    return {detail.get("reason") for detail in payload.get("errors", []) if isinstance(detail, dict)}
+
+
+def _classify_http_error(error: HttpError) -> str:
+    status = _status(error)
+    if status in RETRYABLE_STATUSES:
+        return RETRYABLE
+    if status in (401, 429):
+        return SENDER
+    if status == 403:
+        # Every 403 from users.messages.send is about the user: limits, policy, delegation
+        return SENDER
+    content = error.content or b""
+    if _http_error_reasons(error) & SENDER_REASONS or any(m.encode() in content for m in SENDER_MESSAGES):
+        return SENDER
+    return PERMANENT
+
+
+def classify_send_error(exc: BaseException) -> str:
+    """Kind of a send exception, following wrapped causes."""
+    for error in _causes(exc):
+        if isinstance(error, HttpError):
+            return _classify_http_error(error)
+        if isinstance(error, RefreshError):
+            # Token exchange refused: delegation revoked, user suspended or deleted
+            return SENDER
+        if isinstance(error, (TransportError, httplib2.HttpLib2Error, socket.timeout, TimeoutError,
+                              ConnectionError, ssl.SSLError)):
+            return RETRYABLE
+        if any(message in str(error) for message in SENDER_MESSAGES):
+            return SENDER
+    return PERMANENT
+
+
+def is_throttle(exc: BaseException) -> bool:
+    """Whether Gmail was telling us to slow down (429, rate-limit reason or 5xx)."""
+    for error in _causes(exc):
+        if isinstance(error, HttpError):
+            status = _status(error)
+            return status == 429 or status in RETRYABLE_STATUSES or bool(_http_error_reasons(error) & THROTTLE_REASONS)
+    return False
+
+
+def is_permanent_failure(error_message: str) -> bool:
+    """Whether a stored error message is a Gmail rejection of the message itself
+    (a 4xx that is not about the sender). Anything else, including messages that
+    cannot be classified, may succeed when sent again."""
+    match = HTTP_STATUS_IN_MESSAGE.search(error_message or "")
+    if not match:
+        return False
+    status = int(match.group(1))
+    if status in RETRYABLE_STATUSES or status in (401, 403, 429):
+        return False
+    return not any(reason in error_message for reason in (*SENDER_REASONS, *SENDER_MESSAGES))
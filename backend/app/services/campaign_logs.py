@@ -0,0 +1,169 @@
+"""
+Buffered writer for the campaign live-log
+
+Senders used to RPUSH + LTRIM (and PUBLISH) every log line as it happened, so a
+failure storm turned into a Redis storm. Lines are now buffered per process and
+flushed through one pipeline on a short timer or when the buffer fills up:
+
+- repeated lines within a flush window collapse into one counted entry
+  ("x312 ⚠️ Gmail disabled for ..."); lines that differ only by email address
+  collapse onto a shared template
+- each campaign gets at most MAX_LINES_PER_FLUSH distinct lines per window; the
+  rest are summarised in a single "suppressed" line
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import redis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 0.5          # seconds between timed flushes
+FLUSH_THRESHOLD = 1000        # buffered lines that trigger an early flush
+MAX_LINES_PER_FLUSH = 50      # distinct lines kept per campaign per flush
+LOG_LIST_MAX = 5000           # entries kept in the Redis log list
+
+EMAIL_PATTERN = re.compile(r"[^\s@:;,<>()]+@[^\s@:;,<>()]+")
+
+
+def get_campaign_logs_key(campaign_id: int) -> str:
+    """Get Redis key for campaign live logs list"""
+    return f"campaign:{campaign_id}:logs"
+
+
+def get_campaign_log_seq_key(campaign_id: int) -> str:
+    """Get Redis key for the monotonically increasing live log sequence"""
+    return f"campaign:{campaign_id}:log_seq"
+
+
+def get_campaign_events_channel(campaign_id: int) -> str:
+    """Get Redis pub/sub channel for live progress and log events"""
+    return f"campaign:{campaign_id}:events"
+
+
+class _Pending:
+    __slots__ = ('message', 'template', 'ts', 'count', 'varied')
+
+    def __init__(self, message: str, template: str):
+        self.message = message
+        self.template = template
+        self.ts = datetime.utcnow().isoformat() + "Z"
+        self.count = 1
+        self.varied = False
+
+    def render(self) -> str:
+        if self.count == 1:
+            return self.message
+        return f"x{self.count} {self.template if self.varied else self.message}"
+
+
+class CampaignLogWriter:
+    """Process-local, thread-safe buffer that coalesces live-log lines per campaign."""
+
+    def __init__(self, redis_url: str):
+        self._redis = redis.from_url(redis_url, decode_responses=True)
+        self._lock = threading.Lock()
+        self._buffers: Dict[int, "OrderedDict[str, _Pending]"] = {}
+        self._suppressed: Dict[int, int] = {}
+        self._buffered = 0
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._flusher_pid = None
+        self._last_error_at = 0.0
+
+    def append(self, campaign_id: int, message: str) -> None:
+        template = EMAIL_PATTERN.sub("…", message)
+        with self._lock:
+            buffer = self._buffers.setdefault(campaign_id, OrderedDict())
+            pending = buffer.get(template)
+            if pending is not None:
+                pending.count += 1
+                pending.varied = pending.varied or pending.message != message
+            elif len(buffer) >= MAX_LINES_PER_FLUSH:
+                self._suppressed[campaign_id] = self._suppressed.get(campaign_id, 0) + 1
+            else:
+                buffer[template] = _Pending(message, template)
+                self._buffered += 1
+            full = self._buffered >= FLUSH_THRESHOLD
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+            suppressed, self._suppressed = self._suppressed, {}
+            self._buffered = 0
+        if not buffers:
+            return
+
+        batches: Dict[int, List[Tuple[str, str, int]]] = {}
+        for campaign_id, buffer in buffers.items():
+            entries = [(pending.render(), pending.ts, pending.count) for pending in buffer.values()]
+            if suppressed.get(campaign_id):
+                entries.append((
+                    f"… {suppressed[campaign_id]} more log lines suppressed",
+                    datetime.utcnow().isoformat() + "Z",
+                    suppressed[campaign_id],
+                ))
+            batches[campaign_id] = entries
+
+        try:
+            # Reserve a contiguous seq range per campaign, then write everything in one pipeline
+            pipe = self._redis.pipeline(transaction=False)
+            for campaign_id, entries in batches.items():
+                pipe.incrby(get_campaign_log_seq_key(campaign_id), len(entries))
+            last_seqs = pipe.execute()
+
+            pipe = self._redis.pipeline(transaction=False)
+            for (campaign_id, entries), last_seq in zip(batches.items(), last_seqs):
+                first_seq = last_seq - len(entries) + 1
+                records = []
+                for offset, (line, ts, count) in enumerate(entries):
+                    record = {"seq": first_seq + offset, "ts": ts, "message": line}
+                    if count > 1:
+                        record["count"] = count
+                    records.append(record)
+                logs_key = get_campaign_logs_key(campaign_id)
+                pipe.rpush(logs_key, *[json.dumps(record) for record in records])
+                pipe.ltrim(logs_key, -LOG_LIST_MAX, -1)
+                pipe.publish(get_campaign_events_channel(campaign_id), json.dumps({"type": "logs", "entries": records}))
+            pipe.execute()
+        except Exception as e:
+            # Live logs are best effort; drop this batch rather than grow without bound
+            now = time.time()
+            if now - self._last_error_at > 60:
+                self._last_error_at = now
+                logger.warning(f"Dropped {sum(len(v) for v in batches.values())} campaign log lines: {e}")
+
+    def _ensure_flusher(self) -> None:
+        # (Re)start after fork: threads do not survive into prefork children
+        pid = os.getpid()
+        if self._flusher is not None and self._flusher_pid == pid and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher_pid == pid and self._flusher.is_alive():
+                return
+            self._flusher_pid = pid
+            self._flusher = threading.Thread(target=self._run, name="campaign-log-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+
+
+log_writer = CampaignLogWriter(settings.REDIS_URL)
+atexit.register(log_writer.flush)
@@ -0,0 +1,105 @@
+"""
+Campaign scheduling: priority classes, start-at times and sending windows
+
+Every send task used to go to Celery's default queue, so a test send or a
+small urgent campaign waited behind whatever bulk campaign was running, and a
+campaign could only start when someone pressed resume. Now:
+
+- Each campaign has a priority class: test (any `is_test` campaign),
+  transactional or bulk (the default). Its sender workers run on the class's
+  Celery queue (PRIORITY_QUEUES); workers read the queues in that order, and
+  a worker can be dedicated to the urgent ones (see docker-compose.yml)
+- `start_at` holds a campaign back until then, and `send_window_start` /
+  `send_window_end` (UTC times of day; the window may wrap past midnight)
+  restrict sending to that window every day
+- A campaign resumed outside those limits goes into a Redis sorted set scored
+  by when it may start:
+
+      campaigns:scheduled
+
+  `start_scheduled_campaigns` (Celery beat) resumes due campaigns. A campaign
+  whose window closes while sending is paused and scheduled for the next
+  opening.
+
+Fair share between concurrent campaigns comes from the sender workers: each
+holds its Celery slot for at most one slice (see app.tasks_v2) and then goes
+to the back of its queue, so campaigns queued behind it get their turn.
+"""
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import List, Optional
+
+import redis
+
+from app.config import settings
+
+PRIORITY_TEST = "test"
+PRIORITY_TRANSACTIONAL = "transactional"
+PRIORITY_BULK = "bulk"
+PRIORITIES = (PRIORITY_TEST, PRIORITY_TRANSACTIONAL, PRIORITY_BULK)
+# Listed in the order workers read them (celery_app: queue_order_strategy=priority)
+PRIORITY_QUEUES = {
+    PRIORITY_TEST: "send_test",
+    PRIORITY_TRANSACTIONAL: "send_transactional",
+    PRIORITY_BULK: "send_bulk",
+}
+SCHEDULED_CAMPAIGNS_KEY = "campaigns:scheduled"
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+def campaign_priority(campaign) -> str:
+    """Priority class of a campaign (or a row with `priority` and `is_test`)"""
+    if campaign.is_test:
+        return PRIORITY_TEST
+    return campaign.priority if campaign.priority in PRIORITIES else PRIORITY_BULK
+
+
+def queue_for_campaign(campaign) -> str:
+    """Celery queue for the campaign's sender workers"""
+    return PRIORITY_QUEUES[campaign_priority(campaign)]
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def in_send_window(window_start: Optional[dt_time], window_end: Optional[dt_time], at: datetime) -> bool:
+    """Whether `at` falls in the daily UTC window (no window: always)"""
+    if window_start is None or window_end is None or window_start == window_end:
+        return True
+    now = _as_utc(at).time().replace(tzinfo=None)
+    if window_start < window_end:
+        return window_start <= now < window_end
+    # Wraps past midnight, e.g. 22:00-06:00
+    return now >= window_start or now < window_end
+
+
+def next_send_time(campaign, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Earliest time the campaign may send, or None if it may send now"""
+    now = _as_utc(now or datetime.now(timezone.utc))
+    at = now
+    if campaign.start_at is not None and _as_utc(campaign.start_at) > at:
+        at = _as_utc(campaign.start_at)
+    if not in_send_window(campaign.send_window_start, campaign.send_window_end, at):
+        opens = datetime.combine(at.date(), campaign.send_window_start, tzinfo=timezone.utc)
+        at = opens if opens > at else opens + timedelta(days=1)
+    return at if at > now else None
+
+
+def schedule_campaign(campaign_id: int, at: datetime) -> None:
+    redis_client.zadd(SCHEDULED_CAMPAIGNS_KEY, {str(campaign_id): _as_utc(at).timestamp()})
+
+
+def unschedule_campaign(campaign_id: int) -> None:
+    redis_client.zrem(SCHEDULED_CAMPAIGNS_KEY, str(campaign_id))
+
+
+def scheduled_time(campaign_id: int) -> Optional[datetime]:
+    """When a scheduled campaign starts, or None if it is not scheduled"""
+    score = redis_client.zscore(SCHEDULED_CAMPAIGNS_KEY, str(campaign_id))
+    return datetime.fromtimestamp(score, tz=timezone.utc) if score is not None else None
+
+
+def due_scheduled_campaigns(now: Optional[float] = None) -> List[int]:
+    now = now if now is not None else datetime.now(timezone.utc).timestamp()
+    return [int(member) for member in redis_client.zrangebyscore(SCHEDULED_CAMPAIGNS_KEY, "-inf", now)]
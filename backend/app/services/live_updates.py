@@ -0,0 +1,217 @@
+"""
+Live campaign progress and logs over Server-Sent Events
+
+Workers publish progress snapshots (app.tasks_v2) and batches of log lines
+(app.services.campaign_logs) to a per-campaign Redis pub/sub channel. Each API
+process holds a single shared subscription and fans messages out to its
+connected viewers; every viewer coalesces what arrives and flushes at most
+LIVE_UPDATES_FPS frames per second. Beyond the
+initial snapshot, watching a campaign costs no database queries and no polling.
+
+Log lines carry a monotonically increasing `seq` that is sent as the SSE event
+id, so a reconnecting EventSource (Last-Event-ID) or an explicit `cursor` resumes
+exactly where it left off from the Redis log list.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import redis.asyncio as aioredis
+
+from app.config import settings
+from app.services.campaign_logs import (
+    get_campaign_events_channel, get_campaign_logs_key, get_campaign_log_seq_key
+)
+
+logger = logging.getLogger(__name__)
+
+VIEWER_QUEUE_SIZE = 1000
+LOG_BACKLOG_LIMIT = 200
+KEEPALIVE_SECONDS = 15
+PROGRESS_INT_FIELDS = ('total', 'sent', 'failed', 'pending')
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def merge_progress(snapshot: Dict[str, Any], progress: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold a published progress hash into the viewer's LiveStats-shaped snapshot."""
+    merged = dict(snapshot)
+    for field in PROGRESS_INT_FIELDS:
+        if field in progress:
+            merged[field] = _to_int(progress[field])
+    for field in ('status', 'started_at', 'completed_at'):
+        if progress.get(field):
+            merged[field] = progress[field]
+    return merged
+
+
+def _sse(data: Any, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class CampaignEventHub:
+    """One Redis subscription per process, shared by all viewers of all campaigns."""
+
+    def __init__(self):
+        self._redis = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._viewers: Dict[int, Set[asyncio.Queue]] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+
+    async def subscribe(self, campaign_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=VIEWER_QUEUE_SIZE)
+        async with self._lock:
+            viewers = self._viewers.setdefault(campaign_id, set())
+            viewers.add(queue)
+            if len(viewers) == 1:
+                if self._pubsub is None:
+                    self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.subscribe(get_campaign_events_channel(campaign_id))
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read_loop())
+            self._wakeup.set()
+        return queue
+
+    async def unsubscribe(self, campaign_id: int, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            viewers = self._viewers.get(campaign_id)
+            if viewers is None:
+                return
+            viewers.discard(queue)
+            if not viewers:
+                del self._viewers[campaign_id]
+                try:
+                    await self._pubsub.unsubscribe(get_campaign_events_channel(campaign_id))
+                except Exception as e:
+                    logger.warning(f"Live updates: unsubscribe from campaign {campaign_id} failed: {e}")
+
+    async def _read_loop(self) -> None:
+        while True:
+            if not self._viewers:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # redis-py reconnects and re-subscribes on the next read
+                logger.warning(f"Live updates: pub/sub read failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get('type') != 'message':
+                continue
+            try:
+                campaign_id = int(message['channel'].split(':')[1])
+            except (IndexError, ValueError):
+                continue
+            for queue in list(self._viewers.get(campaign_id, ())):
+                try:
+                    queue.put_nowait(message['data'])
+                except asyncio.QueueFull:
+                    # Slow viewer: it notices the log sequence gap and re-reads from Redis
+                    pass
+
+
+hub = CampaignEventHub()
+
+
+async def read_logs_after(campaign_id: int, cursor: int, limit: int = LOG_BACKLOG_LIMIT) -> List[Dict[str, Any]]:
+    """Log entries with seq > cursor still held in the Redis log list (newest `limit`)."""
+    latest = _to_int(await hub.redis.get(get_campaign_log_seq_key(campaign_id)))
+    if cursor >= latest:
+        return []
+    count = min(latest - cursor, limit)
+    entries = []
+    for raw in await hub.redis.lrange(get_campaign_logs_key(campaign_id), -count, -1) or []:
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            continue
+        if _to_int(entry.get('seq')) > cursor:
+            entries.append(entry)
+    return entries
+
+
+async def campaign_event_stream(campaign_id: int, snapshot: Dict[str, Any], cursor: int) -> AsyncIterator[str]:
+    """SSE frames for one viewer: an initial snapshot and log backlog, then throttled deltas.
+
+    Progress goes out as unnamed events carrying the full LiveStats-shaped snapshot;
+    log lines go out as `logs` events whose id is the last seq in the batch.
+    """
+    loop = asyncio.get_running_loop()
+    frame_interval = 1.0 / max(settings.LIVE_UPDATES_FPS, 0.1)
+    queue = await hub.subscribe(campaign_id)
+    try:
+        # Subscribed first, so nothing published between the backlog read and now is lost
+        yield _sse(snapshot)
+        last_seq = cursor
+        backlog = await read_logs_after(campaign_id, cursor)
+        if backlog:
+            last_seq = _to_int(backlog[-1].get('seq'))
+            yield _sse(backlog, event='logs', event_id=last_seq)
+
+        last_flush = loop.time()
+        while True:
+            try:
+                first = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            # Coalesce everything that arrives until the next frame is due
+            wait = last_flush + frame_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            raw_messages = [first]
+            while not queue.empty():
+                raw_messages.append(queue.get_nowait())
+
+            progress = None
+            logs: List[Dict[str, Any]] = []
+            for raw in raw_messages:
+                try:
+                    event = json.loads(raw)
+                except ValueError:
+                    continue
+                if event.get('type') == 'progress':
+                    progress = event.get('progress') or {}
+                elif event.get('type') == 'logs':
+                    logs.extend(event.get('entries') or [])
+
+            logs.sort(key=lambda entry: _to_int(entry.get('seq')))
+            if logs and _to_int(logs[0].get('seq')) > last_seq + 1:
+                # Dropped or missed messages: refill from the Redis log list
+                logs = await read_logs_after(campaign_id, last_seq)
+            logs = [entry for entry in logs if _to_int(entry.get('seq')) > last_seq]
+
+            if progress is not None:
+                snapshot = merge_progress(snapshot, progress)
+                yield _sse(snapshot)
+            if logs:
+                last_seq = _to_int(logs[-1].get('seq'))
+                yield _sse(logs, event='logs', event_id=last_seq)
+            last_flush = loop.time()
+    finally:
+        await hub.unsubscribe(campaign_id, queue)
@@ -0,0 +1,92 @@
+"""
+Per-sender checkpoints of campaign sending
+
+A sender worker LPOPs a chunk from the campaign pool before sending it, so a
+worker that dies mid-chunk takes that chunk with it. Each worker run keeps a
+checkpoint in one Redis hash per campaign:
+
+    campaign:{campaign_id}:checkpoints    holder -> JSON
+
+with the sender, the EmailLog ids of the chunk in flight, how many it has
+acknowledged (written back) so far and the last acknowledged id, and a
+heartbeat (`at`). Writing it costs one HSET per chunk (plus at most one per
+HEARTBEAT_SECONDS while a chunk is in flight). A finished run deletes its
+checkpoint, so what is left behind with a heartbeat older than STALE_SECONDS
+belongs to a dead worker: the recovery in app.tasks_v2 (`recover_unsent`) puts
+its in-flight ids back.
+"""
+import json
+import time
+from typing import Dict, List
+
+import redis
+
+from app.config import settings
+
+# At most one heartbeat write per this many seconds while a chunk is in flight
+HEARTBEAT_SECONDS = 30
+# No heartbeat for this long: the worker is gone. A live worker heartbeats with its
+# results, so this only has to outlast the slowest send (the threads pool enforces
+# no Celery time limits); the same as concurrency.HOLD_SECONDS and the ledger lease
+STALE_SECONDS = 900
+CHECKPOINT_TTL_SECONDS = 7 * 86400
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+def get_campaign_checkpoints_key(campaign_id: int) -> str:
+    """Get Redis key for the campaign's sender worker checkpoints"""
+    return f"campaign:{campaign_id}:checkpoints"
+
+
+class SenderCheckpoint:
+    """One worker run's checkpoint."""
+
+    def __init__(self, campaign_id: int, user_email: str, holder: str):
+        self.key = get_campaign_checkpoints_key(campaign_id)
+        self.holder = holder
+        self.state = {"sender": user_email, "in_flight": [], "acked": 0, "last_acked_id": None, "at": None}
+
+    def _save(self) -> None:
+        self.state["at"] = time.time()
+        pipe = redis_client.pipeline()
+        pipe.hset(self.key, self.holder, json.dumps(self.state))
+        pipe.expire(self.key, CHECKPOINT_TTL_SECONDS)
+        pipe.execute()
+
+    def take(self, email_log_ids: List[int]) -> None:
+        """A chunk left the pool."""
+        self.state["in_flight"] = [log_id for log_id in email_log_ids if log_id is not None]
+        self._save()
+
+    def heartbeat(self) -> None:
+        """Still alive; writes at most once per HEARTBEAT_SECONDS, so call it per result."""
+        if time.time() - (self.state["at"] or 0) >= HEARTBEAT_SECONDS:
+            self._save()
+
+    def ack(self) -> None:
+        """The chunk in flight is written back (or handed back to the pool)."""
+        if self.state["in_flight"]:
+            self.state["acked"] += len(self.state["in_flight"])
+            self.state["last_acked_id"] = max(self.state["in_flight"])
+        self.state["in_flight"] = []
+        self._save()
+
+    def clear(self) -> None:
+        redis_client.hdel(self.key, self.holder)
+
+
+def get_checkpoints(campaign_id: int) -> Dict[str, Dict]:
+    """All worker checkpoints of a campaign (holder -> state)"""
+    return {holder: json.loads(raw) for holder, raw in redis_client.hgetall(get_campaign_checkpoints_key(campaign_id)).items()}
+
+
+def stale_checkpoints(campaign_id: int, now: float = None) -> Dict[str, Dict]:
+    """Checkpoints of workers that stopped heartbeating"""
+    now = now if now is not None else time.time()
+    return {holder: state for holder, state in get_checkpoints(campaign_id).items() if (state.get("at") or 0) < now - STALE_SECONDS}
+
+
+def drop_checkpoints(campaign_id: int, holders: List[str]) -> None:
+    if holders:
+        redis_client.hdel(get_campaign_checkpoints_key(campaign_id), *holders)
@@ -0,0 +1,102 @@
+"""
+Exactly-once send ledger
+
+With `task_acks_late` a killed worker's task is delivered again, and any
+email that went out before the kill but was not written back is still
+PENDING, so the redelivered batch (or a resume) would send it twice. Each
+campaign has a ledger in Redis, one field per EmailLog id:
+
+    campaign:{campaign_id}:ledger    email_log_id -> "sent" | claim expiry
+
+- `claim_sends()` checks and claims a chunk atomically before it is sent: ids
+  already "sent" or claimed by a live worker are skipped, everything else is
+  claimed for CLAIM_LEASE_SECONDS (far longer than a chunk takes to send, and
+  the threads pool enforces no Celery time limits, so only claims of dead
+  workers expire)
+- `mark_sent()` right after each successful send
+- `release_claims()` for sends that failed, went back to the pool or wait for
+  a retry, so they can be claimed again (a "sent" mark is never released)
+
+Each check or update is O(1) per message.
+"""
+from typing import List, Optional
+
+import redis
+
+from app.config import settings
+
+SENT = "sent"
+CLAIMED = "claimed"
+BUSY = "busy"
+
+CLAIM_LEASE_SECONDS = 900
+LEDGER_TTL_SECONDS = 7 * 86400
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+# KEYS: ledger hash; ARGV: lease seconds, ttl, email_log ids...
+# Returns one verdict per id: sent, busy (claimed by a live worker, or earlier in this call)
+# or claimed (by this call).
+_CLAIM = redis_client.register_script("""
+local now = tonumber(redis.call('TIME')[1])
+local expires = now + tonumber(ARGV[1])
+local result = {}
+for i = 3, #ARGV do
+  local value = redis.call('HGET', KEYS[1], ARGV[i])
+  if value == 'sent' then
+    result[i - 2] = 'sent'
+  elseif value and tonumber(value) > now then
+    result[i - 2] = 'busy'
+  else
+    redis.call('HSET', KEYS[1], ARGV[i], expires)
+    result[i - 2] = 'claimed'
+  end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return result
+""")
+
+# KEYS: ledger hash; ARGV: email_log ids. Drops claims, keeping "sent" marks.
+_RELEASE = redis_client.register_script("""
+for i = 1, #ARGV do
+  if redis.call('HGET', KEYS[1], ARGV[i]) ~= 'sent' then
+    redis.call('HDEL', KEYS[1], ARGV[i])
+  end
+end
+return #ARGV
+""")
+
+
+def get_campaign_ledger_key(campaign_id: int) -> str:
+    """Get Redis key for the campaign's exactly-once send ledger"""
+    return f"campaign:{campaign_id}:ledger"
+
+
+def claim_sends(campaign_id: int, email_log_ids: List[Optional[int]]) -> List[str]:
+    """Claim these sends; returns SENT, BUSY or CLAIMED for each, in order. A repeated
+    id is BUSY after its first copy; None (a send without an EmailLog) is CLAIMED."""
+    ids = [log_id for log_id in email_log_ids if log_id is not None]
+    if not ids:
+        return [CLAIMED] * len(email_log_ids)
+    verdicts = iter(_CLAIM(keys=[get_campaign_ledger_key(campaign_id)],
+                           args=[CLAIM_LEASE_SECONDS, LEDGER_TTL_SECONDS, *ids]))
+    return [next(verdicts) if log_id is not None else CLAIMED for log_id in email_log_ids]
+
+
+def mark_sent(campaign_id: int, email_log_id: int) -> None:
+    redis_client.hset(get_campaign_ledger_key(campaign_id), str(email_log_id), SENT)
+
+
+def release_claims(campaign_id: int, email_log_ids: List[int]) -> None:
+    """Let these ids be claimed again (those marked sent stay sent)."""
+    if email_log_ids:
+        _RELEASE(keys=[get_campaign_ledger_key(campaign_id)], args=email_log_ids)
+
+
+
+def sent_ids(campaign_id: int, email_log_ids: List[int]) -> List[int]:
+    """Those of these ids the ledger has as sent."""
+    if not email_log_ids:
+        return []
+    values = redis_client.hmget(get_campaign_ledger_key(campaign_id), email_log_ids)
+    return [log_id for log_id, value in zip(email_log_ids, values) if value == SENT]
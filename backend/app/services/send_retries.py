@@ -0,0 +1,106 @@
+"""
+Delayed retries of transient send failures
+
+Sends that fail with a retryable error (5xx, timeouts, connection resets) or
+are throttled by Gmail (429, rateLimitExceeded) are not failed right away.
+They go into a per-campaign Redis sorted set scored by the time they are due:
+
+    campaign:{campaign_id}:retry
+
+The delay is exponential in the attempt number with jitter (half fixed, half
+random), capped at RETRY_MAX_DELAY_SECONDS. A message fails for good after
+MAX_SEND_ATTEMPTS attempts.
+
+Nothing waits for a retry: sender workers move due entries back into the
+campaign's shared pool before each chunk (`promote_due_retries`), and when
+the last worker exits with only future retries left it schedules the next
+round of workers with a Celery countdown.
+"""
+import json
+import random
+from typing import Dict, List, Optional
+
+import redis
+
+from app.config import settings
+
+MAX_SEND_ATTEMPTS = 5
+RETRY_BASE_DELAY_SECONDS = 2.0
+RETRY_MAX_DELAY_SECONDS = 300.0
+# Due retries moved into the pool per call
+PROMOTE_BATCH = 500
+RETRY_KEY_TTL_SECONDS = 86400
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+# KEYS: retry zset, pool list; ARGV: max entries, pool ttl.
+# Moves due entries to the head of the pool; returns how many moved.
+_PROMOTE = redis_client.register_script("""
+local t = redis.call('TIME')
+local now = t[1] .. '.' .. string.format('%06d', tonumber(t[2]))
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[1]))
+if #due > 0 then
+  redis.call('ZREM', KEYS[1], unpack(due))
+  redis.call('LPUSH', KEYS[2], unpack(due))
+  redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return #due
+""")
+
+
+def get_campaign_retry_key(campaign_id: int) -> str:
+    """Get Redis key for the campaign's delayed send retries"""
+    return f"campaign:{campaign_id}:retry"
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Delay before retry number `attempt` (1-based): exponential with equal jitter."""
+    delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def can_retry(task: Dict) -> bool:
+    """Whether a task that just failed has attempts left."""
+    return task.get('attempts', 0) + 1 < MAX_SEND_ATTEMPTS
+
+
+def schedule_retries(campaign_id: int, tasks: List[Dict], now: float) -> None:
+    """Queue failed tasks for a later attempt, each with its own backoff."""
+    if not tasks:
+        return
+    entries = {}
+    for task in tasks:
+        attempts = task.get('attempts', 0) + 1
+        entries[json.dumps({**task, 'attempts': attempts})] = now + backoff_seconds(attempts)
+    key = get_campaign_retry_key(campaign_id)
+    pipe = redis_client.pipeline()
+    pipe.zadd(key, entries)
+    pipe.expire(key, RETRY_KEY_TTL_SECONDS)
+    pipe.execute()
+
+
+def defer_tasks(campaign_id: int, tasks: List[Dict], due_at: float) -> None:
+    """Queue tasks to come back to the pool at `due_at`, as they are (not a failed
+    attempt: e.g. sends another worker had claimed)."""
+    if not tasks:
+        return
+    key = get_campaign_retry_key(campaign_id)
+    pipe = redis_client.pipeline()
+    pipe.zadd(key, {json.dumps(task): due_at for task in tasks})
+    pipe.expire(key, RETRY_KEY_TTL_SECONDS)
+    pipe.execute()
+
+
+def promote_due_retries(campaign_id: int, pool_key: str, pool_ttl: int) -> int:
+    """Move retries that are due into the pool (at its head)."""
+    return int(_PROMOTE(keys=[get_campaign_retry_key(campaign_id), pool_key], args=[PROMOTE_BATCH, pool_ttl]))
+
+
+def pending_retries(campaign_id: int) -> int:
+    return redis_client.zcard(get_campaign_retry_key(campaign_id))
+
+
+def next_retry_due(campaign_id: int) -> Optional[float]:
+    """Due time of the earliest queued retry, or None."""
+    first = redis_client.zrange(get_campaign_retry_key(campaign_id), 0, 0, withscores=True)
+    return first[0][1] if first else None
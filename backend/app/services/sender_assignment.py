@@ -0,0 +1,236 @@
+"""
+Quota-aware assignment of campaign recipients to senders
+
+Preparation used to split recipients equally across every active user, so
+exhausted senders got full shares that then failed while others sat idle. The
+plan built here gives each sender a share weighted by:
+
+- remaining daily capacity: the user's quota_limit and the account's
+  daily_limit, minus today's usage in the quota ledger (sent + held) and
+  minus PENDING sends already assigned to them by active campaigns
+- recent success rate: SENT / (SENT + FAILED) over SUCCESS_WINDOW_HOURS,
+  Laplace-smoothed so senders without history start at 0.5
+
+Shares never exceed a sender's or its account's remaining capacity. Whatever
+does not fit stays unassigned in campaign_recipients (sender_email NULL) and
+the campaign goes into the deferred queue (a Redis sorted set scored by the
+start of the next UTC quota window); `release_deferred_recipients` plans it
+again once the window opens.
+
+The plan (per-sender counts, deferred count, projected send time) is stored
+in Redis and served by GET /campaigns/{id}/plan/ before the campaign is READY.
+"""
+import json
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import redis
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud.campaign_recipients import assign_sender_block
+from app.metrics import GMAIL_API_SECONDS
+from app.models import Campaign, CampaignStatus, EmailLog, EmailStatus
+from app.quota_ledger import get_sender_usage
+
+logger = logging.getLogger(__name__)
+
+SUCCESS_WINDOW_HOURS = 24
+# Used for the projection until the Gmail latency histogram has samples
+DEFAULT_SEND_SECONDS = 0.5
+PLAN_TTL_SECONDS = 7 * 86400
+DEFERRED_CAMPAIGNS_KEY = "campaigns:deferred"
+ACTIVE_STATUSES = (CampaignStatus.READY, CampaignStatus.SENDING, CampaignStatus.PAUSED)
+
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+def get_campaign_plan_key(campaign_id: int) -> str:
+    """Get Redis key for a campaign's sender assignment plan"""
+    return f"campaign:{campaign_id}:plan"
+
+
+def next_quota_window(now: Optional[datetime] = None) -> datetime:
+    """Start of the next UTC day, when the quota ledger starts from zero"""
+    now = now or datetime.now(timezone.utc)
+    return (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _pending_assigned(db: Session) -> Dict[tuple, int]:
+    """PENDING sends already assigned to each (account, sender) by active campaigns."""
+    rows = (
+        db.query(EmailLog.service_account_id, EmailLog.sender_email, func.count(EmailLog.id))
+        .join(Campaign, Campaign.id == EmailLog.campaign_id)
+        .filter(
+            EmailLog.status == EmailStatus.PENDING,
+            Campaign.status.in_(ACTIVE_STATUSES),
+        )
+        .group_by(EmailLog.service_account_id, EmailLog.sender_email)
+        .all()
+    )
+    return {(account_id, (email or '').lower()): count for account_id, email, count in rows}
+
+
+def _success_rates(db: Session, sender_emails: List[str]) -> Dict[str, float]:
+    since = datetime.utcnow() - timedelta(hours=SUCCESS_WINDOW_HOURS)
+    rows = (
+        db.query(
+            EmailLog.sender_email,
+            func.sum(case((EmailLog.status == EmailStatus.SENT, 1), else_=0)),
+            func.count(EmailLog.id),
+        )
+        .filter(
+            EmailLog.sender_email.in_(sender_emails),
+            EmailLog.status.in_([EmailStatus.SENT, EmailStatus.FAILED]),
+            EmailLog.created_at >= since,
+        )
+        .group_by(EmailLog.sender_email)
+        .all()
+    )
+    counts = {email.lower(): (int(sent or 0), int(total or 0)) for email, sent, total in rows}
+    return {
+        email: (counts.get(email.lower(), (0, 0))[0] + 1) / (counts.get(email.lower(), (0, 0))[1] + 2)
+        for email in sender_emails
+    }
+
+
+def allocate(total: int, capacities: List[int], weights: List[float], accounts: List[int],
+             account_capacity: Dict[int, int]) -> List[int]:
+    """Split `total` proportionally to `weights` without exceeding any sender's capacity or
+    its account's capacity; the shares of saturated senders are spread over the rest."""
+    allocation = [0] * len(capacities)
+    account_left = dict(account_capacity)
+    remaining = total
+
+    def room(i: int) -> int:
+        return min(capacities[i] - allocation[i], account_left.get(accounts[i], 0))
+
+    while remaining > 0:
+        active = [i for i in range(len(capacities)) if weights[i] > 0 and room(i) > 0]
+        if not active:
+            break
+        weight_sum = sum(weights[i] for i in active)
+        exact = [remaining * weights[i] / weight_sum for i in active]
+        shares = [int(x) for x in exact]
+        # Largest remainder, so the shares add up to `remaining`
+        by_fraction = sorted(range(len(active)), key=lambda j: exact[j] - shares[j], reverse=True)
+        for j in by_fraction[:remaining - sum(shares)]:
+            shares[j] += 1
+        assigned = 0
+        for i, share in zip(active, shares):
+            share = min(share, room(i))
+            allocation[i] += share
+            account_left[accounts[i]] -= share
+            assigned += share
+        if not assigned:
+            break
+        remaining -= assigned
+    return allocation
+
+
+def build_assignment_plan(db: Session, campaign_id: int, sender_pool: List[Dict], total: int,
+                          threads_per_sender: int) -> Dict:
+    """Weighted, capacity-capped share of `total` recipients for each sender in the pool."""
+    account_usage, user_usage = get_sender_usage(sender_pool)
+    pending = _pending_assigned(db)
+    rates = _success_rates(db, [sender['user_email'] for sender in sender_pool])
+
+    pending_by_account: Dict[int, int] = {}
+    for (account_id, _), count in pending.items():
+        pending_by_account[account_id] = pending_by_account.get(account_id, 0) + count
+    account_limits = {sender['service_account_id']: sender.get('daily_limit') or 0 for sender in sender_pool}
+    account_capacity = {
+        account_id: max(0, limit - account_usage[account_id]['used'] - account_usage[account_id]['held']
+                        - pending_by_account.get(account_id, 0))
+        for account_id, limit in account_limits.items()
+    }
+
+    capacities, weights, accounts = [], [], []
+    for sender, usage in zip(sender_pool, user_usage):
+        account_id = sender['service_account_id']
+        limit = sender.get('quota_limit')
+        if limit is None:
+            limit = account_limits[account_id]
+        capacity = max(0, limit - usage['used'] - usage['held']
+                       - pending.get((account_id, sender['user_email'].lower()), 0))
+        capacities.append(capacity)
+        weights.append(capacity * rates[sender['user_email']])
+        accounts.append(account_id)
+
+    allocation = allocate(total, capacities, weights, accounts, account_capacity)
+    assigned = sum(allocation)
+    deferred = total - assigned
+
+    send_seconds = GMAIL_API_SECONDS.mean(endpoint='gmail.messages.send') or DEFAULT_SEND_SECONDS
+    projected_seconds = max(
+        (math.ceil(count / max(threads_per_sender, 1)) * send_seconds for count in allocation), default=0.0
+    )
+    now = datetime.now(timezone.utc)
+    return {
+        "campaign_id": campaign_id,
+        "created_at": now.isoformat(),
+        "total_recipients": total,
+        "assigned": assigned,
+        "deferred": deferred,
+        "deferred_until": next_quota_window(now).isoformat() if deferred else None,
+        "projected_seconds": round(projected_seconds, 1),
+        "projected_completion_at": (now + timedelta(seconds=projected_seconds)).isoformat(),
+        "senders": [
+            {
+                "user_email": sender['user_email'],
+                "service_account_id": sender['service_account_id'],
+                "assigned": count,
+                "capacity": capacity,
+                "success_rate": round(rates[sender['user_email']], 3),
+            }
+            for sender, count, capacity in zip(sender_pool, allocation, capacities)
+        ],
+        "accounts": [
+            {"service_account_id": account_id, "capacity": capacity}
+            for account_id, capacity in sorted(account_capacity.items())
+        ],
+    }
+
+
+def apply_assignment_plan(db: Session, campaign_id: int, plan: Dict, sender_pool: List[Dict],
+                          subject: str, start_ordinal: int = 0) -> None:
+    """Assign contiguous ordinal blocks (from `start_ordinal`) to the senders per the plan
+    and create their EmailLogs; the unassigned tail is the deferred part."""
+    block_start = start_ordinal
+    for sender, entry in zip(sender_pool, plan["senders"]):
+        if entry["assigned"]:
+            assign_sender_block(db, campaign_id, block_start, block_start + entry["assigned"], sender, subject)
+            block_start += entry["assigned"]
+
+
+def save_assignment_plan(campaign_id: int, plan: Dict) -> None:
+    """Store the plan for the API and queue (or clear) the campaign's deferred part."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.set(get_campaign_plan_key(campaign_id), json.dumps(plan), ex=PLAN_TTL_SECONDS)
+    if plan["deferred"]:
+        until = datetime.fromisoformat(plan["deferred_until"]).timestamp()
+        pipe.zadd(DEFERRED_CAMPAIGNS_KEY, {campaign_id: until})
+    else:
+        pipe.zrem(DEFERRED_CAMPAIGNS_KEY, campaign_id)
+    pipe.execute()
+
+
+def get_assignment_plan(campaign_id: int) -> Optional[Dict]:
+    raw = redis_client.get(get_campaign_plan_key(campaign_id))
+    return json.loads(raw) if raw else None
+
+
+def defer_campaign(campaign_id: int, until: float) -> None:
+    redis_client.zadd(DEFERRED_CAMPAIGNS_KEY, {campaign_id: until})
+
+
+def undefer_campaign(campaign_id: int) -> None:
+    redis_client.zrem(DEFERRED_CAMPAIGNS_KEY, campaign_id)
+
+
+def due_deferred_campaigns(now: Optional[float] = None) -> List[int]:
+    return [int(member) for member in redis_client.zrangebyscore(DEFERRED_CAMPAIGNS_KEY, 0, now or time.time())]
@@ -0,0 +1,146 @@
+"""
+Structured, level-gated, sampled logging for hot paths
+
+Per-email code paths (task preparation, MIME building, sending) used to emit
+several `logger.info(f"...")` lines per email: every f-string was formatted even
+when nothing consumed it, and with 100 sender threads all writing to stdout the
+handler lock became a bottleneck.
+
+- `log_event()` checks the level first, then sampling and a per-event rate limit,
+  and only then creates a record whose JSON message is rendered lazily by the
+  handler. Pass objects by reference (no slicing/formatting at the call site).
+- `enable_queue_logging()` moves the root handlers behind a QueueHandler /
+  QueueListener pair, so formatting and I/O happen on one background thread
+  instead of on the send threads.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener_lock = threading.Lock()
+
+
+class _StructuredMessage:
+    """Log message rendered to JSON only when a handler formats the record."""
+    __slots__ = ('event', 'fields')
+
+    def __init__(self, event: str, fields: Dict):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return json.dumps({'event': self.event, **self.fields}, default=str, ensure_ascii=False)
+
+
+class _EventLimiter:
+    """Token bucket for one event name; counts what it drops."""
+    __slots__ = ('rate', 'tokens', 'updated', 'suppressed', 'lock')
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = max(rate, 1.0)
+        self.updated = time.monotonic()
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> Tuple[bool, int]:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1.0:
+                self.suppressed += 1
+                return False, 0
+            self.tokens -= 1.0
+            suppressed, self.suppressed = self.suppressed, 0
+            return True, suppressed
+
+
+_limiters: Dict[str, _EventLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter(event: str, rate: float) -> _EventLimiter:
+    limiter = _limiters.get(event)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.setdefault(event, _EventLimiter(rate))
+    return limiter
+
+
+def log_event(
+    logger: logging.Logger,
+    level: int,
+    event: str,
+    sample: float = 1.0,
+    rate: Optional[float] = None,
+    **fields
+) -> None:
+    """Log `event` with `fields` as one JSON line.
+
+    Skipped without formatting anything unless the level is enabled, the record
+    survives `sample` (fraction 0..1) and the per-event `rate` limit (records per
+    second). Records dropped by the rate limit are reported as `suppressed` on
+    the next record that gets through.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sample < 1.0 and random.random() >= sample:
+        return
+    if rate is not None:
+        allowed, suppressed = _limiter(event, rate).acquire()
+        if not allowed:
+            return
+        if suppressed:
+            fields['suppressed'] = suppressed
+    logger.log(level, _StructuredMessage(event, fields), stacklevel=2)
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for an in-process queue: hand the record over untouched so
+    message formatting happens on the listener thread, not the caller's."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def enable_queue_logging(logger: Optional[logging.Logger] = None) -> Optional[logging.handlers.QueueListener]:
+    """Move `logger`'s (default: root) handlers behind a background QueueListener.
+    Returns the listener, or None if the logger was already queued."""
+    logger = logger or logging.getLogger()
+    with _listener_lock:
+        if any(isinstance(h, _InProcessQueueHandler) for h in logger.handlers):
+            return None
+        handlers = logger.handlers[:] or [logging.StreamHandler()]
+        for handler in handlers:
+            if handler.formatter is None:
+                handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            logger.removeHandler(handler)
+        log_queue: queue.Queue = queue.Queue(-1)
+        logger.addHandler(_InProcessQueueHandler(log_queue))
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(_stop_listener, listener)
+        return listener
+
+
+def _stop_listener(listener: logging.handlers.QueueListener) -> None:
+    """Flush remaining records at exit; tolerate listeners already stopped by their owner."""
+    try:
+        listener.stop()
+    except AttributeError:
+        pass
+
+
+def configure_logging(level: str = 'INFO') -> None:
+    """Standard process logging setup: stdout handler with LOG_FORMAT, drained off-thread."""
+    logging.basicConfig(level=getattr(logging, level.upper(), logging.INFO), format=LOG_FORMAT)
+    enable_queue_logging()
@@ -1,10 +1,13 @@
-from celery import Task, states, chord, group
+from celery import Task, states, chord, group, chain
 from celery.exceptions import Ignore
 from app.celery_app import celery_app
 from app.database import SessionLocal
 from app.models import Campaign, EmailLog, WorkspaceUser, ServiceAccount, CampaignStatus, EmailStatus
 from app.google_api import GoogleWorkspaceService, substitute_variables
 from app.encryption import encryption_service
+from app.quota_ledger import reserve_for_sender
+from app.concurrency import AdaptiveConcurrency
+from app.crud.campaign_recipients import iter_campaign_recipients, get_recipient_variables
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import time
@@ -16,6 +19,15 @@ import threading
 
 logger = logging.getLogger(__name__)
 
+# Each sender's share is sent as a chain of tasks, each sized to take about this
+# long at the sender's observed latency. The threads pool enforces no time limits;
+# chunks bound what one task holds: a redelivery (acks_late) repeats at most one
+# chunk, results are written back as each chunk ends, and a worker thread is free
+# for other campaigns' tasks between chunks
+SENDER_TASK_TARGET_SECONDS = 60
+SENDER_TASK_MIN_EMAILS = 1
+SENDER_TASK_MAX_EMAILS = 2000
+
 
 class CampaignTask(Task):
     """Base task with campaign pause/resume support"""
@@ -107,7 +119,9 @@ def send_campaign_emails(self, campaign_id: int):
                     'service_account_id': account.id,
                     'service_account_json': decrypted_json,
                     'user_email': user.email,
-                    'user_id': user.id
+                    'user_id': user.id,
+                    'daily_limit': account.daily_limit,
+                    'quota_limit': user.quota_limit
                 })
         
         if not sender_pool:
@@ -122,15 +136,17 @@ def send_campaign_emails(self, campaign_id: int):
         ).all()
         
         if not email_logs:
-            for recipient in campaign.recipients:
-                email_log = EmailLog(
-                    campaign_id=campaign_id,
-                    recipient_email=recipient['email'],
-                    recipient_name=recipient.get('variables', {}).get('name', ''),
-                    subject=campaign.subject,
-                    status=EmailStatus.PENDING
-                )
-                db.add(email_log)
+            for recipients in iter_campaign_recipients(db, campaign_id):
+                db.add_all([
+                    EmailLog(
+                        campaign_id=campaign_id,
+                        recipient_email=recipient.email,
+                        recipient_name=(recipient.variables or {}).get('name', ''),
+                        subject=campaign.subject,
+                        status=EmailStatus.PENDING
+                    )
+                    for recipient in recipients
+                ])
             db.commit()
             email_logs = db.query(EmailLog).filter(
                 EmailLog.campaign_id == campaign_id,
@@ -149,6 +165,8 @@ def send_campaign_emails(self, campaign_id: int):
                 'emails': []
             }
         
+        variables_by_email = get_recipient_variables(db, campaign_id, [log.recipient_email for log in email_logs])
+        
         # Distribute emails equally among senders
         for idx, email_log in enumerate(email_logs):
             # Use round-robin but ensure equal distribution
@@ -156,16 +174,10 @@ def send_campaign_emails(self, campaign_id: int):
             sender = sender_pool[sender_index]
             sender_key = sender['user_email']
             
-            # Get recipient variables
-            recipient_data = next(
-                (r for r in campaign.recipients if r['email'] == email_log.recipient_email),
-                {'email': email_log.recipient_email, 'variables': {}}
-            )
-            
             emails_per_sender[sender_key]['emails'].append({
                 'email_log_id': email_log.id,
                 'recipient_email': email_log.recipient_email,
-                'variables': recipient_data.get('variables', {}),
+                'variables': variables_by_email.get(email_log.recipient_email, {}),
             })
         
         # Log distribution details
@@ -179,21 +191,32 @@ def send_campaign_emails(self, campaign_id: int):
             logger.info(f"   👤 {sender_key}: {len(data['emails'])} emails")
         
         # INSTANT PARALLEL SENDING - All senders fire simultaneously
-        # Create one task per sender (not per email)
+        # One chain per sender: its share split into chunks sent one after another
+        # (so per-sender order and concurrency hold). A chunk that fails records its
+        # emails and returns, so the rest of the chain still runs
         tasks = []
         for sender_email, data in emails_per_sender.items():
-            task = send_bulk_from_single_sender.s(
-                campaign_id=campaign_id,
-                sender_data=data['sender'],
-                email_batch=data['emails'],
-                subject=campaign.subject,
-                body_html=campaign.body_html,
-                body_plain=campaign.body_plain,
-                custom_headers=campaign.custom_headers,
-                attachments=campaign.attachments,
-                from_name=campaign.from_name
-            )
-            tasks.append(task)
+            if not data['emails']:
+                continue
+            concurrency = AdaptiveConcurrency.for_sender(data['sender'])
+            concurrency.peek()
+            chunk_size = concurrency.chunk_size(SENDER_TASK_TARGET_SECONDS, SENDER_TASK_MIN_EMAILS, SENDER_TASK_MAX_EMAILS)
+            chunks = [
+                send_bulk_from_single_sender.si(
+                    campaign_id=campaign_id,
+                    sender_data=data['sender'],
+                    email_batch=data['emails'][offset:offset + chunk_size],
+                    subject=campaign.subject,
+                    body_html=campaign.body_html,
+                    body_plain=campaign.body_plain,
+                    custom_headers=campaign.custom_headers,
+                    attachments=campaign.attachments,
+                    from_name=campaign.from_name
+                )
+                for offset in range(0, len(data['emails']), chunk_size)
+            ]
+            logger.info(f"   🔗 {sender_email}: {len(chunks)} chunks of up to {chunk_size} emails")
+            tasks.append(chain(*chunks))
         
         # Fire all tasks simultaneously
         logger.info(f"⚡ FIRING {len(tasks)} parallel senders NOW!")
@@ -350,17 +373,29 @@ def send_single_email(
         final_body_html = substitute_variables(body_html, variables) if body_html else None
         final_body_plain = substitute_variables(body_plain, variables) if body_plain else None
         
-        # Send email
-        message_id = google_service.send_email(
-            sender_email=sender_email,
-            recipient_email=recipient_email,
-            subject=final_subject,
-            body_html=final_body_html,
-            body_plain=final_body_plain,
-            from_name=from_name,
-            custom_headers=custom_headers,
-            attachments=attachments
+        # Hold one send of the sender's daily quota
+        quota = reserve_for_sender(
+            {'service_account_id': sender_account_id, 'user_email': sender_email}, 1, partial=False, db=db
         )
+        if not quota.granted:
+            raise Exception(f"Daily limit exceeded for {sender_email}")
+        
+        # Send email
+        try:
+            message_id = google_service.send_email(
+                sender_email=sender_email,
+                recipient_email=recipient_email,
+                subject=final_subject,
+                body_html=final_body_html,
+                body_plain=final_body_plain,
+                from_name=from_name,
+                custom_headers=custom_headers,
+                attachments=attachments
+            )
+        except Exception:
+            quota.release()
+            raise
+        quota.settle(1)
         
         # Update email log
         email_log.status = EmailStatus.SENT
@@ -379,7 +414,6 @@ def send_single_email(
             WorkspaceUser.email == sender_email
         ).first()
         if workspace_user:
-            workspace_user.emails_sent_today += 1
             workspace_user.last_used = datetime.utcnow()
         
         db.commit()
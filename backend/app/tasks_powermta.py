@@ -7,6 +7,11 @@ from app.celery_app import celery_app
 from app.database import SessionLocal
 from app.models import Campaign, EmailLog, WorkspaceUser, CampaignStatus, EmailStatus
 from app.google_api import GoogleWorkspaceService, substitute_variables
+from app.quota_ledger import reserve_for_sender
+from app.concurrency import AdaptiveConcurrency, timed_call
+from app.send_errors import SendError, SENDER, classify_send_error, is_throttle
+from app.circuit_breaker import SenderBreaker, OPEN, PROBE
+from app.services.send_ledger import SENT, CLAIMED, claim_sends, mark_sent, release_claims, sent_ids
 from datetime import datetime
 import logging
 from typing import List, Dict
@@ -55,7 +60,72 @@ def send_single_email_sync(
         return (True, message_id, None)
     
     except Exception as e:
-        return (False, None, str(e))
+        return (False, None, SendError(str(e), classify_send_error(e), is_throttle(e)))
+
+
+def _send_once(campaign_id: int, email_log_id: int, *args) -> tuple:
+    """send_single_email_sync, then mark the send in the exactly-once ledger."""
+    outcome = send_single_email_sync(*args)
+    if outcome[0]:
+        mark_sent(campaign_id, email_log_id)
+    return outcome
+
+
+def _record_batch(db, campaign_id: int, sender_data: Dict, results: List[Dict]) -> tuple:
+    """
+    Write back a sender's results and commit: EmailLogs, campaign counters and the
+    sender's last_used, then drop the ledger claims of failed sends so they can be
+    sent again. Logs that are no longer PENDING were recorded by an earlier delivery
+    of the batch and are not counted again.
+    
+    Returns:
+        (sent: int, failed: int)
+    """
+    sender_email = sender_data['user_email']
+    sent_count = 0
+    failed_count = 0
+    
+    for result in results:
+        email_log = db.query(EmailLog).filter(EmailLog.id == result['email_log_id']).first()
+        
+        if email_log and email_log.status == EmailStatus.PENDING:
+            if result['success']:
+                email_log.status = EmailStatus.SENT
+                email_log.message_id = result['message_id']
+                email_log.sender_email = sender_email
+                email_log.service_account_id = sender_data['service_account_id']
+                email_log.sent_at = datetime.utcnow()
+                sent_count += 1
+            else:
+                email_log.status = EmailStatus.FAILED
+                email_log.error_message = str(result['error'])
+                email_log.sender_email = sender_email
+                email_log.failed_at = datetime.utcnow()
+                failed_count += 1
+    
+    # Update campaign counters
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    if campaign:
+        campaign.sent_count += sent_count
+        campaign.failed_count += failed_count
+        campaign.pending_count = max(0, campaign.pending_count - sent_count - failed_count)
+    
+    # Update workspace user stats
+    workspace_user = db.query(WorkspaceUser).filter(
+        WorkspaceUser.service_account_id == sender_data['service_account_id'],
+        WorkspaceUser.email == sender_email
+    ).first()
+    if workspace_user:
+        workspace_user.last_used = datetime.utcnow()
+    
+    db.commit()
+    release_claims(campaign_id, [result['email_log_id'] for result in results if not result['success']])
+    return sent_count, failed_count
+
+
+def _sent_here(results: List[Dict]) -> int:
+    """Sends this task made itself (not those the ledger already had as sent)"""
+    return sum(1 for result in results if result['success'] and not result.get('duplicate'))
 
 
 @celery_app.task(name='app.tasks.send_bulk_from_single_sender')
@@ -86,139 +156,156 @@ def send_bulk_from_single_sender(
     """
     db = SessionLocal()
     sender_email = sender_data['user_email']
+    quota = None
+    concurrency = AdaptiveConcurrency.for_sender(sender_data)
+    breaker = SenderBreaker.for_sender(sender_data, concurrency.holder)
+    results = []
+    # EmailLogs this task answers for: the whole batch until the ledger hands the
+    # ones another worker is sending right now to that worker
+    owned = [email_data['email_log_id'] for email_data in email_batch]
     
     try:
-        # Check daily limit before sending
-        from app.daily_limits import check_daily_limit, update_daily_sent
         account_id = sender_data['service_account_id']
+        
+        # Exactly-once: a redelivered batch records what already went out instead of
+        # resending it, and leaves sends another worker is making right now to it
+        claims = list(zip(email_batch, claim_sends(campaign_id, owned)))
+        results.extend({
+            'email_log_id': email_data['email_log_id'],
+            'success': True,
+            'message_id': None,
+            'error': None,
+            'duplicate': True
+        } for email_data, verdict in claims if verdict == SENT)
+        email_batch = [email_data for email_data, verdict in claims if verdict == CLAIMED]
+        owned = [email_data['email_log_id'] for email_data, verdict in claims if verdict in (SENT, CLAIMED)]
+        
+        # Reserve the sender's daily quota (account and user) for the claimed emails
         emails_to_send = len(email_batch)
         
-        can_send, remaining_limit, would_exceed_by = check_daily_limit(account_id, emails_to_send)
+        quota = reserve_for_sender(sender_data, emails_to_send, partial=False, db=db)
         
-        if not can_send:
-            logger.warning(f"🚫 Daily limit exceeded for account {account_id}: {emails_to_send} emails requested, {remaining_limit} remaining")
-            # Mark all emails as failed due to daily limit
-            for email_data in email_batch:
-                email_log = db.query(EmailLog).filter(EmailLog.id == email_data['email_log_id']).first()
-                if email_log:
-                    email_log.status = EmailStatus.FAILED
-                    email_log.error_message = f"Daily limit exceeded: {would_exceed_by} emails over limit"
-            db.commit()
-            return {"sent": 0, "failed": emails_to_send, "error": "Daily limit exceeded"}
+        if not quota.granted:
+            logger.warning(f"🚫 Daily limit exceeded for account {account_id} / {sender_email}: {emails_to_send} emails requested")
+            # Mark the claimed emails as failed due to daily limit
+            results.extend({
+                'email_log_id': email_data['email_log_id'],
+                'success': False,
+                'message_id': None,
+                'error': "Daily limit exceeded"
+            } for email_data in email_batch)
+            sent_count, failed_count = _record_batch(db, campaign_id, sender_data, results)
+            return {"sent": sent_count, "failed": failed_count, "error": "Daily limit exceeded"}
         
-        logger.info(f"✅ Daily limit check passed: {emails_to_send} emails, {remaining_limit} remaining")
+        logger.info(f"✅ Daily limit check passed: {emails_to_send} emails reserved")
         # Initialize Google API service once
         google_service = GoogleWorkspaceService(sender_data['service_account_json'])
         
         # Use thread pool for parallel sending from this sender
-        # Gmail API is thread-safe for different messages
-        max_threads = len(email_batch)  # UNLIMITED threads - send ALL emails instantly
-        
-        logger.info(f"👤 Sender {sender_email}: Sending {len(email_batch)} emails with {max_threads} threads")
+        # Gmail API is thread-safe for different messages; in-flight sends follow the
+        # sender's and account's adaptive (AIMD) limits, re-read every wave
+        logger.info(f"👤 Sender {sender_email}: Sending {len(email_batch)} emails")
         start_time = time.time()
         
-        results = []
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            # Submit all emails for this sender
-            future_to_email = {}
-            
-            for email_data in email_batch:
-                future = executor.submit(
-                    send_single_email_sync,
-                    google_service,
-                    sender_email,
-                    email_data['recipient_email'],
-                    subject,
-                    body_html,
-                    body_plain,
-                    email_data['variables'],
-                    custom_headers,
-                    attachments,
-                    from_name
-                )
-                future_to_email[future] = email_data
+        offset = 0
+        while offset < len(email_batch):
+            # An open breaker fails the rest instantly instead of sending each through
+            # credentials + HTTP; after its cooldown a single probe send goes first
+            verdict = breaker.allow()
+            if verdict == OPEN:
+                logger.warning(f"🔌 Sender {sender_email}: circuit open, failing {len(email_batch) - offset} emails")
+                results.extend({
+                    'email_log_id': email_data['email_log_id'],
+                    'success': False,
+                    'message_id': None,
+                    'error': SendError("Sender circuit open after repeated sender errors", SENDER)
+                } for email_data in email_batch[offset:])
+                break
+            window = 1 if verdict == PROBE else concurrency.acquire()
+            wave = email_batch[offset:offset + window]
+            offset += len(wave)
+            latencies = []
+            throttled = 0
+            faults_since_success = 0
+            last_fault = None
             
-            # Collect results as they complete
-            for future in as_completed(future_to_email):
-                email_data = future_to_email[future]
-                success, message_id, error = future.result()
+            with ThreadPoolExecutor(max_workers=window) as executor:
+                # Submit this wave's emails for this sender
+                future_to_email = {}
                 
-                results.append({
-                    'email_log_id': email_data['email_log_id'],
-                    'success': success,
-                    'message_id': message_id,
-                    'error': error
-                })
+                for email_data in wave:
+                    future = executor.submit(
+                        timed_call,
+                        _send_once,
+                        campaign_id,
+                        email_data['email_log_id'],
+                        google_service,
+                        sender_email,
+                        email_data['recipient_email'],
+                        subject,
+                        body_html,
+                        body_plain,
+                        email_data['variables'],
+                        custom_headers,
+                        attachments,
+                        from_name
+                    )
+                    future_to_email[future] = email_data
+                
+                # Collect results as they complete
+                for future in as_completed(future_to_email):
+                    email_data = future_to_email[future]
+                    (success, message_id, error), seconds = future.result()
+                    if success:
+                        latencies.append(seconds)
+                        faults_since_success = 0
+                    elif error.throttled:
+                        throttled += 1
+                    elif error.kind == SENDER:
+                        faults_since_success += 1
+                        last_fault = error
+                    
+                    results.append({
+                        'email_log_id': email_data['email_log_id'],
+                        'success': success,
+                        'message_id': message_id,
+                        'error': error
+                    })
+            concurrency.feedback(len(latencies), throttled, sum(latencies) / len(latencies) if latencies else None)
+            if breaker.record(len(latencies), faults_since_success, str(last_fault or "")):
+                logger.warning(f"🔌 Circuit opened for sender {sender_email}: {last_fault}")
         
         elapsed = time.time() - start_time
         logger.info(f"✅ Sender {sender_email}: Completed {len(email_batch)} emails in {elapsed:.2f}s ({len(email_batch)/elapsed:.1f} emails/sec)")
         
         # Batch update database
-        sent_count = 0
-        failed_count = 0
+        sent_count, failed_count = _record_batch(db, campaign_id, sender_data, results)
         
-        for result in results:
-            email_log = db.query(EmailLog).filter(EmailLog.id == result['email_log_id']).first()
-            
-            if email_log:
-                if result['success']:
-                    email_log.status = EmailStatus.SENT
-                    email_log.message_id = result['message_id']
-                    email_log.sender_email = sender_email
-                    email_log.service_account_id = sender_data['service_account_id']
-                    email_log.sent_at = datetime.utcnow()
-                    sent_count += 1
-                else:
-                    email_log.status = EmailStatus.FAILED
-                    email_log.error_message = result['error']
-                    email_log.sender_email = sender_email
-                    email_log.failed_at = datetime.utcnow()
-                    failed_count += 1
-        
-        # Update campaign counters
-        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-        if campaign:
-            campaign.sent_count += sent_count
-            campaign.failed_count += failed_count
-            campaign.pending_count = max(0, campaign.pending_count - len(results))
-        
-        # Update workspace user stats
-        workspace_user = db.query(WorkspaceUser).filter(
-            WorkspaceUser.service_account_id == sender_data['service_account_id'],
-            WorkspaceUser.email == sender_email
-        ).first()
-        if workspace_user:
-            workspace_user.emails_sent_today += sent_count
-            workspace_user.last_used = datetime.utcnow()
-        
-        db.commit()
-        
-        # Update daily sent count for the account
-        if sent_count > 0:
-            update_daily_sent(account_id, sent_count)
-            logger.info(f"📊 Updated daily sent: +{sent_count} emails for account {account_id}")
+        # Update daily sent count for the account and user (quota ledger)
+        quota.settle(_sent_here(results))
+        logger.info(f"📊 Updated daily sent: +{_sent_here(results)} emails for account {account_id}")
         
         logger.info(f"📊 Sender {sender_email}: {sent_count} sent, {failed_count} failed")
         
     except Exception as e:
         logger.error(f"❌ Sender {sender_email} bulk send failed: {e}")
+        db.rollback()
         
-        # Mark all as failed
-        for email_data in email_batch:
-            email_log = db.query(EmailLog).filter(EmailLog.id == email_data['email_log_id']).first()
-            if email_log and email_log.status == EmailStatus.PENDING:
-                email_log.status = EmailStatus.FAILED
-                email_log.error_message = str(e)
-                email_log.failed_at = datetime.utcnow()
-        
-        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-        if campaign:
-            campaign.failed_count += len(email_batch)
-            campaign.pending_count = max(0, campaign.pending_count - len(email_batch))
-        
-        db.commit()
-        raise
+        # What the ledger has as sent went out: record it as sent, and fail the rest
+        # of this task's emails (their claims are released for a later retry)
+        sent = set(sent_ids(campaign_id, [log_id for log_id in owned if log_id is not None]))
+        sent_count, failed_count = _record_batch(db, campaign_id, sender_data, [{
+            'email_log_id': log_id,
+            'success': log_id in sent,
+            'message_id': None,
+            'error': None if log_id in sent else e
+        } for log_id in owned])
+        # Not re-raised: the sender's next chunk in its chain still runs
+        return {"sent": sent_count, "failed": failed_count, "error": str(e)}
     
     finally:
+        if quota is not None and not quota.closed:
+            quota.settle(_sent_here(results))
+        concurrency.release()
         db.close()
 
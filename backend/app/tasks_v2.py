@@ -4,15 +4,44 @@ Implements the full V2 architecture with preparation phase and instant sending.
 """
 
 from app.celery_app import celery_app
+from app.config import settings
 from app.database import SessionLocal
-from app.models import Campaign, EmailLog, WorkspaceUser, ServiceAccount, CampaignStatus, EmailStatus
+from app.models import Campaign, CampaignSender, EmailLog, WorkspaceUser, ServiceAccount, CampaignStatus, EmailStatus
 from app.google_api import GoogleWorkspaceService, substitute_variables, process_custom_header_tags
 from app.encryption import encryption_service
+from app.structured_logging import log_event
+from app.metrics import EMAILS_TOTAL, SENDER_BATCH_SECONDS, SEND_POOL_QUEUE_DEPTH
+from app.timings import StageClock, stage_timer
+from app.quota_ledger import reserve_for_sender
+from app.concurrency import AdaptiveConcurrency, SENDER_MAX_CONCURRENCY, timed_call
+from app.circuit_breaker import SenderBreaker, OPEN, PROBE, next_probe_at
+from app.services.sender_assignment import (
+    build_assignment_plan, apply_assignment_plan, save_assignment_plan, get_assignment_plan,
+    due_deferred_campaigns, defer_campaign, undefer_campaign, next_quota_window
+)
+from app.services.campaign_logs import log_writer, get_campaign_events_channel
+from app.crud.campaign_recipients import (
+    count_campaign_recipients, get_unassigned_recipients, get_recipient_variables, READ_CHUNK_SIZE
+)
+from app.services.campaign_scheduler import (
+    queue_for_campaign, next_send_time, in_send_window, schedule_campaign, unschedule_campaign,
+    due_scheduled_campaigns
+)
+from app.services.send_ledger import SENT, BUSY, CLAIMED, claim_sends, mark_sent, release_claims, sent_ids
+from app.services.send_checkpoints import (
+    SenderCheckpoint, get_checkpoints, stale_checkpoints, drop_checkpoints
+)
+from app.send_errors import SendError, SENDER, RETRYABLE, classify_send_error, is_throttle, is_permanent_failure
+from app.services.send_retries import (
+    get_campaign_retry_key, can_retry, schedule_retries, defer_tasks, promote_due_retries, pending_retries,
+    next_retry_due, MAX_SEND_ATTEMPTS
+)
 from datetime import datetime
 import logging
 import json
 import redis
-from typing import List, Dict
+from sqlalchemy import func, select
+from typing import List, Dict, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import uuid
@@ -20,7 +49,34 @@ import uuid
 logger = logging.getLogger(__name__)
 
 # Redis connection
-redis_client = redis.from_url("redis://redis:6379/0", decode_responses=True)
+redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+# Sample the sender thread pool backlog every N collected results
+POOL_DEPTH_SAMPLE_EVERY = 50
+# Most parallel sends per sender (the adaptive window never exceeds it)
+SENDER_MAX_THREADS = SENDER_MAX_CONCURRENCY
+# Deferred campaigns that are busy when their window opens are retried after this
+DEFERRED_RETRY_SECONDS = 300
+# A sender worker reserves quota for and pulls from the shared pool as many emails
+# as its concurrency window sends in about this long at the sender's observed latency
+SENDER_CHUNK_TARGET_SECONDS = 10
+SENDER_CHUNK_MIN = 1
+SENDER_CHUNK_MAX = 500
+# A sender worker run (one Celery task) starts no chunk that would end past this:
+# it chains the sender's next run onto the back of its queue, so work queued behind
+# it (other campaigns) gets a turn. The threads pool enforces no Celery time limits;
+# this is what keeps a run short
+SENDER_SLICE_SECONDS = 30
+# Sends another worker had claimed come back to the pool after this long: sent by
+# then, they are recorded as such; claimed by a dead worker, they go out once its
+# claim expires
+BUSY_RECHECK_SECONDS = 30
+# Expiry of the per-run Redis keys (pool, senders, worker count)
+CAMPAIGN_RUN_TTL_SECONDS = 86400
+# Workers restarted this many times in a row for open circuit breakers while no
+# email left the pool (cooldowns double up to MAX_OPEN_SECONDS: about 1h in all)
+# pause the campaign instead of waiting for the next probe
+MAX_BREAKER_WAIT_ROUNDS = 6
 
 
 def get_campaign_redis_key(campaign_id: int) -> str:
@@ -28,24 +84,60 @@ def get_campaign_redis_key(campaign_id: int) -> str:
     return f"campaign:{campaign_id}:tasks"
 
 
+def get_campaign_pool_key(campaign_id: int) -> str:
+    """Get Redis key for the campaign's shared pool of pre-rendered tasks"""
+    return f"campaign:{campaign_id}:pool"
+
+
+def get_campaign_senders_key(campaign_id: int) -> str:
+    """Get Redis key for the senders working a campaign (user_email -> sender JSON)"""
+    return f"campaign:{campaign_id}:senders"
+
+
+def get_campaign_workers_key(campaign_id: int) -> str:
+    """Get Redis key for the number of sender workers still running for a campaign"""
+    return f"campaign:{campaign_id}:workers"
+
+
+def get_campaign_breaker_wait_key(campaign_id: int) -> str:
+    """Get Redis key for the campaign's waits on open circuit breakers (rounds, pool length)"""
+    return f"campaign:{campaign_id}:breaker_wait"
+
+
 def get_campaign_progress_key(campaign_id: int) -> str:
     """Get Redis key for campaign progress tracking"""
     return f"campaign:{campaign_id}:progress"
 
-def get_campaign_logs_key(campaign_id: int) -> str:
-    """Get Redis key for campaign live logs list"""
-    return f"campaign:{campaign_id}:logs"
-
 def append_campaign_log(campaign_id: int, message: str) -> None:
-    """Append a timestamped log line to Redis list for live viewing."""
+    """Queue a log line for the campaign's live log (buffered, coalesced and flushed in the background)."""
+    log_writer.append(campaign_id, message)
+
+def update_campaign_progress(campaign_id: int, sent: int = 0, failed: int = 0, pending: int = 0, **fields) -> None:
+    """Increment the progress hash, set any extra fields (status, timestamps) and
+    publish the resulting snapshot to live viewers."""
     try:
-        from datetime import datetime
-        entry = {"ts": datetime.utcnow().isoformat() + "Z", "message": message}
-        redis_client.rpush(get_campaign_logs_key(campaign_id), json.dumps(entry))
-        # keep only last 5000 entries
-        redis_client.ltrim(get_campaign_logs_key(campaign_id), -5000, -1)
-    except Exception:
-        pass
+        progress_key = get_campaign_progress_key(campaign_id)
+        pipe = redis_client.pipeline()
+        if sent:
+            pipe.hincrby(progress_key, 'sent', sent)
+        if failed:
+            pipe.hincrby(progress_key, 'failed', failed)
+        if pending:
+            pipe.hincrby(progress_key, 'pending', pending)
+        if fields:
+            pipe.hset(progress_key, mapping={k: str(v) if v is not None else '' for k, v in fields.items()})
+        pipe.hgetall(progress_key)
+        progress = pipe.execute()[-1]
+        redis_client.publish(
+            get_campaign_events_channel(campaign_id),
+            json.dumps({"type": "progress", "progress": progress})
+        )
+    except Exception as e:
+        logger.warning(f"Could not update live progress for campaign {campaign_id}: {e}")
+
+def publish_campaign_status(campaign_id: int, status, **fields) -> None:
+    """Record a campaign status change in the progress hash for live viewers."""
+    update_campaign_progress(campaign_id, status=getattr(status, 'value', status), **fields)
 
 
 def _is_admin_email(user_email: str, service_account_admin_email: str | None, user_name: str = None) -> bool:
@@ -94,14 +186,123 @@ def _is_admin_email(user_email: str, service_account_admin_email: str | None, us
     return False
 
 
+def _build_sender_pool(db, campaign, request_id: str):
+    """Active, non-admin users of the campaign's sender accounts with decrypted
+    credentials and daily limits. Returns (sender_pool, sender_accounts)."""
+    campaign_id = campaign.id
+    
+    # Get sender accounts
+    sender_accounts = campaign.sender_accounts
+    logger.info(f"[{request_id}] 🔍 Sender accounts found: {len(sender_accounts) if sender_accounts else 0}")
+    if not sender_accounts:
+        # Try to get sender accounts from CampaignSender table
+        campaign_senders = db.query(CampaignSender).filter(CampaignSender.campaign_id == campaign_id).all()
+        logger.info(f"[{request_id}] 🔍 CampaignSender records: {len(campaign_senders)}")
+        if campaign_senders:
+            sender_accounts = [db.query(ServiceAccount).filter(ServiceAccount.id == cs.service_account_id).first() for cs in campaign_senders]
+            sender_accounts = [sa for sa in sender_accounts if sa]  # Filter out None values
+            logger.info(f"[{request_id}] 🔍 Sender accounts from CampaignSender: {len(sender_accounts)}")
+    
+    if not sender_accounts:
+        raise Exception("No sender accounts configured")
+    
+    # Build sender pool
+    sender_pool = []
+    logger.info(f"[{request_id}] 🔍 Building sender pool from {len(sender_accounts)} accounts")
+    
+    for account in sender_accounts:
+        logger.info(f"[{request_id}] 🔍 Processing account: {account.name} (ID: {account.id})")
+        users = db.query(WorkspaceUser).filter(
+            WorkspaceUser.service_account_id == account.id,
+            WorkspaceUser.is_active == True
+        ).all()
+        logger.info(f"[{request_id}] 🔍 Found {len(users)} active users for account {account.name}")
+        
+        # Decrypt once during preparation
+        try:
+            decrypted_json = encryption_service.decrypt(account.encrypted_json)
+            logger.info(f"[{request_id}] 🔍 Successfully decrypted JSON for account {account.name}")
+        except Exception as e:
+            logger.error(f"[{request_id}] ❌ Failed to decrypt JSON for account {account.name}: {e}")
+            continue
+        
+        for user in users:
+            # Skip admin addresses (must not be used as senders)
+            if _is_admin_email(user.email, getattr(account, 'admin_email', None), user.full_name):
+                continue
+            sender_pool.append({
+                'service_account_id': account.id,
+                'service_account_json': decrypted_json,
+                'user_email': user.email,
+                'user_id': user.id,
+                # Daily limits for the quota ledger reservation in execute_sender_batch_v2
+                'daily_limit': account.daily_limit,
+                'quota_limit': user.quota_limit
+            })
+    
+    return sender_pool, sender_accounts
+
+
+def _to_str(val) -> str:
+    """Strong string coercion for rendered task fields"""
+    if val is None:
+        return ""
+    if isinstance(val, str):
+        return val
+    if isinstance(val, list):
+        return "\n".join([str(x) for x in val])
+    try:
+        return json.dumps(val)
+    except Exception:
+        return str(val)
+
+
+def _render_task(campaign: Campaign, email_log_id: int, recipient_email: str, variables: Dict, request_id: str) -> Dict:
+    """Pre-render one recipient's send task (subject and bodies substituted)."""
+    final_subject = _to_str(substitute_variables(campaign.subject, variables))
+    final_body_html = _to_str(substitute_variables(campaign.body_html, variables)) if campaign.body_html is not None else ""
+    final_body_plain = _to_str(substitute_variables(campaign.body_plain, variables)) if campaign.body_plain is not None else ""
+    
+    # Check if we should use custom headers
+    custom_header_text = None
+    if campaign.header_type == '100_percent' and campaign.custom_header:
+        custom_header_text = campaign.custom_header
+    log_event(
+        logger, logging.DEBUG, "prepare.task_rendered", sample=0.01,
+        request_id=request_id, campaign_id=campaign.id,
+        body_html_length=len(final_body_html), body_plain_length=len(final_body_plain),
+        header_type=campaign.header_type, uses_custom_header=custom_header_text is not None
+    )
+    
+    task = {
+        'email_log_id': email_log_id,
+        'recipient_email': recipient_email,
+        'subject': final_subject,
+        'body_html': final_body_html,  # CRITICAL: Always include HTML body
+        'body_plain': final_body_plain,  # CRITICAL: Always include plain body
+        'from_name': campaign.from_name,
+        'custom_headers': campaign.custom_headers or {},
+        'attachments': campaign.attachments,
+        'custom_header_text': custom_header_text,
+    }
+    
+    # Validate task has body content
+    if not task['body_html'] and not task['body_plain']:
+        log_event(logger, logging.WARNING, "prepare.task_without_body", rate=1, request_id=request_id, campaign_id=campaign.id)
+    elif not task['body_html']:
+        log_event(logger, logging.WARNING, "prepare.task_without_html", rate=1, request_id=request_id, campaign_id=campaign.id)
+    return task
+
+
 @celery_app.task(name='app.tasks_v2.prepare_campaign_redis')
-def prepare_campaign_redis(campaign_id: int):
+def prepare_campaign_redis(campaign_id: int, retry_failed: bool = False):
     """
     V2 Preparation: Pre-generate all email tasks and store in Redis
     This makes the later resume instant - no generation time.
     
     Args:
         campaign_id: ID of campaign to prepare
+        retry_failed: Send failed emails again, except those Gmail rejected for good
     """
     db = SessionLocal()
     request_id = str(uuid.uuid4())[:8]
@@ -110,6 +311,7 @@ def prepare_campaign_redis(campaign_id: int):
         logger.info(f"[{request_id}] 🎯 V2 PREPARE START: Campaign {campaign_id}")
         append_campaign_log(campaign_id, f"🎯 PREPARE START - campaign {campaign_id}")
         start_time = time.time()
+        clock = StageClock(campaign_id)
         
         # Get campaign
         campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
@@ -125,103 +327,42 @@ def prepare_campaign_redis(campaign_id: int):
         campaign.status = CampaignStatus.PREPARING
         campaign.prepared_at = datetime.utcnow()
         db.commit()
+        clock.lap("prepare.load_campaign")
         
-        # Get sender accounts
-        sender_accounts = campaign.sender_accounts
-        logger.info(f"[{request_id}] 🔍 Sender accounts found: {len(sender_accounts) if sender_accounts else 0}")
-        if not sender_accounts:
-            # Try to get sender accounts from CampaignSender table
-            campaign_senders = db.query(CampaignSender).filter(CampaignSender.campaign_id == campaign_id).all()
-            logger.info(f"[{request_id}] 🔍 CampaignSender records: {len(campaign_senders)}")
-            if campaign_senders:
-                sender_accounts = [db.query(ServiceAccount).filter(ServiceAccount.id == cs.service_account_id).first() for cs in campaign_senders]
-                sender_accounts = [sa for sa in sender_accounts if sa]  # Filter out None values
-                logger.info(f"[{request_id}] 🔍 Sender accounts from CampaignSender: {len(sender_accounts)}")
-        
-        if not sender_accounts:
-            raise Exception("No sender accounts configured")
-        
-        # Build sender pool
-        sender_pool = []
-        logger.info(f"[{request_id}] 🔍 Building sender pool from {len(sender_accounts)} accounts")
-        
-        for account in sender_accounts:
-            logger.info(f"[{request_id}] 🔍 Processing account: {account.name} (ID: {account.id})")
-            users = db.query(WorkspaceUser).filter(
-                WorkspaceUser.service_account_id == account.id,
-                WorkspaceUser.is_active == True
-            ).all()
-            logger.info(f"[{request_id}] 🔍 Found {len(users)} active users for account {account.name}")
-            
-            # Decrypt once during preparation
-            try:
-                decrypted_json = encryption_service.decrypt(account.encrypted_json)
-                logger.info(f"[{request_id}] 🔍 Successfully decrypted JSON for account {account.name}")
-            except Exception as e:
-                logger.error(f"[{request_id}] ❌ Failed to decrypt JSON for account {account.name}: {e}")
-                continue
-            
-            for user in users:
-                # Skip admin addresses (must not be used as senders)
-                if _is_admin_email(user.email, getattr(account, 'admin_email', None), user.full_name):
-                    continue
-                sender_pool.append({
-                    'service_account_id': account.id,
-                    'service_account_json': decrypted_json,
-                    'user_email': user.email,
-                    'user_id': user.id
-                })
+        sender_pool, sender_accounts = _build_sender_pool(db, campaign, request_id)
         
         logger.info(f"[{request_id}] 🔍 Total sender pool size: {len(sender_pool)}")
         if not sender_pool:
             raise Exception("No active users available")
         
         logger.info(f"[{request_id}] 👥 Sender pool: {len(sender_pool)} users across {len(sender_accounts)} accounts")
+        clock.lap("prepare.sender_pool")
         
         # Create email logs if they don't exist
         existing_logs_count = db.query(EmailLog).filter(EmailLog.campaign_id == campaign_id).count()
+        total_recipients = count_campaign_recipients(db, campaign_id)
         
+        plan = None
         if existing_logs_count == 0:
-            logger.info(f"[{request_id}] 📝 Creating {len(campaign.recipients)} email logs with EQUAL distribution...")
-            
-            # EQUAL DISTRIBUTION: Calculate exact emails per sender
-            total_recipients = len(campaign.recipients)
-            total_senders = len(sender_pool)
-            emails_per_sender = total_recipients // total_senders
-            extra_emails = total_recipients % total_senders
+            logger.info(f"[{request_id}] 📝 Creating {total_recipients} email logs with quota-aware distribution...")
             
-            logger.info(f"[{request_id}] 📊 EQUAL DISTRIBUTION: {total_recipients} emails ÷ {total_senders} senders = {emails_per_sender} emails per sender (+ {extra_emails} extra)")
+            # Shares weighted by remaining daily capacity and recent success rate;
+            # what no sender can take today is deferred to the next quota window
+            plan = build_assignment_plan(db, campaign_id, sender_pool, total_recipients, SENDER_MAX_THREADS)
+            logger.info(f"[{request_id}] 📊 ASSIGNMENT PLAN: {plan['assigned']} of {total_recipients} emails across {sum(1 for s in plan['senders'] if s['assigned'])} senders, {plan['deferred']} deferred, ~{plan['projected_seconds']}s")
             
-            # Distribute emails equally
-            sender_index = 0
-            emails_for_current_sender = emails_per_sender + (1 if sender_index < extra_emails else 0)
-            emails_assigned = 0
-            
-            for idx, recipient in enumerate(campaign.recipients):
-                # Check if we need to move to next sender
-                if emails_assigned >= emails_for_current_sender:
-                    sender_index += 1
-                    emails_for_current_sender = emails_per_sender + (1 if sender_index < extra_emails else 0)
-                    emails_assigned = 0
-                
-                sender = sender_pool[sender_index]
-                emails_assigned += 1
-                
-                db.add(EmailLog(
-                    campaign_id=campaign_id,
-                    recipient_email=recipient.get('email'),
-                    recipient_name=recipient.get('variables', {}).get('name', ''),
-                    sender_email=sender['user_email'],
-                    service_account_id=sender['service_account_id'],
-                    subject=campaign.subject,
-                    status=EmailStatus.PENDING,
-                ))
+            # Each sender gets a contiguous ordinal block; logs are created server-side
+            apply_assignment_plan(db, campaign_id, plan, sender_pool, campaign.subject)
             db.commit()
-            logger.info(f"[{request_id}] ✅ Email logs created with EQUAL distribution")
+            save_assignment_plan(campaign_id, plan)
+            if plan['deferred']:
+                append_campaign_log(campaign_id, f"⏳ {plan['deferred']} emails exceed today's sender quotas; deferred until {plan['deferred_until']}")
+            logger.info(f"[{request_id}] ✅ Email logs created with quota-aware distribution")
+        clock.lap("prepare.assign_senders")
         
         # Basic validation before generating tasks
         # 1) Recipients must exist
-        if not campaign.recipients or len(campaign.recipients) == 0:
+        if total_recipients == 0:
             append_campaign_log(campaign_id, "❌ No recipients provided")
             raise Exception("No recipients provided")
 
@@ -239,140 +380,131 @@ def prepare_campaign_redis(campaign_id: int):
                 append_campaign_log(campaign_id, "❌ From name is required when not using 100% Header")
                 raise Exception("From name is required when not using 100% Header")
 
-        # Fetch all email logs
-        email_logs = db.query(EmailLog).filter(
-            EmailLog.campaign_id == campaign_id,
-            EmailLog.status.in_([EmailStatus.PENDING, EmailStatus.FAILED])
-        ).all()
+        # Retrying on request: failed emails go back to PENDING (committed with the new
+        # counts below), so the workers record them like any other pending email.
+        # Permanent failures (invalid recipient, rejected message) stay FAILED.
+        if retry_failed:
+            failed_logs = db.execute(
+                select(EmailLog.id, EmailLog.error_message)
+                .where(EmailLog.campaign_id == campaign_id, EmailLog.status == EmailStatus.FAILED)
+                .order_by(EmailLog.id)
+            ).all()
+            retry_ids = [row.id for row in failed_logs if not is_permanent_failure(row.error_message)]
+            for start in range(0, len(retry_ids), READ_CHUNK_SIZE):
+                db.query(EmailLog).filter(EmailLog.id.in_(retry_ids[start:start + READ_CHUNK_SIZE])).update({
+                    EmailLog.status: EmailStatus.PENDING,
+                    EmailLog.error_message: None
+                }, synchronize_session=False)
+            logger.info(f"[{request_id}] 🔁 {len(retry_ids)} failed emails queued again, {len(failed_logs) - len(retry_ids)} permanent failures kept")
+            append_campaign_log(campaign_id, f"🔁 Retrying {len(retry_ids)} failed emails ({len(failed_logs) - len(retry_ids)} permanent failures kept)")
+        
+        # Stream pending email logs in chunks instead of loading them all
+        email_logs_stmt = (
+            select(EmailLog.id, EmailLog.recipient_email, EmailLog.sender_email)
+            .where(
+                EmailLog.campaign_id == campaign_id,
+                EmailLog.status == EmailStatus.PENDING
+            )
+            .order_by(EmailLog.id)
+            .execution_options(yield_per=READ_CHUNK_SIZE)
+        )
         
-        logger.info(f"[{request_id}] 📦 Preparing {len(email_logs)} tasks for Redis...")
+        logger.info(f"[{request_id}] 📦 Preparing tasks for Redis...")
         
-        # Pre-generate all tasks and push to Redis
+        # Pre-generate all tasks and push each chunk to Redis as soon as it is rendered,
+        # so only one chunk of tasks is ever held in memory
         redis_key = get_campaign_redis_key(campaign_id)
-        redis_client.delete(redis_key)  # Clear any old tasks
+        # Clear any old tasks; the pool and retries are rebuilt from the same PENDING logs
+        redis_client.delete(redis_key, get_campaign_pool_key(campaign_id), get_campaign_retry_key(campaign_id))
         
         # Check if test_after is configured
         test_after_enabled = campaign.test_after_email and campaign.test_after_count > 0
         if test_after_enabled:
             logger.info(f"[{request_id}] 🧪 Test After enabled: {campaign.test_after_count} emails -> {campaign.test_after_email}")
         
-        # Group tasks by sender
-        sender_batches = {}
+        # Per-sender task counts (the tasks themselves go straight to Redis)
+        sender_counts = {}
+        senders_by_email = {s['user_email']: s for s in sender_pool}
         task_counter = 0  # Track position for test_after
+        task_count = 0
         
-        for email_log in email_logs:
-            sender_email = email_log.sender_email
-            
-            if sender_email not in sender_batches:
-                # Find sender data
-                sender = next((s for s in sender_pool if s['user_email'] == sender_email), None)
+        for email_logs in db.execute(email_logs_stmt).partitions():
+            variables_by_email = get_recipient_variables(db, campaign_id, [log.recipient_email for log in email_logs])
+            clock.lap("prepare.db_fetch", rows=len(email_logs))
+            rendered = []
+            for email_log in email_logs:
+                sender_email = email_log.sender_email
+                sender = senders_by_email.get(sender_email)
                 if not sender:
                     logger.warning(f"[{request_id}] ⚠️ No sender found for {sender_email}, using first available")
-                    sender = sender_pool[0]
-                
-                sender_batches[sender_email] = {
-                    'sender': sender,
-                    'tasks': []
-                }
+                    sender = senders_by_email[sender_email] = sender_pool[0]
             
-            # Get recipient variables
-            recipient_data = next(
-                (r for r in campaign.recipients if r['email'] == email_log.recipient_email),
-                {'email': email_log.recipient_email, 'variables': {}}
-            )
-            
-            # Pre-render subject and body with strong string coercion
-            def _to_str(val):
-                if val is None:
-                    return ""
-                if isinstance(val, str):
-                    return val
-                if isinstance(val, list):
-                    return "\n".join([str(x) for x in val])
-                try:
-                    import json as _json
-                    return _json.dumps(val)
-                except Exception:
-                    return str(val)
-
-            variables = recipient_data.get('variables', {})
-            final_subject = _to_str(substitute_variables(campaign.subject, variables))
-            final_body_html = _to_str(substitute_variables(campaign.body_html, variables)) if campaign.body_html is not None else ""
-            final_body_plain = _to_str(substitute_variables(campaign.body_plain, variables)) if campaign.body_plain is not None else ""
-            
-            # CRITICAL: Log body content to ensure it's not lost
-            logger.info(f"[{request_id}] 📝 Task body_html length: {len(final_body_html)}, body_plain length: {len(final_body_plain)}")
-            if campaign.header_type == '100_percent':
-                logger.info(f"[{request_id}] 🔍 100% Header mode - body_html: {final_body_html[:100] if final_body_html else 'EMPTY'}...")
-            
-            # Check if we should use custom headers
-            custom_header_text = None
-            logger.info(f"Campaign {campaign_id} - header_type: {campaign.header_type}, custom_header: {campaign.custom_header[:100] if campaign.custom_header else 'None'}...")
-            if campaign.header_type == '100_percent' and campaign.custom_header:
-                custom_header_text = campaign.custom_header
-                logger.info(f"Using custom header for campaign {campaign_id}: {custom_header_text[:100]}...")
-            else:
-                logger.info(f"Not using custom headers - header_type: {campaign.header_type}, has_custom_header: {bool(campaign.custom_header)}")
-            
-            task = {
-                'email_log_id': email_log.id,
-                'recipient_email': email_log.recipient_email,
-                'subject': _to_str(final_subject),
-                'body_html': _to_str(final_body_html),  # CRITICAL: Always include HTML body
-                'body_plain': _to_str(final_body_plain),  # CRITICAL: Always include plain body
-                'from_name': campaign.from_name,
-                'custom_headers': campaign.custom_headers or {},
-                'attachments': campaign.attachments,
-                'custom_header_text': custom_header_text,
-            }
-            
-            # Validate task has body content
-            if not task['body_html'] and not task['body_plain']:
-                logger.warning(f"[{request_id}] ⚠️ WARNING: Task has NO body content! body_html='{task['body_html']}', body_plain='{task['body_plain']}'")
-            elif not task['body_html']:
-                logger.warning(f"[{request_id}] ⚠️ WARNING: Task has NO HTML body! Only plain text available.")
+                task = _render_task(
+                    campaign, email_log.id, email_log.recipient_email,
+                    variables_by_email.get(email_log.recipient_email, {}), request_id
+                )
+                final_subject, final_body_html, final_body_plain = task['subject'], task['body_html'], task['body_plain']
             
-            sender_batches[sender_email]['tasks'].append(task)
-            task_counter += 1
+                rendered.append(json.dumps(task))
+                sender_counts[sender['user_email']] = sender_counts.get(sender['user_email'], 0) + 1
+                task_counter += 1
             
-            # Add test_after email if needed (only after the specified count)
-            if test_after_enabled and task_counter > 0 and task_counter % campaign.test_after_count == 0:
-                test_task = {
-                    'email_log_id': None,  # Special test task
-                    'recipient_email': campaign.test_after_email,
-                    'subject': _to_str(f"[TEST AFTER {task_counter}] {final_subject}"),
-                    'body_html': _to_str(f"<p><strong>Test After Email #{task_counter}</strong></p><p>This is a test email sent after {task_counter} campaign emails.</p>{final_body_html}"),
-                    'body_plain': _to_str(f"Test After Email #{task_counter}\n\nThis is a test email sent after {task_counter} campaign emails.\n\n{final_body_plain}"),
-                    'from_name': campaign.from_name,
-                    'custom_headers': campaign.custom_headers or {},
-                    'attachments': campaign.attachments,
-                    'is_test_after': True,
-                    'test_after_count': task_counter
-                }
-                sender_batches[sender_email]['tasks'].append(test_task)
-                logger.info(f"[{request_id}] 🧪 Added test_after email at position {task_counter}")
+                # Add test_after email if needed (only after the specified count)
+                if test_after_enabled and task_counter > 0 and task_counter % campaign.test_after_count == 0:
+                    test_task = {
+                        'email_log_id': None,  # Special test task
+                        'recipient_email': campaign.test_after_email,
+                        'subject': _to_str(f"[TEST AFTER {task_counter}] {final_subject}"),
+                        'body_html': _to_str(f"<p><strong>Test After Email #{task_counter}</strong></p><p>This is a test email sent after {task_counter} campaign emails.</p>{final_body_html}"),
+                        'body_plain': _to_str(f"Test After Email #{task_counter}\n\nThis is a test email sent after {task_counter} campaign emails.\n\n{final_body_plain}"),
+                        'from_name': campaign.from_name,
+                        'custom_headers': campaign.custom_headers or {},
+                        'attachments': campaign.attachments,
+                        'is_test_after': True,
+                        'test_after_count': task_counter
+                    }
+                    rendered.append(json.dumps(test_task))
+                    logger.info(f"[{request_id}] 🧪 Added test_after email at position {task_counter}")
+            clock.lap("prepare.render", rows=len(email_logs))
+            if rendered:
+                redis_client.rpush(redis_key, *rendered)
+                task_count += len(rendered)
+            clock.lap("prepare.redis_push", rows=len(rendered))
         
-        # Push batches to Redis
-        task_count = 0
-        for sender_email, batch_data in sender_batches.items():
-            redis_task = {
-                'campaign_id': campaign_id,
-                'sender': batch_data['sender'],
-                'tasks': batch_data['tasks']
-            }
-            redis_client.rpush(redis_key, json.dumps(redis_task))
-            task_count += len(batch_data['tasks'])
-        
-        logger.info(f"[{request_id}] ✅ Pushed {len(sender_batches)} sender batches ({task_count} tasks) to Redis")
-        append_campaign_log(campaign_id, f"✅ Prepared {task_count} tasks in {len(sender_batches)} batches")
+        # The senders that got tasks pull them from the shared pool on resume
+        senders_key = get_campaign_senders_key(campaign_id)
+        if sender_counts:
+            pipe = redis_client.pipeline()
+            pipe.hset(senders_key, mapping={email: json.dumps(senders_by_email[email]) for email in sender_counts})
+            pipe.expire(senders_key, CAMPAIGN_RUN_TTL_SECONDS)
+            pipe.execute()
+        
+        for sender_email, count in sender_counts.items():
+            logger.info(f"[{request_id}]    👤 {sender_email}: {count} tasks")
+        logger.info(f"[{request_id}] ✅ Pushed {task_count} tasks for {len(sender_counts)} senders to Redis")
+        append_campaign_log(campaign_id, f"✅ Prepared {task_count} tasks for {len(sender_counts)} senders")
         
         # Initialize progress tracker
         progress_key = get_campaign_progress_key(campaign_id)
+        # Re-preparing (e.g. releasing deferred recipients) keeps what was already sent
+        # and what failed without being retried
+        already_sent = 0
+        already_failed = 0
+        if existing_logs_count:
+            already_sent, already_failed = db.query(
+                func.count(EmailLog.id).filter(EmailLog.status == EmailStatus.SENT),
+                func.count(EmailLog.id).filter(EmailLog.status == EmailStatus.FAILED)
+            ).filter(EmailLog.campaign_id == campaign_id).one()
+        plan = plan or get_assignment_plan(campaign_id)
+        deferred = plan['deferred'] if plan else 0
         redis_client.hset(progress_key, mapping={
-            'total': task_count,
-            'sent': 0,
-            'failed': 0,
+            'total': task_count + already_sent + already_failed,
+            'sent': already_sent,
+            'failed': already_failed,
             'pending': task_count,
+            'deferred': deferred,
+            'deferred_until': plan['deferred_until'] if deferred else '',
+            'retrying': 0,
             'test_after_enabled': '1' if test_after_enabled else '0',
             'test_after_email': campaign.test_after_email or '',
             'test_after_count': campaign.test_after_count or 0
@@ -382,11 +514,13 @@ def prepare_campaign_redis(campaign_id: int):
         # Mark campaign as READY
         campaign.status = CampaignStatus.READY
         campaign.pending_count = task_count
-        campaign.sent_count = 0
-        campaign.failed_count = 0
+        campaign.sent_count = already_sent
+        campaign.failed_count = already_failed
         # Ensure total_recipients is set correctly
-        campaign.total_recipients = len(campaign.recipients)
+        campaign.total_recipients = total_recipients
         db.commit()
+        publish_campaign_status(campaign_id, CampaignStatus.READY)
+        clock.lap("prepare.finalize")
         
         elapsed = time.time() - start_time
         logger.info(f"[{request_id}] 🎉 V2 PREPARE COMPLETE in {elapsed:.2f}s - Campaign {campaign_id} READY")
@@ -396,22 +530,39 @@ def prepare_campaign_redis(campaign_id: int):
             'campaign_id': campaign_id,
             'status': 'ready',
             'total_tasks': task_count,
-            'sender_count': len(sender_batches),
+            'sender_count': len(sender_counts),
             'preparation_time': elapsed
         }
         
     except Exception as e:
         logger.error(f"[{request_id}] ❌ Preparation failed: {e}")
+        db.rollback()
         campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
         if campaign:
             campaign.status = CampaignStatus.FAILED
             db.commit()
+            publish_campaign_status(campaign_id, CampaignStatus.FAILED)
         raise
     
     finally:
         db.close()
 
 
+def _dispatch_sender_workers(campaign_id: int, senders: List[Dict], request_id: str, countdown: float = None,
+                             queue: str = None) -> int:
+    """Start one run_sender_worker per sender on the campaign pool, on the campaign's
+    priority queue, optionally after `countdown` seconds. Returns the number of
+    workers started."""
+    from celery import group
+    workers_key = get_campaign_workers_key(campaign_id)
+    pipe = redis_client.pipeline()
+    pipe.incrby(workers_key, len(senders))
+    pipe.expire(workers_key, CAMPAIGN_RUN_TTL_SECONDS)
+    pipe.execute()
+    group(run_sender_worker.s(sender, campaign_id, request_id) for sender in senders).apply_async(countdown=countdown, queue=queue)
+    return len(senders)
+
+
 @celery_app.task(name='app.tasks_v2.resume_campaign_instant')
 def resume_campaign_instant(campaign_id: int):
     """
@@ -428,6 +579,7 @@ def resume_campaign_instant(campaign_id: int):
         logger.info(f"[{request_id}] ⚡ V2 RESUME START: Campaign {campaign_id}")
         append_campaign_log(campaign_id, "⚡ RESUME START")
         start_time = time.time()
+        clock = StageClock(campaign_id)
         
         # Get campaign
         campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
@@ -437,6 +589,20 @@ def resume_campaign_instant(campaign_id: int):
         if campaign.status not in [CampaignStatus.READY, CampaignStatus.PAUSED, CampaignStatus.SENDING]:
             raise Exception(f"Campaign must be READY, PAUSED, or SENDING. Current: {campaign.status}")
         
+        # Before its start-at time or outside its sending window: hand it to the scheduler
+        send_at = next_send_time(campaign)
+        if send_at:
+            schedule_campaign(campaign_id, send_at)
+            if campaign.status == CampaignStatus.SENDING:
+                campaign.status = CampaignStatus.PAUSED
+                campaign.paused_at = datetime.utcnow()
+                db.commit()
+                publish_campaign_status(campaign_id, CampaignStatus.PAUSED)
+            logger.info(f"[{request_id}] 🕘 Campaign {campaign_id} scheduled for {send_at.isoformat()}")
+            append_campaign_log(campaign_id, f"🕘 Scheduled: sending starts at {send_at.isoformat()}")
+            return {'campaign_id': campaign_id, 'status': 'scheduled', 'scheduled_for': send_at.isoformat()}
+        unschedule_campaign(campaign_id)
+        
         # If already SENDING, just continue with the existing process
         if campaign.status == CampaignStatus.SENDING:
             logger.info(f"[{request_id}] ⚠️ Campaign already SENDING, continuing with existing process...")
@@ -444,35 +610,67 @@ def resume_campaign_instant(campaign_id: int):
         campaign.status = CampaignStatus.SENDING
         campaign.started_at = datetime.utcnow()
         db.commit()
+        publish_campaign_status(campaign_id, CampaignStatus.SENDING, started_at=campaign.started_at.isoformat())
+        clock.lap("resume.load_campaign")
         
-        # Fetch all tasks from Redis
+        # Move the prepared tasks into the shared pool, a chunk at a time; senders pull
+        # from it as they have capacity, so one slow or failing sender no longer holds a
+        # fixed share
         redis_key = get_campaign_redis_key(campaign_id)
-        task_batches = []
+        pool_key = get_campaign_pool_key(campaign_id)
+        senders_key = get_campaign_senders_key(campaign_id)
+        moved = 0
         
         while True:
-            batch_json = redis_client.lpop(redis_key)
-            if not batch_json:
+            raw_tasks = redis_client.lpop(redis_key, READ_CHUNK_SIZE)
+            if not raw_tasks:
                 break
-            task_batches.append(json.loads(batch_json))
+            tasks = []
+            pipe = redis_client.pipeline()
+            for raw in raw_tasks:
+                entry = json.loads(raw)
+                if 'tasks' in entry:
+                    # A whole sender batch, prepared before tasks were pushed one by one
+                    tasks.extend(json.dumps(task) for task in entry['tasks'])
+                    pipe.hset(senders_key, entry['sender']['user_email'], json.dumps(entry['sender']))
+                else:
+                    tasks.append(raw)
+            if tasks:
+                pipe.rpush(pool_key, *tasks)
+            pipe.execute()
+            moved += len(tasks)
         
-        if not task_batches:
+        pipe = redis_client.pipeline()
+        pipe.expire(pool_key, CAMPAIGN_RUN_TTL_SECONDS)
+        pipe.expire(senders_key, CAMPAIGN_RUN_TTL_SECONDS)
+        pipe.llen(pool_key)
+        pipe.hvals(senders_key)
+        pool_size, sender_values = pipe.execute()[-2:]
+        
+        # After a crash (or lost Redis keys) the unsent remainder is rebuilt from the
+        # checkpoints and PENDING logs; after a plain pause there is nothing to rebuild
+        pool_size += recover_unsent(db, campaign, request_id)
+        db.refresh(campaign)
+        if campaign.status == CampaignStatus.COMPLETED:
+            publish_campaign_status(campaign_id, CampaignStatus.COMPLETED, completed_at=campaign.completed_at.isoformat())
+            return {'campaign_id': campaign_id, 'status': 'completed', 'total_time': time.time() - start_time}
+        if not pool_size and not pending_retries(campaign_id):
             raise Exception("No tasks found in Redis. Campaign may not be prepared.")
+        # Resuming after a pause: the pool still holds the unsent work
+        senders = [json.loads(value) for value in sender_values]
+        if not senders:
+            senders, _ = _build_sender_pool(db, campaign, request_id)
+        clock.lap("resume.redis_fetch", emails=moved)
         
-        logger.info(f"[{request_id}] 🚀 Launching {len(task_batches)} sender batches instantly...")
+        logger.info(f"[{request_id}] 🚀 Launching {len(senders)} sender workers on {pool_size} pooled tasks...")
         
         # Fan out to Celery workers - ALL AT ONCE
-        from celery import group
-        celery_tasks = [
-            execute_sender_batch_v2.s(batch_data, campaign_id, request_id)
-            for batch_data in task_batches
-        ]
-        
-        job = group(celery_tasks)
-        result = job.apply_async()
+        worker_count = _dispatch_sender_workers(campaign_id, senders, request_id, queue=queue_for_campaign(campaign))
+        clock.lap("resume.dispatch", batches=worker_count)
         
         # Dispatch tasks and let them run asynchronously
-        logger.info(f"[{request_id}] ✅ All batches dispatched in {time.time() - start_time:.2f}s")
-        append_campaign_log(campaign_id, f"✅ Dispatched {len(celery_tasks)} sender batches")
+        logger.info(f"[{request_id}] ✅ All sender workers dispatched in {time.time() - start_time:.2f}s")
+        append_campaign_log(campaign_id, f"✅ Dispatched {worker_count} sender workers for {pool_size} emails")
         logger.info(f"[{request_id}] 🎉 V2 RESUME COMPLETE - Tasks dispatched asynchronously")
         
         # Note: We don't wait for completion here to avoid Celery anti-pattern
@@ -491,207 +689,650 @@ def resume_campaign_instant(campaign_id: int):
         if campaign:
             campaign.status = CampaignStatus.FAILED
             db.commit()
+            publish_campaign_status(campaign_id, CampaignStatus.FAILED)
         raise
     
     finally:
         db.close()
 
 
-@celery_app.task(name='app.tasks_v2.execute_sender_batch_v2')
-def execute_sender_batch_v2(batch_data: Dict, campaign_id: int, request_id: str):
+def recover_unsent(db, campaign: Campaign, request_id: str) -> int:
+    """
+    Put work lost with dead sender workers back into the campaign pool: the
+    in-flight chunks of stale checkpoints and, when the pool, the retry queue and
+    the checkpoints are all gone (crash, Redis restart or expiry), every PENDING
+    EmailLog. Sends the ledger has as made are recorded SENT; only the rest is
+    rendered again. Returns the number of tasks put back.
     """
-    Execute a single sender's batch using thread pool
-    With configurable 5ms micro-delay per email
+    campaign_id = campaign.id
+    pool_key = get_campaign_pool_key(campaign_id)
+    stale = stale_checkpoints(campaign_id)
+    lost_ids = sorted({log_id for state in stale.values() for log_id in state['in_flight']})
+    release_claims(campaign_id, lost_ids)
+    drop_checkpoints(campaign_id, list(stale))
+    rebuild = not redis_client.llen(pool_key) and not pending_retries(campaign_id) and not get_checkpoints(campaign_id)
+    if not rebuild and not lost_ids:
+        return 0
+    
+    stmt = select(EmailLog.id, EmailLog.recipient_email).where(
+        EmailLog.campaign_id == campaign_id,
+        EmailLog.status == EmailStatus.PENDING
+    )
+    if not rebuild:
+        stmt = stmt.where(EmailLog.id.in_(lost_ids))
+    stmt = stmt.order_by(EmailLog.id).execution_options(yield_per=READ_CHUNK_SIZE)
+    
+    requeued = 0
+    made = []
+    for email_logs in db.execute(stmt).partitions():
+        made_here = set(sent_ids(campaign_id, [log.id for log in email_logs]))
+        made.extend(made_here)
+        unsent = [log for log in email_logs if log.id not in made_here]
+        variables_by_email = get_recipient_variables(db, campaign_id, [log.recipient_email for log in unsent])
+        tasks = [
+            _render_task(campaign, log.id, log.recipient_email, variables_by_email.get(log.recipient_email, {}), request_id)
+            for log in unsent
+        ]
+        if tasks:
+            pipe = redis_client.pipeline()
+            pipe.rpush(pool_key, *[json.dumps(task) for task in tasks])
+            pipe.expire(pool_key, CAMPAIGN_RUN_TTL_SECONDS)
+            pipe.execute()
+            requeued += len(tasks)
+    
+    recorded = 0
+    if made:
+        now = datetime.utcnow()
+        recorded = db.query(EmailLog).filter(
+            EmailLog.id.in_(made),
+            EmailLog.status == EmailStatus.PENDING
+        ).update({EmailLog.status: EmailStatus.SENT, EmailLog.error_message: None, EmailLog.sent_at: now}, synchronize_session=False)
+        db.query(Campaign).filter(Campaign.id == campaign_id).update({
+            Campaign.sent_count: Campaign.sent_count + recorded,
+            Campaign.pending_count: func.greatest(Campaign.pending_count - recorded, 0),
+        }, synchronize_session=False)
+        db.query(Campaign).filter(
+            Campaign.id == campaign_id,
+            Campaign.status == CampaignStatus.SENDING,
+            Campaign.pending_count == 0
+        ).update({Campaign.status: CampaignStatus.COMPLETED, Campaign.completed_at: now}, synchronize_session=False)
+        db.commit()
+        update_campaign_progress(campaign_id, sent=recorded, pending=-recorded)
+    
+    if requeued or recorded:
+        source = "PENDING logs" if rebuild else f"{len(stale)} stale checkpoints"
+        logger.info(f"[{request_id}] ♻️ Campaign {campaign_id}: recovered {requeued} unsent tasks and {recorded} unrecorded sends from {source}")
+        append_campaign_log(campaign_id, f"♻️ Recovered {requeued} unsent emails ({recorded} already sent) from {source}")
+    return requeued
+
+
+@celery_app.task(name='app.tasks_v2.recover_stalled_campaigns')
+def recover_stalled_campaigns():
+    """
+    Celery beat task: for SENDING campaigns on the shared pool, put back the work
+    of dead sender workers (see recover_unsent) and start workers again when work
+    is left and none is counted as running.
+    """
+    db = SessionLocal()
+    recovered = []
+    try:
+        campaign_ids = [row.id for row in db.query(Campaign.id).filter(Campaign.status == CampaignStatus.SENDING)]
+        for campaign_id in campaign_ids:
+            request_id = str(uuid.uuid4())[:8]
+            senders_key = get_campaign_senders_key(campaign_id)
+            if not redis_client.exists(senders_key):
+                continue
+            try:
+                campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+                requeued = recover_unsent(db, campaign, request_id)
+                db.refresh(campaign)
+                workers = int(redis_client.get(get_campaign_workers_key(campaign_id)) or 0)
+                restarted = campaign.status == CampaignStatus.SENDING and workers <= 0 and bool(redis_client.llen(get_campaign_pool_key(campaign_id)))
+                if restarted:
+                    senders = [json.loads(value) for value in redis_client.hvals(senders_key)]
+                    redis_client.set(get_campaign_workers_key(campaign_id), 0, ex=CAMPAIGN_RUN_TTL_SECONDS)
+                    _dispatch_sender_workers(campaign_id, senders, request_id, queue=queue_for_campaign(campaign))
+                    append_campaign_log(campaign_id, f"♻️ No sender worker was running; restarted {len(senders)}")
+                if requeued or restarted:
+                    recovered.append(campaign_id)
+            except Exception as e:
+                logger.error(f"[{request_id}] ❌ Could not recover campaign {campaign_id}: {e}")
+                db.rollback()
+    finally:
+        db.close()
+    return {"recovered": recovered}
+
+
+@celery_app.task(name='app.tasks_v2.release_deferred_recipients')
+def release_deferred_recipients():
+    """
+    Celery beat task: plan the deferred part of campaigns whose quota window has
+    opened, then prepare it (and resume campaigns that had finished their
+    assigned part). Recipients that still do not fit stay deferred.
+    """
+    released = []
+    for campaign_id in due_deferred_campaigns():
+        db = SessionLocal()
+        request_id = str(uuid.uuid4())[:8]
+        try:
+            campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+            if not campaign or campaign.status in [CampaignStatus.CANCELED, CampaignStatus.FAILED, CampaignStatus.DRAFT]:
+                undefer_campaign(campaign_id)
+                continue
+            if campaign.status in [CampaignStatus.PREPARING, CampaignStatus.SENDING]:
+                # Let the current run finish; its logs would be rebuilt underneath it
+                defer_campaign(campaign_id, time.time() + DEFERRED_RETRY_SECONDS)
+                continue
+            
+            first_ordinal, deferred = get_unassigned_recipients(db, campaign_id)
+            if not deferred:
+                undefer_campaign(campaign_id)
+                continue
+            
+            sender_pool, _ = _build_sender_pool(db, campaign, request_id)
+            plan = build_assignment_plan(db, campaign_id, sender_pool, deferred, SENDER_MAX_THREADS)
+            if not plan['assigned']:
+                defer_campaign(campaign_id, next_quota_window().timestamp())
+                continue
+            apply_assignment_plan(db, campaign_id, plan, sender_pool, campaign.subject, start_ordinal=first_ordinal)
+            db.commit()
+            save_assignment_plan(campaign_id, plan)
+            
+            logger.info(f"[{request_id}] ⏳ Released {plan['assigned']} deferred emails for campaign {campaign_id} ({plan['deferred']} still deferred)")
+            append_campaign_log(campaign_id, f"⏳ Quota window opened: {plan['assigned']} deferred emails released, {plan['deferred']} still deferred")
+            if campaign.status == CampaignStatus.COMPLETED:
+                from celery import chain
+                chain(prepare_campaign_redis.si(campaign_id), resume_campaign_instant.si(campaign_id)).apply_async()
+            else:
+                prepare_campaign_redis.delay(campaign_id)
+            released.append(campaign_id)
+        except Exception as e:
+            logger.error(f"[{request_id}] ❌ Could not release deferred recipients of campaign {campaign_id}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+    return {"released": released}
+
+
+@celery_app.task(name='app.tasks_v2.start_scheduled_campaigns')
+def start_scheduled_campaigns():
+    """
+    Celery beat task: resume campaigns whose start-at time or sending window has
+    come. Campaigns that were paused, canceled or finished meanwhile are dropped
+    from the schedule.
+    """
+    started = []
+    for campaign_id in due_scheduled_campaigns():
+        db = SessionLocal()
+        try:
+            campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+            if not campaign or campaign.status not in [CampaignStatus.READY, CampaignStatus.PAUSED]:
+                unschedule_campaign(campaign_id)
+                continue
+            send_at = next_send_time(campaign)
+            if send_at:
+                schedule_campaign(campaign_id, send_at)
+                continue
+            unschedule_campaign(campaign_id)
+            campaign.status = CampaignStatus.SENDING
+            campaign.paused_at = None
+            campaign.started_at = campaign.started_at or datetime.utcnow()
+            db.commit()
+            publish_campaign_status(campaign_id, CampaignStatus.SENDING, started_at=campaign.started_at.isoformat())
+            append_campaign_log(campaign_id, "🕘 Scheduled start: resuming")
+            task = resume_campaign_instant.delay(campaign_id)
+            db.query(Campaign).filter(Campaign.id == campaign_id).update({Campaign.celery_task_id: str(task.id)}, synchronize_session=False)
+            db.commit()
+            started.append(campaign_id)
+        except Exception as e:
+            logger.error(f"❌ Could not start scheduled campaign {campaign_id}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+    return {"started": started}
+
+
+def _record_results(db, campaign_id: int, sender: Dict, results: List[Dict], request_id: str) -> Tuple[int, int, int, datetime | None]:
+    """
+    Write back one chunk: EmailLogs (pointed at the sender that actually handled
+    them), campaign counters as SQL increments so concurrent sender workers do not
+    overwrite each other, the sender's last_used, and COMPLETED once nothing is
+    pending. Logs that are no longer PENDING were recorded by an earlier delivery
+    and are not counted again. Returns (sent, failed, recorded, completed_at or None).
+    """
+    now = datetime.utcnow()
+    by_log_id = {result['email_log_id']: result for result in results if result['email_log_id'] is not None}
+    sent = 0
+    failed = 0
+    recorded = sum(1 for result in results if result['email_log_id'] is None)
+    
+    email_logs = db.query(EmailLog).filter(EmailLog.id.in_(list(by_log_id))).all() if by_log_id else []
+    for email_log in email_logs:
+        result = by_log_id[email_log.id]
+        if email_log.status != EmailStatus.PENDING:
+            continue
+        recorded += 1
+        email_log.sender_email = sender['user_email']
+        email_log.service_account_id = sender['service_account_id']
+        if result['success']:
+            email_log.status = EmailStatus.SENT
+            email_log.error_message = None
+            email_log.sent_at = now
+            sent += 1
+        else:
+            email_log.status = EmailStatus.FAILED
+            email_log.error_message = str(result['error'])
+            failed += 1
+    
+    # Handle test_after emails (no email_log_id)
+    for result in results:
+        if result['email_log_id'] is None:
+            if result['success']:
+                logger.info(f"[{request_id}] 🧪 Test After email sent successfully to {result['recipient_email']}")
+            else:
+                logger.warning(f"[{request_id}] 🧪 Test After email failed: {result['error']}")
+    
+    db.query(Campaign).filter(Campaign.id == campaign_id).update({
+        Campaign.sent_count: Campaign.sent_count + sent,
+        Campaign.failed_count: Campaign.failed_count + failed,
+        Campaign.pending_count: func.greatest(Campaign.pending_count - recorded, 0),
+    }, synchronize_session=False)
+    completed = db.query(Campaign).filter(
+        Campaign.id == campaign_id,
+        Campaign.status == CampaignStatus.SENDING,
+        Campaign.pending_count == 0
+    ).update({Campaign.status: CampaignStatus.COMPLETED, Campaign.completed_at: now}, synchronize_session=False)
+    
+    # Update user stats (emails_sent_today is synced from the quota ledger)
+    db.query(WorkspaceUser).filter(
+        WorkspaceUser.service_account_id == sender['service_account_id'],
+        WorkspaceUser.email == sender['user_email']
+    ).update({WorkspaceUser.last_used: now}, synchronize_session=False)
+    
+    db.commit()
+    return sent, failed, recorded, now if completed else None
+
+
+def _breaker_wait_rounds(campaign_id: int, remaining: int) -> int:
+    """Count one more wait on open circuit breakers and return how many in a row left
+    the pool where it was; the count starts over once the pool shrank in between."""
+    key = get_campaign_breaker_wait_key(campaign_id)
+    last = redis_client.hgetall(key)
+    rounds = int(last['rounds']) + 1 if last and remaining >= int(last['remaining']) else 1
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={'rounds': rounds, 'remaining': remaining})
+    pipe.expire(key, CAMPAIGN_RUN_TTL_SECONDS)
+    pipe.execute()
+    return rounds
+
+
+def _worker_finished(campaign_id: int, request_id: str) -> None:
+    """Count a sender worker out. The last one pauses the campaign if pooled work is
+    left that no sender could take (all out of quota or failing, or held by circuit
+    breakers that stayed open for MAX_BREAKER_WAIT_ROUNDS probes); resuming retries it.
+    If only delayed retries are left, it starts the next workers when the first is due."""
+    try:
+        if redis_client.decr(get_campaign_workers_key(campaign_id)) > 0:
+            return
+        remaining = redis_client.llen(get_campaign_pool_key(campaign_id))
+        senders = [json.loads(value) for value in redis_client.hvals(get_campaign_senders_key(campaign_id))]
+        # Work left behind open circuit breakers waits for their half-open probe;
+        # with an empty pool, only queued retries bring the workers back
+        wake_at = next_probe_at(senders) if remaining else next_retry_due(campaign_id)
+        breakers_stuck = False
+        if wake_at is not None:
+            db = SessionLocal()
+            try:
+                campaign = db.query(Campaign.status, Campaign.priority, Campaign.is_test).filter(Campaign.id == campaign_id).first()
+            finally:
+                db.close()
+            if not campaign or campaign.status != CampaignStatus.SENDING or not senders:
+                return
+            # Probes that keep failing while nothing leaves the pool: stop waiting
+            breakers_stuck = bool(remaining) and _breaker_wait_rounds(campaign_id, remaining) > MAX_BREAKER_WAIT_ROUNDS
+            if not breakers_stuck:
+                delay = max(0.0, wake_at - time.time())
+                _dispatch_sender_workers(campaign_id, senders, request_id, countdown=delay, queue=queue_for_campaign(campaign))
+                if remaining:
+                    logger.info(f"[{request_id}] 🔌 {remaining} emails of campaign {campaign_id} wait for open circuit breakers; sender workers restart in {delay:.1f}s")
+                else:
+                    logger.info(f"[{request_id}] 🔁 {pending_retries(campaign_id)} retries pending for campaign {campaign_id}; sender workers restart in {delay:.1f}s")
+                return
+        if not remaining:
+            return
+        db = SessionLocal()
+        try:
+            paused = db.query(Campaign).filter(
+                Campaign.id == campaign_id,
+                Campaign.status == CampaignStatus.SENDING
+            ).update({Campaign.status: CampaignStatus.PAUSED, Campaign.paused_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        # A resume starts counting breaker waits afresh
+        redis_client.delete(get_campaign_breaker_wait_key(campaign_id))
+        if paused:
+            reason = f"circuit breakers still open after {MAX_BREAKER_WAIT_ROUNDS} probes" if breakers_stuck else "daily quota exhausted"
+            logger.warning(f"[{request_id}] ⏸️ No sender can take the remaining {remaining} emails of campaign {campaign_id} ({reason}); paused")
+            append_campaign_log(campaign_id, f"⏸️ No sender can take the remaining {remaining} emails ({reason}) - campaign paused")
+            publish_campaign_status(campaign_id, CampaignStatus.PAUSED)
+    except Exception as e:
+        logger.error(f"[{request_id}] ❌ Could not finish sender worker bookkeeping for campaign {campaign_id}: {e}")
+
+
+@celery_app.task(name='app.tasks_v2.run_sender_worker')
+def run_sender_worker(sender: Dict, campaign_id: int, request_id: str):
+    """
+    Send the campaign's pooled tasks as one sender, a chunk at a time, until the
+    pool is empty, the sender's daily quota is used up, the campaign is paused or
+    canceled or its sending window closes, or the circuit breaker of the sender or its service account is open
+    (see app.circuit_breaker). Failures of the sender's own (Gmail disabled,
+    delegation refused, suspended, rate limited) go back to the pool for the other
+    senders instead of failing the emails. Chunks are sized to take about
+    SENDER_CHUNK_TARGET_SECONDS at the sender's observed latency; once the next
+    chunk would end past SENDER_SLICE_SECONDS the worker requeues itself, so each
+    run stays short and other campaigns' workers get a turn.
     
     Args:
-        batch_data: Dict with sender info and pre-rendered tasks
+        sender: Sender info (user, service account credentials, daily limits)
         campaign_id: Campaign ID
         request_id: Request tracking ID
     """
+    outcome = None
+    try:
+        outcome = _work_pool(sender, campaign_id, request_id)
+        return outcome
+    finally:
+        if outcome and outcome.get('requeue'):
+            # Slice used up: back of the queue, still counted as a running worker
+            try:
+                run_sender_worker.apply_async((sender, campaign_id, request_id), queue=outcome['requeue'])
+            except Exception as e:
+                logger.error(f"[{request_id}] ❌ Could not requeue sender worker {sender['user_email']}: {e}")
+                _worker_finished(campaign_id, request_id)
+        else:
+            _worker_finished(campaign_id, request_id)
+
+
+def _work_pool(sender: Dict, campaign_id: int, request_id: str) -> Dict:
     db = SessionLocal()
-    sender = batch_data['sender']
-    tasks = batch_data['tasks']
     sender_email = sender['user_email']
+    pool_key = get_campaign_pool_key(campaign_id)
+    sender_labels = dict(campaign_id=campaign_id, service_account_id=sender['service_account_id'], sender=sender_email)
     
     # NO DELAY - Send emails instantly
     MICRO_DELAY = 0.0  # ZERO delay - send ALL emails instantly
     
+    quota = None
+    concurrency = AdaptiveConcurrency.for_sender(sender)
+    breaker = SenderBreaker.for_sender(sender, concurrency.holder)
+    checkpoint = SenderCheckpoint(campaign_id, sender_email, concurrency.holder)
+    in_hand: List[Dict] = []
+    total_sent = 0
+    total_failed = 0
+    total_returned = 0
+    stop_reason = "pool empty"
+    requeue = None
+    
     try:
-        logger.info(f"[{request_id}] 👤 Sender {sender_email}: Executing {len(tasks)} tasks")
-        append_campaign_log(campaign_id, f"👤 Sender {sender_email}: executing {len(tasks)} tasks")
+        logger.info(f"[{request_id}] 👤 Sender {sender_email}: pulling from campaign {campaign_id} pool")
         start_time = time.time()
+        clock = StageClock(campaign_id)
         
         # Initialize Google service once
         google_service = GoogleWorkspaceService(sender['service_account_json'])
+        clock.lap("batch.credentials")
+        slice_start = time.time()
         
-        # Thread pool for parallel sending
-        max_threads = min(len(tasks), 50)  # Up to 50 parallel per sender
-        
-        results = []
-        futures = []
-        
-        # Add a periodic check for campaign status
-        status_check_interval = 10  # Check status every 10 emails
-        emails_processed_in_batch = 0
-
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            for task in tasks:
-                # Periodically check campaign status
-                if emails_processed_in_batch % status_check_interval == 0:
-                    db.refresh(campaign) # Refresh campaign object to get latest status
-                    if campaign.status == CampaignStatus.PAUSED:
-                        logger.info(f"[{request_id}] ⏸️ Campaign {campaign_id} paused. Stopping sender {sender_email} batch.")
-                        append_campaign_log(campaign_id, f"⏸️ Campaign paused. Sender {sender_email} batch stopped.")
-                        # Mark remaining tasks in this batch as pending
-                        for remaining_task in tasks[emails_processed_in_batch:]:
-                            email_log = db.query(EmailLog).filter(EmailLog.id == remaining_task['email_log_id']).first()
-                            if email_log and email_log.status == EmailStatus.PENDING:
-                                email_log.status = EmailStatus.PENDING # Ensure it remains pending
-                        db.commit()
-                        return # Exit the task
-                    elif campaign.status == CampaignStatus.CANCELED:
-                        logger.info(f"[{request_id}] ❌ Campaign {campaign_id} canceled. Stopping sender {sender_email} batch.")
-                        append_campaign_log(campaign_id, f"❌ Campaign canceled. Sender {sender_email} batch stopped.")
-                        # Mark remaining tasks in this batch as failed
-                        for remaining_task in tasks[emails_processed_in_batch:]:
-                            email_log = db.query(EmailLog).filter(EmailLog.id == remaining_task['email_log_id']).first()
-                            if email_log and email_log.status == EmailStatus.PENDING:
-                                email_log.status = EmailStatus.FAILED
-                                email_log.error_message = "Campaign canceled"
-                                email_log.failed_at = datetime.utcnow()
-                        db.commit()
-                        return # Exit the task
-                
-                future = executor.submit(
-                    send_prerendered_email,
-                    google_service,
-                    sender_email,
-                    task,
-                    campaign_id,
-                    MICRO_DELAY
+        while True:
+            # Pause/cancel take effect at the next chunk
+            campaign = db.query(
+                Campaign.status, Campaign.priority, Campaign.is_test, Campaign.start_at,
+                Campaign.send_window_start, Campaign.send_window_end
+            ).filter(Campaign.id == campaign_id).first()
+            status = campaign.status if campaign else None
+            if status == CampaignStatus.SENDING and not in_send_window(campaign.send_window_start, campaign.send_window_end, datetime.utcnow()):
+                # Window closed: pause until it opens again (once, whichever worker gets here first)
+                paused = db.query(Campaign).filter(
+                    Campaign.id == campaign_id,
+                    Campaign.status == CampaignStatus.SENDING
+                ).update({Campaign.status: CampaignStatus.PAUSED, Campaign.paused_at: datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+                if paused:
+                    resume_at = next_send_time(campaign)
+                    schedule_campaign(campaign_id, resume_at)
+                    append_campaign_log(campaign_id, f"🕘 Sending window closed - campaign paused until {resume_at.isoformat()}")
+                    publish_campaign_status(campaign_id, CampaignStatus.PAUSED)
+                status = CampaignStatus.PAUSED
+            if status != CampaignStatus.SENDING:
+                stop_reason = f"campaign {getattr(status, 'value', status)}"
+                if status == CampaignStatus.CANCELED:
+                    canceled = db.query(EmailLog).filter(
+                        EmailLog.campaign_id == campaign_id,
+                        EmailLog.status == EmailStatus.PENDING
+                    ).update({EmailLog.status: EmailStatus.FAILED, EmailLog.error_message: "Campaign canceled"}, synchronize_session=False)
+                    db.commit()
+                    redis_client.delete(pool_key, get_campaign_retry_key(campaign_id))
+                    if canceled:
+                        append_campaign_log(campaign_id, f"❌ Campaign canceled. {canceled} unsent emails marked failed.")
+                break
+            
+            # Retries whose backoff has passed go first
+            promoted = promote_due_retries(campaign_id, pool_key, CAMPAIGN_RUN_TTL_SECONDS)
+            
+            # An open breaker (sender or account) leaves the pool to the other senders;
+            # once its cooldown is over a single probe send decides whether it closes
+            verdict = breaker.allow()
+            if verdict == OPEN:
+                stop_reason = "circuit open"
+                break
+            
+            # In-flight sends follow the sender's and account's adaptive (AIMD) limits;
+            # the chunk is what that window sends in about SENDER_CHUNK_TARGET_SECONDS
+            chunk_start = time.time()
+            window = concurrency.acquire()
+            chunk_size = 1 if verdict == PROBE else concurrency.chunk_size(
+                SENDER_CHUNK_TARGET_SECONDS, SENDER_CHUNK_MIN, SENDER_CHUNK_MAX
+            )
+            
+            # Hold quota before taking work, so an exhausted sender takes none
+            quota = reserve_for_sender(sender, chunk_size, db=db)
+            if not quota.granted:
+                quota.release()
+                stop_reason = "daily quota exhausted"
+                break
+            in_hand = [json.loads(raw) for raw in redis_client.lpop(pool_key, quota.granted) or []]
+            if not in_hand:
+                quota.release()
+                if pending_retries(campaign_id):
+                    stop_reason = "waiting for retries"
+                break
+            checkpoint.take([task['email_log_id'] for task in in_hand])
+            clock.lap("batch.quota")
+            
+            # Exactly-once: a send an earlier delivery already made is recorded without
+            # sending it again (nor charging quota or counting it as sent a second time);
+            # one another worker is making right now is checked again a little later
+            claims = list(zip(in_hand, claim_sends(campaign_id, [task['email_log_id'] for task in in_hand])))
+            results = [{
+                'email_log_id': task['email_log_id'],
+                'recipient_email': task['recipient_email'],
+                'success': True,
+                'message_id': None,
+                'error': None,
+                'duplicate': True
+            } for task, verdict in claims if verdict == SENT]
+            to_send = [task for task, verdict in claims if verdict == CLAIMED]
+            busy = [task for task, verdict in claims if verdict == BUSY]
+            duplicates = len(results)
+            
+            returned = []
+            retries = []
+            latencies = []
+            throttled = 0
+            faults_since_success = 0
+            last_fault = None
+            with ThreadPoolExecutor(max_workers=window) as executor:
+                futures = [
+                    (executor.submit(timed_call, _send_once, google_service, sender_email, task, campaign_id, MICRO_DELAY), task)
+                    for task in to_send
+                ]
+                for collected, (future, task) in enumerate(futures):
+                    if collected % POOL_DEPTH_SAMPLE_EVERY == 0:
+                        SEND_POOL_QUEUE_DEPTH.set(executor._work_queue.qsize())
+                    checkpoint.heartbeat()
+                    (success, message_id, error), seconds = future.result()
+                    if success:
+                        latencies.append(seconds)
+                    elif getattr(error, 'throttled', False) or getattr(error, 'kind', None) == RETRYABLE:
+                        # Throttling or a transient error: Gmail wants us slower and the
+                        # concurrency backs off; the email is retried after a delay
+                        throttled += error.throttled
+                        if can_retry(task):
+                            retries.append(task)
+                            continue
+                        error = SendError(f"{error} (gave up after {MAX_SEND_ATTEMPTS} attempts)", error.kind, error.throttled)
+                    elif getattr(error, 'kind', None) == SENDER:
+                        # Nothing wrong with the email: another sender takes it
+                        returned.append(task)
+                        faults_since_success += 1
+                        last_fault = error
+                        continue
+                    if success:
+                        faults_since_success = 0
+                    results.append({
+                        'email_log_id': task['email_log_id'],
+                        'recipient_email': task['recipient_email'],
+                        'success': success,
+                        'message_id': message_id,
+                        'error': error
+                    })
+            SEND_POOL_QUEUE_DEPTH.set(0)
+            concurrency.feedback(len(latencies), throttled, sum(latencies) / len(latencies) if latencies else None)
+            opened = breaker.record(len(latencies), faults_since_success, str(last_fault or ""))
+            chunk_sent = sum(1 for result in results if result['success'] and not result.get('duplicate'))
+            chunk_failed = sum(1 for result in results if not result['success'])
+            quota.settle(chunk_sent)
+            if returned:
+                redis_client.lpush(pool_key, *[json.dumps(task) for task in returned])
+            schedule_retries(campaign_id, retries, time.time())
+            defer_tasks(campaign_id, busy, time.time() + BUSY_RECHECK_SECONDS)
+            release_claims(campaign_id, [
+                task['email_log_id'] for task in returned + retries if task['email_log_id'] is not None
+            ] + [result['email_log_id'] for result in results if not result['success'] and result['email_log_id'] is not None])
+            clock.lap("batch.send_pool", emails=len(in_hand))
+            
+            sent, failed, recorded, completed_at = _record_results(db, campaign_id, sender, results, request_id)
+            in_hand = []
+            checkpoint.ack()
+            clock.lap("batch.write_back", emails=len(results))
+            EMAILS_TOTAL.inc(chunk_sent, result='sent', **sender_labels)
+            EMAILS_TOTAL.inc(chunk_failed, result='failed', **sender_labels)
+            EMAILS_TOTAL.inc(len(returned), result='returned', **sender_labels)
+            EMAILS_TOTAL.inc(len(retries), result='retried', **sender_labels)
+            EMAILS_TOTAL.inc(duplicates, result='duplicate', **sender_labels)
+            EMAILS_TOTAL.inc(len(busy), result='busy', **sender_labels)
+            total_sent += sent
+            total_failed += failed
+            total_returned += len(returned)
+            
+            # Update Redis progress (and push it to live viewers)
+            retry_fields = {'retrying': pending_retries(campaign_id)} if retries or busy or promoted else {}
+            if completed_at:
+                update_campaign_progress(
+                    campaign_id, sent=sent, failed=failed, pending=-recorded,
+                    status=CampaignStatus.COMPLETED.value, completed_at=completed_at.isoformat(), **retry_fields
                 )
-                futures.append((future, task))
-                emails_processed_in_batch += 1
+                totals = db.query(Campaign.sent_count, Campaign.failed_count).filter(Campaign.id == campaign_id).first()
+                logger.info(f"[{request_id}] 🎉 Campaign {campaign_id} completed: {totals.sent_count} sent, {totals.failed_count} failed")
+                append_campaign_log(campaign_id, f"🎉 Campaign completed: {totals.sent_count} sent, {totals.failed_count} failed")
+            else:
+                update_campaign_progress(campaign_id, sent=sent, failed=failed, pending=-recorded, **retry_fields)
+            clock.lap("batch.progress")
             
-            # Collect results
-            for future, task in futures:
-                success, message_id, error = future.result()
-                results.append({
-                    'email_log_id': task['email_log_id'],
-                    'success': success,
-                    'message_id': message_id,
-                    'error': error
-                })
-        
-        elapsed = time.time() - start_time
-        
-        # Batch DB update
-        sent = 0
-        failed = 0
-        test_after_sent = 0
-        
-        # Fetch campaign again to ensure latest status for final update
-        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-        if not campaign: # Campaign might have been deleted during processing
-            logger.warning(f"[{request_id}] ⚠️ Campaign {campaign_id} not found during final batch update.")
-            return
-
-        # If campaign was paused/canceled by another process, don't update counts
-        if campaign.status in [CampaignStatus.PAUSED, CampaignStatus.CANCELED]:
-            logger.info(f"[{request_id}] ⚠️ Campaign {campaign_id} status is {campaign.status}. Skipping final batch count updates.")
-            return
-
-        for result in results:
-            # Handle test_after emails (no email_log_id)
-            if result['email_log_id'] is None:
-                if result['success']:
-                    test_after_sent += 1
-                    logger.info(f"[{request_id}] 🧪 Test After email sent successfully to {result.get('recipient_email', 'unknown')}")
-                else:
-                    logger.warning(f"[{request_id}] 🧪 Test After email failed: {result['error']}")
-                continue
+            if opened:
+                # The next allow() stops this worker (and every other worker of the sender or account)
+                scope = f"service account {sender['service_account_id']}" if opened & 2 else f"sender {sender_email}"
+                logger.warning(f"[{request_id}] 🔌 Circuit opened for {scope}: {last_fault}")
+                append_campaign_log(campaign_id, f"🔌 Circuit opened for {scope} after repeated sender errors ({last_fault}); its emails go to the other senders")
+            elif verdict == PROBE and latencies:
+                scope = f"service account {sender['service_account_id']}" if breaker.probing_account else f"sender {sender_email}"
+                logger.info(f"[{request_id}] 🔌 Circuit closed for {scope} after a successful probe")
+                append_campaign_log(campaign_id, f"🔌 Circuit closed for {scope}: sending again")
+                if breaker.probing_account:
+                    # The account's other senders stopped at the open breaker: bring them back
+                    others = [
+                        json.loads(value) for email, value in redis_client.hgetall(get_campaign_senders_key(campaign_id)).items()
+                        if email != sender_email and json.loads(value)['service_account_id'] == sender['service_account_id']
+                    ]
+                    if others:
+                        _dispatch_sender_workers(campaign_id, others, request_id, queue=queue_for_campaign(campaign))
             
-            # Handle regular campaign emails
-            email_log = db.query(EmailLog).filter(EmailLog.id == result['email_log_id']).first()
-            if email_log:
-                if result['success']:
-                    email_log.status = EmailStatus.SENT
-                    email_log.message_id = result['message_id']
-                    email_log.sent_at = datetime.utcnow()
-                    sent += 1
-                else:
-                    email_log.status = EmailStatus.FAILED
-                    email_log.error_message = result['error']
-                    email_log.failed_at = datetime.utcnow()
-                    failed += 1
-                    try:
-                        append_campaign_log(campaign_id, f"❌ Send failed for {task.get('recipient_email')}: {result['error']}")
-                    except Exception:
-                        pass
-        
-        # Update campaign counters
-        campaign.sent_count += sent
-        campaign.failed_count += failed
-        campaign.pending_count = max(0, campaign.pending_count - len(results))
-        
-        # Check if campaign is complete (no more pending emails)
-        if campaign.pending_count == 0:
-            # All emails have been processed, mark campaign as completed
-            campaign.status = CampaignStatus.COMPLETED
-            campaign.completed_at = datetime.utcnow()
-            logger.info(f"[{request_id}] 🎉 Campaign {campaign_id} completed: {campaign.sent_count} sent, {campaign.failed_count} failed")
-            append_campaign_log(campaign_id, f"🎉 Campaign completed: {campaign.sent_count} sent, {campaign.failed_count} failed")
-        
-        # Update user stats
-        user = db.query(WorkspaceUser).filter(
-            WorkspaceUser.service_account_id == sender['service_account_id'],
-            WorkspaceUser.email == sender_email
-        ).first()
-        if user:
-            user.emails_sent_today += sent
-            user.last_used = datetime.utcnow()
-        
-        db.commit()
-        
-        # Update Redis progress
-        progress_key = get_campaign_progress_key(campaign_id)
-        redis_client.hincrby(progress_key, 'sent', sent)
-        redis_client.hincrby(progress_key, 'failed', failed)
-        redis_client.hincrby(progress_key, 'pending', -len(results))
-        
-        # Log results with test_after info
-        test_after_info = f", {test_after_sent} test_after" if test_after_sent > 0 else ""
-        logger.info(f"[{request_id}] ✅ Sender {sender_email}: {len(tasks)} tasks in {elapsed:.2f}s ({len(tasks)/elapsed:.1f}/sec){test_after_info}")
-        append_campaign_log(campaign_id, f"✅ Sender {sender_email}: sent {sent}, failed {failed}")
-
-        # Note: Test After emails are already included in the task queue during preparation
-        # No need to send additional test emails during execution
-        
-        logger.info(f"[{request_id}] 📊 Sender {sender_email}: {sent} sent, {failed} failed")
+            # The next chunk should take about as long as this one did
+            now = time.time()
+            if not completed_at and now - slice_start + (now - chunk_start) > SENDER_SLICE_SECONDS:
+                stop_reason = "slice used, requeued"
+                requeue = queue_for_campaign(campaign)
+                break
+    
+        elapsed = time.time() - start_time
+        SENDER_BATCH_SECONDS.observe(elapsed)
+        handled = total_sent + total_failed
+        logger.info(f"[{request_id}] ✅ Sender {sender_email}: {handled} tasks in {elapsed:.2f}s ({handled/max(elapsed, 0.001):.1f}/sec), stopped: {stop_reason}")
+        append_campaign_log(campaign_id, f"✅ Sender {sender_email}: sent {total_sent}, failed {total_failed}, handed back {total_returned}")
+        logger.info(f"[{request_id}] 📊 Sender {sender_email}: {total_sent} sent, {total_failed} failed")
+        return {'sender': sender_email, 'sent': total_sent, 'failed': total_failed, 'returned': total_returned,
+                'stopped': stop_reason, 'requeue': requeue}
         
     except Exception as e:
         logger.error(f"[{request_id}] ❌ Sender {sender_email} failed: {e}")
-        
-        # Mark all as failed
-        for task in tasks:
-            email_log = db.query(EmailLog).filter(EmailLog.id == task['email_log_id']).first()
-            if email_log and email_log.status == EmailStatus.PENDING:
-                email_log.status = EmailStatus.FAILED
-                email_log.error_message = str(e)
-                email_log.failed_at = datetime.utcnow()
-        
-        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-        if campaign:
-            campaign.failed_count += len(tasks)
-            campaign.pending_count = max(0, campaign.pending_count - len(tasks))
-        
-        db.commit()
+        db.rollback()
+        # The ledger has every send of the chunk that went out: hand the chunk back
+        # to the pool and the next worker records those and sends only the rest
+        if in_hand:
+            release_claims(campaign_id, [task['email_log_id'] for task in in_hand if task['email_log_id'] is not None])
+            redis_client.lpush(pool_key, *[json.dumps(task) for task in in_hand])
         raise
     
     finally:
+        # Early exits (errors): free the chunk's hold
+        if quota is not None and not quota.closed:
+            quota.release()
+        concurrency.release()
+        checkpoint.clear()
         db.close()
 
 
+@celery_app.task(name='app.tasks_v2.execute_sender_batch_v2')
+def execute_sender_batch_v2(batch_data: Dict, campaign_id: int, request_id: str):
+    """
+    Execute a single sender's batch (kept for batches queued before the shared pool):
+    the tasks join the campaign pool and this sender works it like any other.
+    
+    Args:
+        batch_data: Dict with sender info and pre-rendered tasks
+        campaign_id: Campaign ID
+        request_id: Request tracking ID
+    """
+    pool_key = get_campaign_pool_key(campaign_id)
+    pipe = redis_client.pipeline()
+    if batch_data['tasks']:
+        pipe.rpush(pool_key, *[json.dumps(task) for task in batch_data['tasks']])
+    pipe.hset(get_campaign_senders_key(campaign_id), batch_data['sender']['user_email'], json.dumps(batch_data['sender']))
+    pipe.incr(get_campaign_workers_key(campaign_id))
+    pipe.execute()
+    return run_sender_worker(batch_data['sender'], campaign_id, request_id)
+
+
+def _send_once(google_service: GoogleWorkspaceService, sender_email: str, task: Dict, campaign_id: int,
+               micro_delay: float = 0.0) -> tuple:
+    """send_prerendered_email, then mark the send in the exactly-once ledger."""
+    outcome = send_prerendered_email(google_service, sender_email, task, campaign_id, micro_delay)
+    if outcome[0] and task['email_log_id'] is not None:
+        mark_sent(campaign_id, task['email_log_id'])
+    return outcome
+
+
 def send_prerendered_email(
     google_service: GoogleWorkspaceService,
     sender_email: str,
@@ -710,16 +1351,19 @@ def send_prerendered_email(
         micro_delay: NO DELAY - always 0.0 for instant sending
     
     Returns:
-        (success: bool, message_id: str, error: str)
+        (success: bool, message_id: str, error: SendError tagged with its kind)
     """
     try:
         # Skip if Gmail not enabled for this user
-        if not google_service.is_gmail_enabled(sender_email):
+        with stage_timer("send.gmail_check", campaign_id):
+            gmail_enabled = google_service.is_gmail_enabled(sender_email)
+        if not gmail_enabled:
             append_campaign_log(campaign_id, f"⚠️ Gmail disabled for {sender_email} - skipping")
-            return False, None, "Gmail service not enabled for this user"
+            return False, None, SendError("Gmail service not enabled for this user", SENDER)
         
         # NO DELAY - Send emails instantly
         # Removed time.sleep() completely for maximum speed
+        clock = StageClock(campaign_id)
         
         # Process custom headers if needed
         custom_headers = task.get('custom_headers', {})
@@ -746,8 +1390,7 @@ def send_prerendered_email(
                     send_via_smtp(smtp_msg)
                     return (True, smtp_msg.get('Message-ID'), None)
                 except Exception as smtp_e:
-                    logger.warning(f"SMTP send failed, falling back to Gmail: {smtp_e}")
-            logger.info(f"Processing custom header text: {task['custom_header_text'][:100]}...")
+                    log_event(logger, logging.WARNING, "send.smtp_fallback", rate=1, sender=sender_email, error=smtp_e)
             # Process custom header tags for 100% header type
             # Derive a display name if not provided
             sender_display = task.get('from_name') or ''
@@ -767,18 +1410,14 @@ def send_prerendered_email(
                 domain=sender_email.split('@')[1] if '@' in sender_email else None
             )
             
-            logger.info(f"Processed header: {processed_header[:200]}...")
-            
             # Parse the processed header into individual headers
             header_lines = processed_header.strip().split('\n')
             for line in header_lines:
                 if ':' in line:
                     key, value = line.split(':', 1)
                     custom_headers[key.strip()] = value.strip()
-            
-            logger.info(f"Final custom headers: {custom_headers}")
-        else:
-            logger.info("No custom header text found in task")
+        
+        clock.lap("send.headers")
         
         # Send (everything is already prepared)
         # Use custom header method if we have custom_header_text
@@ -804,34 +1443,36 @@ def send_prerendered_email(
                 # Ensure To header present
                 canonical.setdefault('To', task['recipient_email'])
                 custom_headers = canonical
-            logger.info(f"Using send_email_with_custom_headers method - custom_headers: {custom_headers}")
-            # CRITICAL: Log body content before sending
-            logger.info(f"📧 Sending email - body_html length: {len(task.get('body_html', '') or '')}, body_plain length: {len(task.get('body_plain', '') or '')}")
+            log_event(
+                logger, logging.DEBUG, "send.custom_headers", sample=0.01,
+                sender=sender_email, recipient=task['recipient_email'], custom_headers=custom_headers
+            )
             if not task.get('body_html'):
-                logger.warning(f"⚠️ WARNING: body_html is EMPTY before sending!")
+                log_event(logger, logging.WARNING, "send.empty_html_body", rate=1, campaign_id=campaign_id, sender=sender_email)
             
-            message_id = google_service.send_email_with_custom_headers(
-                sender_email=sender_email,
-                recipient_email=task['recipient_email'],
-                subject=task['subject'],
-                body_html=task.get('body_html') or '',  # Ensure not None
-                body_plain=task.get('body_plain') or '',  # Ensure not None
-                from_name=task.get('from_name'),
-                custom_headers=custom_headers,
-                attachments=task.get('attachments')
-            )
+            with stage_timer("send.gmail_api", campaign_id):
+                message_id = google_service.send_email_with_custom_headers(
+                    sender_email=sender_email,
+                    recipient_email=task['recipient_email'],
+                    subject=task['subject'],
+                    body_html=task.get('body_html') or '',  # Ensure not None
+                    body_plain=task.get('body_plain') or '',  # Ensure not None
+                    from_name=task.get('from_name'),
+                    custom_headers=custom_headers,
+                    attachments=task.get('attachments')
+                )
         else:
-            logger.info(f"Using regular send_email method - no custom_header_text")
-            message_id = google_service.send_email(
-                sender_email=sender_email,
-                recipient_email=task['recipient_email'],
-                subject=task['subject'],
-                body_html=task['body_html'],
-                body_plain=task['body_plain'],
-                from_name=task.get('from_name'),
-                custom_headers=custom_headers,
-                attachments=task.get('attachments')
-            )
+            with stage_timer("send.gmail_api", campaign_id):
+                message_id = google_service.send_email(
+                    sender_email=sender_email,
+                    recipient_email=task['recipient_email'],
+                    subject=task['subject'],
+                    body_html=task['body_html'],
+                    body_plain=task['body_plain'],
+                    from_name=task.get('from_name'),
+                    custom_headers=custom_headers,
+                    attachments=task.get('attachments')
+                )
         
         return (True, message_id, None)
     
@@ -844,8 +1485,11 @@ def send_prerendered_email(
         
         try:
             append_campaign_log(campaign_id, f"❌ Send failed for {task.get('recipient_email')}: {error_msg}")
-            logger.error(f"Send failed for {task.get('recipient_email')} | sender={sender_email} | {error_msg}")
+            log_event(
+                logger, logging.ERROR, "send.failed", rate=5,
+                campaign_id=campaign_id, sender=sender_email, recipient=task.get('recipient_email'), error=error_msg
+            )
         except Exception:
             pass
-        return (False, None, error_msg)
+        return (False, None, SendError(error_msg, classify_send_error(e), is_throttle(e)))
 
@@ -0,0 +1,183 @@
+"""
+Per-stage timing breakdown for campaign runs
+
+The send pipeline is split into named stages (`prepare.render`,
+`batch.write_back`, `send.http`, ...). Every timed stage adds one sample to the
+campaign's timing hash in Redis (`campaign:{id}:timings`): a count, a running
+total, and a latency-bucket counter used to estimate percentiles. Writes go
+through the metrics buffer, so timing costs the hot path a few in-memory
+increments and no Redis round trips.
+
+- `stage_timer(stage, campaign_id)` times a block. It also makes `campaign_id`
+  the current campaign for nested code, so lower layers (google_api) can time
+  their own stages without having the campaign passed in.
+- `StageClock(campaign_id).lap(stage)` records the time since the previous lap.
+  Use it in long functions where wrapping each block would re-indent the code.
+
+When OTEL_EXPORTER_OTLP_ENDPOINT is set and the OpenTelemetry SDK is installed,
+each stage is also exported as a span. The SDK is not a dependency of this
+project; without it, stages are only aggregated in Redis.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from app.config import settings
+from app.metrics import buffered_increment, flush_pending, redis_client
+
+logger = logging.getLogger(__name__)
+
+TIMINGS_TTL_SECONDS = 7 * 86400
+STAGE_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0,
+)
+PERCENTILES = (50, 90, 99)
+
+_current_campaign: ContextVar[Optional[int]] = ContextVar("timed_campaign", default=None)
+_expiring = set()
+_tracer = None
+_tracer_pid = None
+
+
+def get_campaign_timings_key(campaign_id: int) -> str:
+    """Get Redis key for per-stage campaign timings"""
+    return f"campaign:{campaign_id}:timings"
+
+
+def _bucket_label(bound: Optional[float]) -> str:
+    return "+Inf" if bound is None else repr(bound)
+
+
+def record_stage(campaign_id: int, stage: str, seconds: float) -> None:
+    """Add one `stage` sample of `seconds` to the campaign's timing hash."""
+    key = get_campaign_timings_key(campaign_id)
+    bound = next((b for b in STAGE_BUCKETS if seconds <= b), None)
+    buffered_increment(key, f"{stage}:count", 1)
+    buffered_increment(key, f"{stage}:sum", seconds)
+    buffered_increment(key, f"{stage}:le:{_bucket_label(bound)}", 1)
+    if campaign_id not in _expiring:
+        _expiring.add(campaign_id)
+        try:
+            redis_client.expire(key, TIMINGS_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not set expiry on {key}: {e}")
+
+
+def _get_tracer():
+    """OpenTelemetry tracer if an OTLP endpoint is configured and the SDK is importable."""
+    global _tracer, _tracer_pid
+    if not settings.OTEL_EXPORTER_OTLP_ENDPOINT:
+        return None
+    pid = os.getpid()
+    if _tracer_pid == pid:
+        return _tracer
+    # (Re)initialise per process: the batch exporter thread does not survive a fork
+    _tracer_pid = pid
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but the OpenTelemetry SDK is not installed; "
+                       "stage timings are kept in Redis only")
+        _tracer = None
+        return None
+    endpoint = settings.OTEL_EXPORTER_OTLP_ENDPOINT.rstrip("/")
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint}/v1/traces")))
+    _tracer = provider.get_tracer(__name__)
+    return _tracer
+
+
+@contextmanager
+def stage_timer(stage: str, campaign_id: Optional[int] = None, **attributes):
+    """Time the enclosed block as `stage` of `campaign_id` (default: the current campaign).
+    A no-op when there is no campaign to attribute it to."""
+    if campaign_id is None:
+        campaign_id = _current_campaign.get()
+    if campaign_id is None:
+        yield
+        return
+    token = _current_campaign.set(campaign_id)
+    tracer = _get_tracer()
+    span = tracer.start_as_current_span(stage, attributes={"campaign_id": campaign_id, **attributes}) if tracer else nullcontext()
+    started = time.perf_counter()
+    try:
+        with span:
+            yield
+    finally:
+        record_stage(campaign_id, stage, time.perf_counter() - started)
+        _current_campaign.reset(token)
+
+
+class StageClock:
+    """Lap timer: each `lap(stage)` records the time elapsed since the previous lap."""
+
+    def __init__(self, campaign_id: Optional[int] = None):
+        self.campaign_id = campaign_id if campaign_id is not None else _current_campaign.get()
+        self._last = time.perf_counter()
+        self._last_ns = time.time_ns()
+
+    def lap(self, stage: str, **attributes) -> None:
+        now = time.perf_counter()
+        now_ns = time.time_ns()
+        if self.campaign_id is not None:
+            record_stage(self.campaign_id, stage, now - self._last)
+            tracer = _get_tracer()
+            if tracer:
+                span = tracer.start_span(stage, start_time=self._last_ns,
+                                         attributes={"campaign_id": self.campaign_id, **attributes})
+                span.end(end_time=now_ns)
+        self._last = now
+        self._last_ns = now_ns
+
+
+def _percentile(buckets: Dict[str, float], count: float, q: float) -> float:
+    """Estimate the q-th percentile by linear interpolation inside the matching bucket."""
+    rank = count * q / 100.0
+    cumulative = 0.0
+    lower = 0.0
+    for bound in STAGE_BUCKETS:
+        in_bucket = buckets.get(_bucket_label(bound), 0.0)
+        if in_bucket and cumulative + in_bucket >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / in_bucket
+        cumulative += in_bucket
+        lower = bound
+    # Beyond the largest bucket: report its bound
+    return STAGE_BUCKETS[-1]
+
+
+def get_campaign_timings(campaign_id: int) -> Dict:
+    """Per-stage sample count, total/mean seconds and estimated percentiles for a campaign."""
+    flush_pending()
+    raw = redis_client.hgetall(get_campaign_timings_key(campaign_id)) or {}
+
+    stages: Dict[str, Dict] = {}
+    for field, value in raw.items():
+        stage, _, rest = field.partition(":")
+        entry = stages.setdefault(stage, {"count": 0.0, "sum": 0.0, "buckets": {}})
+        if rest.startswith("le:"):
+            entry["buckets"][rest[3:]] = float(value)
+        elif rest in ("count", "sum"):
+            entry[rest] = float(value)
+
+    result = {}
+    for stage in sorted(stages):
+        entry = stages[stage]
+        count = entry["count"]
+        if not count:
+            continue
+        summary = {
+            "count": int(count),
+            "total_seconds": round(entry["sum"], 6),
+            "mean_seconds": round(entry["sum"] / count, 6),
+        }
+        for q in PERCENTILES:
+            summary[f"p{q}_seconds"] = round(_percentile(entry["buckets"], count, q), 6)
+        result[stage] = summary
+    return {"campaign_id": campaign_id, "stages": result}
@@ -0,0 +1,174 @@
+"""
+Per-message CPU cost of the email builder.
+
+Times the per-email CPU path in app.google_api:
+- substitute_variables
+- process_custom_header_tags
+- MIME building: _build_raw_email_with_headers (100% header mode) and
+  _build_message (send_email)
+- base64.urlsafe_b64encode of the raw message
+
+Bodies range from 1 KB to 1 MB, with varying variable counts and attachment
+sizes. Each case reports the best-of-N mean time per call.
+
+A committed baseline (benchmarks/baselines/email_builder.json) lets any change
+to the builder show its per-message cost. Numbers are machine-dependent, so
+compare on the same machine, or refresh the baseline before and after a change.
+
+Usage:
+    python benchmarks/bench_email_builder.py                   # compare against the baseline
+    python benchmarks/bench_email_builder.py --quick --json
+    python benchmarks/bench_email_builder.py --save-baseline   # after an intentional change
+    python benchmarks/bench_email_builder.py --check --threshold 1.3   # exit 1 on regressions
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.google_api import GoogleWorkspaceService, process_custom_header_tags, substitute_variables  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "email_builder.json")
+
+BODY_SIZES = {"1KB": 1024, "10KB": 10 * 1024, "100KB": 100 * 1024, "1MB": 1024 * 1024}
+VARIABLE_COUNTS = (1, 10, 50)
+ATTACHMENT_SIZES = {"none": 0, "100KB": 100 * 1024, "1MB": 1024 * 1024}
+
+CUSTOM_HEADER = "\n".join([
+    "Received: from [smtp] by [domain] with ESMTPSA id [rnda_16]",
+    "Message-ID: <[rnda_24]@[domain]>",
+    "Date: [date]",
+    "From: [from] <[smtp]>",
+    "To: [to]",
+    "Subject: [subject]",
+    "MIME-Version: 1.0",
+    "List-Unsubscribe: <mailto:unsubscribe-[rndn_10]@[domain]>",
+    "Feedback-ID: [rndn_6]:[rnda_8]:bench",
+    "X-Campaign: [rnda_12]",
+])
+
+
+def _body(size: int, variables: int, html: bool) -> str:
+    """Roughly `size` characters with `variables` distinct placeholders spread through it."""
+    unit = "<p>The quick brown fox jumps over the lazy dog.</p>\n" if html else "The quick brown fox jumps over the lazy dog.\n"
+    text = unit * max(1, size // len(unit))
+    step = max(1, len(text) // (variables + 1))
+    pieces = [text[i * step:(i + 1) * step] + f"{{{{var{i}}}}}" for i in range(variables)]
+    return "".join(pieces) + text[variables * step:]
+
+
+def _attachment(size: int) -> List[Dict]:
+    if not size:
+        return []
+    return [{"filename": "report.pdf", "content": base64.b64encode(os.urandom(size)).decode()}]
+
+
+def build_cases(quick: bool) -> List[Tuple[str, Callable[[], object]]]:
+    service = GoogleWorkspaceService("{}")
+    sizes = {k: v for k, v in BODY_SIZES.items() if not quick or k in ("1KB", "100KB")}
+    cases: List[Tuple[str, Callable[[], object]]] = []
+
+    for size_name, size in sizes.items():
+        for count in VARIABLE_COUNTS if not quick else (10,):
+            body = _body(size, count, html=True)
+            variables = {f"var{i}": f"value-{i}" for i in range(count)}
+            cases.append((f"substitute_variables/{size_name}/vars={count}",
+                          lambda body=body, variables=variables: substitute_variables(body, variables)))
+
+    cases.append(("process_custom_header_tags/10_lines", lambda: process_custom_header_tags(
+        CUSTOM_HEADER, "recipient@example.com", "Jane Sender", "Quarterly update", "jane@example.com", "example.com"
+    )))
+
+    headers = {
+        "Message-ID": "<abc123@example.com>", "List-Unsubscribe": "<mailto:unsub@example.com>",
+        "Feedback-ID": "1:2:bench", "X-Campaign": "bench",
+    }
+    for size_name, size in sizes.items():
+        html, plain = _body(size, 0, html=True), _body(size, 0, html=False)
+        for attachment_name, attachment_size in ATTACHMENT_SIZES.items():
+            if quick and attachment_name == "1MB":
+                continue
+            attachments = _attachment(attachment_size)
+            kwargs = dict(sender_email="jane@example.com", recipient_email="recipient@example.com",
+                          subject="Quarterly update", body_html=html, body_plain=plain, from_name="Jane Sender",
+                          custom_headers=headers, attachments=attachments)
+            cases.append((f"build_raw_100pct_header/{size_name}/attach={attachment_name}",
+                          lambda kwargs=kwargs: service._build_raw_email_with_headers(**kwargs)))
+            cases.append((f"build_message_send_email/{size_name}/attach={attachment_name}",
+                          lambda kwargs=kwargs: service._build_message(**kwargs).as_bytes()))
+
+        raw = service._build_raw_email_with_headers(
+            sender_email="jane@example.com", recipient_email="recipient@example.com", subject="Quarterly update",
+            body_html=html, body_plain=plain
+        ).encode()
+        cases.append((f"urlsafe_b64encode/{size_name}", lambda raw=raw: base64.urlsafe_b64encode(raw).decode()))
+    return cases
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> float:
+    """Best-of-`repeat` mean seconds per call, each sample running for at least `min_time`."""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller matrix (1KB/100KB bodies, no 1MB attachments)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per sample")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any case is slower than baseline * threshold")
+    parser.add_argument("--threshold", type=float, default=1.3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    baseline: Dict[str, float] = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = {case["case"]: case["us_per_op"] for case in json.load(f)["results"]}
+
+    results = []
+    for name, func in build_cases(args.quick):
+        us = measure(func, args.repeat, args.min_time) * 1e6
+        result = {"case": name, "us_per_op": round(us, 2), "ops_per_sec": round(1e6 / us, 1)}
+        if name in baseline:
+            result["vs_baseline"] = round(us / baseline[name], 2)
+        results.append(result)
+        if not args.json:
+            ratio = f"{result['vs_baseline']:>6}x" if "vs_baseline" in result else ""
+            print(f"{name:52} {result['us_per_op']:>12} us {result['ops_per_sec']:>12}/s {ratio}", flush=True)
+
+    report = {
+        "benchmark": "email_builder",
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    regressions = [r for r in results if r.get("vs_baseline", 0) > args.threshold]
+    if regressions and not args.json:
+        print(f"\n{len(regressions)} case(s) slower than {args.threshold}x baseline:")
+        for r in regressions:
+            print(f"  {r['case']}: {r['vs_baseline']}x")
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
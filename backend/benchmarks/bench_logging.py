@@ -0,0 +1,127 @@
+"""
+Hot-path logging benchmark: per-email f-string logging vs. structured log_event.
+
+Simulates N sender threads each "sending" M emails, where the only work per
+email is the logging the send path used to do (8 INFO f-strings including a
+custom-header dict dump and a 500-char raw message preview) versus what it does
+now (sampled DEBUG log_event calls behind a QueueHandler). Handlers write to a
+real file so lock contention and I/O are included.
+
+Usage:
+    python benchmarks/bench_logging.py --threads 100 --emails 200
+    python benchmarks/bench_logging.py --json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.structured_logging import LOG_FORMAT, enable_queue_logging, log_event  # noqa: E402
+
+CUSTOM_HEADERS = {f"X-Header-{i}": f"value-{i}-" + "x" * 40 for i in range(12)}
+RAW_EMAIL = ("Received: from mail.example.com\r\n" * 20) + ("<p>body</p>" * 400)
+BODY_HTML = "<p>hello</p>" * 300
+BODY_PLAIN = "hello " * 300
+
+
+def _make_logger(name: str, path: str, level: int, queued: bool):
+    """Return (logger, drain) where drain() blocks until every record is written."""
+    logger = logging.getLogger(name)
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(level)
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(handler)
+    listener = enable_queue_logging(logger) if queued else None
+    return logger, (listener.stop if listener else handler.flush)
+
+
+def legacy_email(logger: logging.Logger, recipient: str) -> None:
+    logger.info(f"Processing custom header text: {RAW_EMAIL[:100]}...")
+    logger.info(f"Processed header: {RAW_EMAIL[:200]}...")
+    logger.info(f"Final custom headers: {CUSTOM_HEADERS}")
+    logger.info(f"Using send_email_with_custom_headers method - custom_headers: {CUSTOM_HEADERS}")
+    logger.info(f"📧 Sending email - body_html length: {len(BODY_HTML)}, body_plain length: {len(BODY_PLAIN)}")
+    logger.info(f"📧 Building email - body_html length: {len(BODY_HTML)}, body_plain length: {len(BODY_PLAIN)}")
+    logger.info(f"📧 Raw email length: {len(RAW_EMAIL)} characters")
+    logger.info(f"📧 Raw email preview (first 500 chars): {RAW_EMAIL[:500]}...")
+
+
+def structured_email(logger: logging.Logger, recipient: str) -> None:
+    log_event(logger, logging.DEBUG, "bench.custom_headers", sample=0.01, recipient=recipient, custom_headers=CUSTOM_HEADERS)
+    log_event(logger, logging.DEBUG, "bench.mime_built", sample=0.01, recipient=recipient, raw_length=len(RAW_EMAIL))
+    log_event(logger, logging.DEBUG, "bench.send_raw", sample=0.01, recipient=recipient, raw_length=len(RAW_EMAIL))
+
+
+def run_case(name: str, emit, logger: logging.Logger, drain, threads: int, emails: int) -> dict:
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index: int):
+        barrier.wait()
+        for i in range(emails):
+            emit(logger, f"user{index}-{i}@example.com")
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in pool:
+        t.join()
+    sender_elapsed = time.perf_counter() - started
+    drain()
+    elapsed = time.perf_counter() - started
+    total = threads * emails
+    return {
+        "case": name,
+        "emails": total,
+        "seconds": round(elapsed, 4),
+        "sender_thread_seconds": round(sender_elapsed, 4),
+        "emails_per_sec": round(total / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--emails", type=int, default=200, help="emails per thread")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("legacy_info_fstrings", legacy_email,
+             *_make_logger("bench.legacy", os.path.join(tmp, "legacy.log"), logging.INFO, queued=False)),
+            ("legacy_info_queued", legacy_email,
+             *_make_logger("bench.legacy_queued", os.path.join(tmp, "legacy_queued.log"), logging.INFO, queued=True)),
+            ("structured_info_level", structured_email,
+             *_make_logger("bench.structured", os.path.join(tmp, "structured.log"), logging.INFO, queued=True)),
+            ("structured_debug_sampled", structured_email,
+             *_make_logger("bench.structured_debug", os.path.join(tmp, "debug.log"), logging.DEBUG, queued=True)),
+        ]
+        results = [run_case(name, emit, logger, drain, args.threads, args.emails) for name, emit, logger, drain in cases]
+        logging.shutdown()
+
+    baseline = results[0]["emails_per_sec"] or 1.0
+    for result in results:
+        result["speedup"] = round(result["emails_per_sec"] / baseline, 1)
+
+    if args.json:
+        json.dump({"threads": args.threads, "emails_per_thread": args.emails, "results": results}, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"{'case':28} {'emails/s':>12} {'seconds':>9} {'senders':>9} {'speedup':>8}")
+        for r in results:
+            print(f"{r['case']:28} {r['emails_per_sec']:>12} {r['seconds']:>9} {r['sender_thread_seconds']:>9} {r['speedup']:>7}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""
+Local stand-in for the Gmail and Admin Directory APIs, for offline load testing.
+
+Implements the endpoints the app uses: the OAuth token endpoint,
+users.getProfile, users.messages.send, users.drafts.create/send, Admin Directory
+users.list / domains.list, and multipart batch requests. Each endpoint has a
+configurable latency distribution, random 429 / 5xx injection and per-user
+sending quotas (per-second rate and daily cap), so the whole
+prepare -> resume -> send pipeline can be driven at full speed on one machine
+without touching real Workspace quota.
+
+Point the app at it with GOOGLE_API_BASE_URL=http://localhost:8089: API calls
+and token requests then go here, whatever the service account's token_uri says.
+The token endpoint does not verify JWT signatures; any well-formed service
+account JSON works (see --write-service-account).
+
+Usage:
+    python benchmarks/fake_google_api.py --port 8089 --latency-ms 120 --latency-dist lognormal
+    python benchmarks/fake_google_api.py --error-rate-429 0.01 --error-rate-5xx 0.002 --user-rate 10 --daily-quota 2000
+    python benchmarks/fake_google_api.py --write-service-account sa.json
+
+Counters: GET /_fake/stats   Reset counters and quotas: POST /_fake/reset
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from email.parser import BytesParser
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+_ERRORS = {
+    429: ("rateLimitExceeded", "RESOURCE_EXHAUSTED", "User-rate limit exceeded"),
+    500: ("backendError", "INTERNAL", "Backend Error"),
+    503: ("backendError", "UNAVAILABLE", "The service is currently unavailable."),
+}
+
+
+def generate_service_account_info(client_email: str = "speed-send-bench@fake-project.iam.gserviceaccount.com",
+                                  token_uri: str = "http://localhost:8089/token") -> Dict:
+    """A syntactically valid service account JSON with a freshly generated RSA key."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "fake-project",
+        "private_key_id": uuid.uuid4().hex,
+        "private_key": pem,
+        "client_email": client_email,
+        "client_id": str(random.randint(10 ** 20, 10 ** 21 - 1)),
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": token_uri,
+    }
+
+
+def _error(status: int, reason: Optional[str] = None, message: Optional[str] = None) -> Tuple[int, Dict]:
+    default_reason, status_text, default_message = _ERRORS.get(status, ("failedPrecondition", "FAILED_PRECONDITION", "Error"))
+    message = message or default_message
+    return status, {"error": {
+        "code": status,
+        "message": message,
+        "errors": [{"message": message, "domain": "usageLimits" if status == 429 else "global",
+                    "reason": reason or default_reason}],
+        "status": status_text,
+    }}
+
+
+class _UserQuota:
+    """Per-user token bucket (sends per second) plus a daily send counter."""
+    __slots__ = ("tokens", "updated", "sent_today")
+
+    def __init__(self, rate: float):
+        self.tokens = max(rate, 1.0)
+        self.updated = time.monotonic()
+        self.sent_today = 0
+
+
+class FakeGoogle:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.users = [f"user{i}@{args.domain}" for i in range(args.users)]
+        self.reset()
+
+    def reset(self) -> None:
+        self.stats: Counter = Counter()
+        self.quotas: Dict[str, _UserQuota] = {}
+        self.drafts: Dict[str, str] = {}
+        self.sent_by_user: Dict[str, int] = defaultdict(int)
+        self.started = time.time()
+
+    # Behaviour -------------------------------------------------------------
+
+    async def delay(self, mean_ms: float) -> None:
+        if mean_ms <= 0:
+            return
+        mean = mean_ms / 1000.0
+        dist = self.args.latency_dist
+        if dist == "uniform":
+            seconds = self.rng.uniform(0, 2 * mean)
+        elif dist == "exponential":
+            seconds = self.rng.expovariate(1.0 / mean)
+        elif dist == "lognormal":
+            sigma = self.args.latency_sigma
+            seconds = self.rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+        else:
+            seconds = mean
+        await asyncio.sleep(seconds)
+
+    def injected_fault(self) -> Optional[Tuple[int, Dict]]:
+        roll = self.rng.random()
+        if roll < self.args.error_rate_429:
+            return _error(429)
+        if roll < self.args.error_rate_429 + self.args.error_rate_5xx:
+            return _error(self.rng.choice((500, 503)))
+        return None
+
+    def check_quota(self, user: str) -> Optional[Tuple[int, Dict]]:
+        rate = self.args.user_rate
+        quota = self.quotas.get(user)
+        if quota is None:
+            quota = self.quotas[user] = _UserQuota(rate)
+        if self.args.daily_quota and quota.sent_today >= self.args.daily_quota:
+            self.stats["quota_daily_rejected"] += 1
+            return _error(429, "dailyLimitExceeded", "User-rate limit exceeded: Mail sending limit exceeded")
+        if rate:
+            now = time.monotonic()
+            quota.tokens = min(max(rate, 1.0), quota.tokens + (now - quota.updated) * rate)
+            quota.updated = now
+            if quota.tokens < 1.0:
+                self.stats["quota_rate_rejected"] += 1
+                return _error(429, "userRateLimitExceeded")
+            quota.tokens -= 1.0
+        quota.sent_today += 1
+        return None
+
+    # Endpoints -------------------------------------------------------------
+
+    async def token(self, form: Dict[str, str]) -> Tuple[int, Dict]:
+        await self.delay(self.args.token_latency_ms)
+        try:
+            payload = form["assertion"].split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        except (KeyError, IndexError, ValueError):
+            return 400, {"error": "invalid_grant", "error_description": "Invalid JWT assertion"}
+        subject = claims.get("sub") or claims.get("iss") or "unknown"
+        self.stats["token"] += 1
+        token = "fake." + base64.urlsafe_b64encode(subject.encode()).decode().rstrip("=")
+        return 200, {"access_token": token, "token_type": "Bearer", "expires_in": 3600}
+
+    async def get_profile(self, user: str) -> Tuple[int, Dict]:
+        await self.delay(self.args.profile_latency_ms)
+        self.stats["gmail.getProfile"] += 1
+        fault = self.injected_fault()
+        if fault:
+            return fault
+        return 200, {"emailAddress": user, "messagesTotal": self.sent_by_user[user],
+                     "threadsTotal": self.sent_by_user[user], "historyId": str(self.stats["gmail.messages.send"])}
+
+    async def _deliver(self, user: str, raw: Optional[str], endpoint: str) -> Tuple[int, Dict]:
+        await self.delay(self.args.latency_ms)
+        self.stats[endpoint] += 1
+        if not raw:
+            return _error(400, "invalidArgument", "'raw' RFC822 payload message string or uploading message via /upload/ URL required")
+        fault = self.injected_fault() or self.check_quota(user)
+        if fault:
+            self.stats[f"{endpoint}.error.{fault[0]}"] += 1
+            return fault
+        self.sent_by_user[user] += 1
+        self.stats["bytes"] += len(raw)
+        message_id = uuid.uuid4().hex[:16]
+        return 200, {"id": message_id, "threadId": message_id, "labelIds": ["SENT"]}
+
+    async def send_message(self, user: str, body: Dict) -> Tuple[int, Dict]:
+        return await self._deliver(user, body.get("raw"), "gmail.messages.send")
+
+    async def create_draft(self, user: str, body: Dict) -> Tuple[int, Dict]:
+        await self.delay(self.args.profile_latency_ms)
+        self.stats["gmail.drafts.create"] += 1
+        fault = self.injected_fault()
+        if fault:
+            return fault
+        draft_id = "r" + uuid.uuid4().hex[:16]
+        self.drafts[draft_id] = (body.get("message") or {}).get("raw", "")
+        return 200, {"id": draft_id, "message": {"id": uuid.uuid4().hex[:16], "labelIds": ["DRAFT"]}}
+
+    async def send_draft(self, user: str, body: Dict) -> Tuple[int, Dict]:
+        raw = self.drafts.pop(body.get("id"), None)
+        if raw is None:
+            self.stats["gmail.drafts.send"] += 1
+            return _error(404, "notFound", "Requested entity was not found.")
+        return await self._deliver(user, raw, "gmail.drafts.send")
+
+    async def list_users(self, query: Dict[str, str]) -> Tuple[int, Dict]:
+        await self.delay(self.args.profile_latency_ms)
+        self.stats["admin.users.list"] += 1
+        start = int(query.get("pageToken") or 0)
+        end = start + min(int(query.get("maxResults") or 100), 500)
+        users = []
+        for index, email in enumerate(self.users[start:end], start):
+            local = email.split("@")[0]
+            users.append({
+                "id": str(100000 + index),
+                "primaryEmail": email,
+                "name": {"givenName": local.capitalize(), "familyName": "Bench", "fullName": f"{local.capitalize()} Bench"},
+                "isAdmin": False,
+                "suspended": False,
+                "orgUnitPath": "/",
+            })
+        result = {"kind": "admin#directory#users", "users": users}
+        if end < len(self.users):
+            result["nextPageToken"] = str(end)
+        return 200, result
+
+    async def list_domains(self) -> Tuple[int, Dict]:
+        self.stats["admin.domains.list"] += 1
+        return 200, {"domains": [{"domainName": self.args.domain, "isPrimary": True, "verified": True}]}
+
+    async def dispatch(self, method: str, path: str, query: Dict[str, str], body: bytes,
+                       authorization: Optional[str]) -> Tuple[int, Dict]:
+        """Route one API call; shared by the HTTP routes and batch sub-requests."""
+        path = path.strip("/")
+        if method == "POST" and path == "token":
+            return await self.token(dict(parse_qsl(body.decode())))
+
+        token_user = None
+        if authorization and authorization.startswith("Bearer fake."):
+            encoded = authorization[len("Bearer fake."):]
+            token_user = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+        if token_user is None:
+            return 401, {"error": {"code": 401, "message": "Request had invalid authentication credentials.",
+                                   "status": "UNAUTHENTICATED"}}
+        payload = json.loads(body) if body else {}
+
+        match = re.fullmatch(r"gmail/v1/users/([^/]+)/(profile|messages/send|drafts|drafts/send)", path)
+        if match:
+            user = token_user if match.group(1) == "me" else match.group(1)
+            action = match.group(2)
+            if method == "GET" and action == "profile":
+                return await self.get_profile(user)
+            if method == "POST" and action == "messages/send":
+                return await self.send_message(user, payload)
+            if method == "POST" and action == "drafts":
+                return await self.create_draft(user, payload)
+            if method == "POST" and action == "drafts/send":
+                return await self.send_draft(user, payload)
+        if method == "GET" and path == "admin/directory/v1/users":
+            return await self.list_users(query)
+        if method == "GET" and re.fullmatch(r"admin/directory/v1/customer/[^/]+/domains", path):
+            return await self.list_domains()
+        return _error(404, "notFound", f"Method not found: {method} /{path}")
+
+    async def batch(self, content_type: str, body: bytes, authorization: Optional[str]) -> Response:
+        """Execute a multipart/mixed batch concurrently and answer in the same format."""
+        self.stats["batch"] += 1
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        parts = message.get_payload() if message.is_multipart() else []
+
+        async def run(part):
+            request_bytes = part.get_payload(decode=True) or b""
+            head, _, sub_body = request_bytes.replace(b"\r\n", b"\n").partition(b"\n\n")
+            lines = head.decode().split("\n")
+            method, target = lines[0].split(" ")[:2]
+            headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+            path, _, qs = target.partition("?")
+            path = urlparse(path).path
+            status, payload = await self.dispatch(
+                method, path, dict(parse_qsl(qs)), sub_body.strip(),
+                headers.get("Authorization") or headers.get("authorization") or authorization
+            )
+            return part.get("Content-ID", ""), status, payload
+
+        results = await asyncio.gather(*(run(part) for part in parts))
+        boundary = "batch_" + uuid.uuid4().hex
+        chunks = []
+        for content_id, status, payload in results:
+            response_id = content_id.replace("<", "<response-", 1) if content_id else ""
+            body_json = json.dumps(payload)
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {response_id}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\nContent-Length: {len(body_json)}\r\n\r\n"
+                f"{body_json}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return Response("".join(chunks), media_type=f"multipart/mixed; boundary={boundary}")
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    fake = FakeGoogle(args)
+    app = FastAPI(title="Fake Google APIs", docs_url=None, redoc_url=None, openapi_url=None)
+
+    @app.get("/_fake/stats")
+    async def stats():
+        elapsed = time.time() - fake.started
+        sent = fake.stats["gmail.messages.send"] + fake.stats["gmail.drafts.send"]
+        return {"elapsed_seconds": round(elapsed, 3), "requests": dict(fake.stats),
+                "users_with_sends": len(fake.sent_by_user), "sends_per_sec": round(sent / elapsed, 1) if elapsed else 0.0}
+
+    @app.post("/_fake/reset")
+    async def reset():
+        fake.reset()
+        return {"ok": True}
+
+    @app.post("/batch")
+    @app.post("/batch/{api:path}")
+    async def batch(request: Request):
+        return await fake.batch(request.headers.get("content-type", ""), await request.body(),
+                                request.headers.get("authorization"))
+
+    @app.api_route("/{path:path}", methods=["GET", "POST"])
+    async def api(path: str, request: Request):
+        status, payload = await fake.dispatch(
+            request.method, path, dict(request.query_params), await request.body(),
+            request.headers.get("authorization")
+        )
+        return JSONResponse(payload, status_code=status)
+
+    return app
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--domain", default="bench.test", help="domain of the generated directory users")
+    parser.add_argument("--users", type=int, default=100, help="users returned by the Admin Directory users.list")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="mean latency of message/draft sends")
+    parser.add_argument("--profile-latency-ms", type=float, default=30.0, help="mean latency of other API calls")
+    parser.add_argument("--token-latency-ms", type=float, default=20.0, help="mean latency of the token endpoint")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal shape parameter")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="fraction of calls answered 429")
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0, help="fraction of calls answered 500/503")
+    parser.add_argument("--user-rate", type=float, default=0.0, help="sends per second per user before 429 (0: off)")
+    parser.add_argument("--daily-quota", type=int, default=0, help="sends per user before 429 dailyLimitExceeded (0: off)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--write-service-account", metavar="PATH",
+                        help="write a fake service account JSON whose token_uri points here, then exit")
+    args = parser.parse_args()
+
+    if args.write_service_account:
+        info = generate_service_account_info(token_uri=f"http://{args.host}:{args.port}/token")
+        with open(args.write_service_account, "w") as f:
+            json.dump(info, f, indent=2)
+        print(f"Wrote {os.path.abspath(args.write_service_account)}")
+        return 0
+
+    import uvicorn
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+-- Campaign scheduling: priority class, start-at time and daily UTC sending window
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS priority VARCHAR(20) DEFAULT 'bulk';
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS start_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS send_window_start TIME;
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS send_window_end TIME;
+UPDATE campaigns SET priority = 'bulk' WHERE priority IS NULL;
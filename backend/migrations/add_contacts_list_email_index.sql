@@ -0,0 +1,2 @@
+-- Speed up per-list duplicate checks during bulk contact imports
+CREATE INDEX IF NOT EXISTS ix_contacts_list_email ON contacts (contact_list_id, email);
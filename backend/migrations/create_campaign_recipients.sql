@@ -0,0 +1,31 @@
+-- Move campaign recipients from the campaigns.recipients JSON column into their own table
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS campaign_recipients (
+    id SERIAL PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES campaigns(id) ON DELETE CASCADE,
+    ordinal INTEGER NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    variables JSONB NOT NULL DEFAULT '{}'::jsonb,
+    service_account_id INTEGER REFERENCES service_accounts(id),
+    sender_email VARCHAR(255)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_campaign_recipients_campaign_ordinal ON campaign_recipients (campaign_id, ordinal);
+CREATE INDEX IF NOT EXISTS ix_campaign_recipients_campaign_email ON campaign_recipients (campaign_id, email);
+
+-- Backfill from the JSON blob, preserving list order with contiguous ordinals
+-- (emails are stored trimmed and lowercased, see app/email_addresses.py)
+INSERT INTO campaign_recipients (campaign_id, ordinal, email, variables)
+SELECT c.id,
+       (ROW_NUMBER() OVER (PARTITION BY c.id ORDER BY r.ord) - 1)::int,
+       LOWER(TRIM(r.value->>'email')),
+       COALESCE(r.value->'variables', '{}'::jsonb)
+FROM campaigns c
+CROSS JOIN LATERAL jsonb_array_elements(COALESCE(c.recipients::jsonb, '[]'::jsonb)) WITH ORDINALITY AS r(value, ord)
+WHERE TRIM(COALESCE(r.value->>'email', '')) <> ''
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE campaigns DROP COLUMN IF EXISTS recipients;
+
+COMMIT;
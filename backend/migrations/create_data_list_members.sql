@@ -0,0 +1,27 @@
+-- Move data list membership from the data_lists.recipients JSON column into its own table
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS data_list_members (
+    id SERIAL PRIMARY KEY,
+    data_list_id INTEGER NOT NULL REFERENCES data_lists(id) ON DELETE CASCADE,
+    email VARCHAR(255) NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_data_list_members_list_email ON data_list_members (data_list_id, email);
+
+-- Backfill from the JSON blob, preserving order and dropping duplicates
+-- (emails are stored trimmed and lowercased, see app/email_addresses.py)
+INSERT INTO data_list_members (data_list_id, email)
+SELECT d.id, LOWER(TRIM(r.email))
+FROM data_lists d
+CROSS JOIN LATERAL json_array_elements_text(COALESCE(d.recipients::json, '[]'::json)) WITH ORDINALITY AS r(email, ord)
+WHERE TRIM(r.email) <> ''
+ORDER BY d.id, r.ord
+ON CONFLICT (data_list_id, email) DO NOTHING;
+
+UPDATE data_lists d
+SET total_recipients = (SELECT COUNT(*) FROM data_list_members m WHERE m.data_list_id = d.id);
+
+ALTER TABLE data_lists DROP COLUMN IF EXISTS recipients;
+
+COMMIT;
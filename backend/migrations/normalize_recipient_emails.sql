@@ -0,0 +1,26 @@
+-- Store recipient emails trimmed and lowercased (app/email_addresses.py) in
+-- databases that were migrated before the backfills normalized them
+BEGIN;
+
+-- Data list members that only differ by case or spaces: keep the first one
+DELETE FROM data_list_members m
+USING data_list_members k
+WHERE k.data_list_id = m.data_list_id
+  AND LOWER(TRIM(k.email)) = LOWER(TRIM(m.email))
+  AND k.id < m.id;
+
+UPDATE data_list_members SET email = LOWER(TRIM(email)) WHERE email <> LOWER(TRIM(email));
+
+UPDATE data_lists d
+SET total_recipients = (SELECT COUNT(*) FROM data_list_members m WHERE m.data_list_id = d.id);
+
+UPDATE campaign_recipients SET email = LOWER(TRIM(email)) WHERE email <> LOWER(TRIM(email));
+
+-- Unsent logs look their recipient's variables up by email when they are rendered
+-- (the enum column stores member names)
+UPDATE email_logs SET recipient_email = LOWER(TRIM(recipient_email))
+WHERE status = 'PENDING' AND recipient_email <> LOWER(TRIM(recipient_email));
+
+UPDATE contacts SET email = LOWER(TRIM(email)) WHERE email <> LOWER(TRIM(email));
+
+COMMIT;